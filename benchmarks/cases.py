@@ -0,0 +1,161 @@
+"""
+Benchmark cases
+module: entry points measured by run.py on generated datasets
+author: ricardosilveira@poli.ufrj.br
+
+Every case has a `setup(size, data_dir)`, not measured, returning the state
+given to `run(state)`, which returns the number of items processed. The
+size is the number of works of the synthetic APS corpus, graphs have
+EDGES_PER_WORK edges per work.
+"""
+import os
+import sys
+import shutil
+import numpy as np
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = ["%s/builder" % ROOT_PATH, "%s/builder/APS" % ROOT_PATH, ROOT_PATH]
+from builder import Builder
+from aps_builder import APSBuilder
+from synthetic import make_corpus
+from tools.graph import Graph, CSRGraph
+from tools.bfs import BFS
+
+
+EDGES_PER_WORK = 10
+# Share of distinct vertices per edge of the generated graphs
+VERTICES_PER_EDGE = 0.2
+SEED = 0
+
+
+def corpus_path(size, data_dir):
+    """
+    Returns root path of the synthetic APS corpus of `size` works, writing
+    it if it does not exist yet.
+    """
+    root_path = "%s/aps_%d" % (data_dir, size)
+    if not os.path.exists("%s/done" % root_path):
+        shutil.rmtree(root_path, ignore_errors=True)
+        make_corpus(root_path, works_count=size, seed=SEED)
+        open("%s/done" % root_path, "w").close()
+    return root_path
+
+
+def random_edges(size):
+    """
+    Returns (v_i, v_j, weight) arrays of EDGES_PER_WORK*`size` random edges,
+    with repeated edges.
+    """
+    random_state = np.random.RandomState(SEED)
+    edges_count = EDGES_PER_WORK*size
+    vertices_count = max(2, int(edges_count*VERTICES_PER_EDGE))
+    return (random_state.randint(vertices_count, size=edges_count),
+            random_state.randint(vertices_count, size=edges_count),
+            random_state.random_sample(edges_count))
+
+
+def graph_path(size, data_dir):
+    """
+    Returns path of a graph text file, as parsed by `tools.graph.Graph`,
+    with EDGES_PER_WORK*`size` edges, writing it if it does not exist yet.
+    """
+    file_path = "%s/graph_%d.txt" % (data_dir, size)
+    if not os.path.exists(file_path):
+        v_i, v_j, weights = random_edges(size)
+        with open(file_path + ".tmp", "w") as graph_file:
+            graph_file.write("%d\n" % (max(v_i.max(), v_j.max()) + 1))
+            for edge in zip(v_i.tolist(), v_j.tolist(), weights.tolist()):
+                graph_file.write("%d %d %r\n" % edge)
+        os.rename(file_path + ".tmp", file_path)
+    return file_path
+
+
+def setup_sum_edges(size, data_dir):
+    """
+    Writes an unsorted csv graph file with repeated edges, as left by the
+    legacy graph writers, returning its path and number of edges.
+    """
+    file_path = "%s/sum_edges_%d.csv" % (data_dir, size)
+    v_i, v_j, weights = random_edges(size)
+    with open(file_path, "w") as graph_file:
+        graph_file.write("author_i,author_j,weight\n")
+        for edge in zip(v_i.tolist(), v_j.tolist(), weights.tolist()):
+            graph_file.write("%d,%d,%r\n" % edge)
+    return file_path, len(v_i)
+
+
+def run_sum_edges(state):
+    """
+    Sorts and adds up the edges of the graph file.
+    """
+    file_path, edges_count = state
+    Builder.sum_edges(file_path)
+    return edges_count
+
+
+def setup_load_citations(size, data_dir):
+    """
+    Parses the works of the synthetic corpus of `size` works, returning the
+    builder and the number of citations.
+    """
+    aps_builder = APSBuilder(root_path=corpus_path(size, data_dir),
+                             output_dir_path="%s/output_%d" % (data_dir, size))
+    aps_builder.find_works()
+    with open(aps_builder.citation_csv_path, "r") as csv_file:
+        citations_count = sum(1 for _ in csv_file) - 1
+    return aps_builder, citations_count
+
+
+def run_load_citations(state):
+    """
+    Loads citations line by line.
+    """
+    aps_builder, citations_count = state
+    aps_builder.load_citations()
+    return citations_count
+
+
+def run_load_citations_bulk(state):
+    """
+    Loads citations in bulk mode.
+    """
+    aps_builder, citations_count = state
+    aps_builder.load_citations(bulk=True)
+    return citations_count
+
+
+def setup_graph_parse(size, data_dir):
+    """
+    Returns path of the graph text file of `size`.
+    """
+    return graph_path(size, data_dir)
+
+
+def run_graph_parse(file_path):
+    """
+    Parses the graph text file.
+    """
+    graph = Graph(graph_path=file_path, weighted=True)
+    return graph.m_edges
+
+
+def setup_bfs(size, data_dir):
+    """
+    Returns the graph of `size` parsed, in CSR form.
+    """
+    return CSRGraph(graph_path=graph_path(size, data_dir), weighted=True)
+
+
+def run_bfs(graph):
+    """
+    Explores the graph from vertex 0.
+    """
+    BFS(graph).explore(0)
+    return graph.m_edges
+
+
+# name -> (setup, run)
+CASES = {"sum_edges": (setup_sum_edges, run_sum_edges),
+         "load_citations": (setup_load_citations, run_load_citations),
+         "load_citations_bulk": (setup_load_citations, run_load_citations_bulk),
+         "graph_parse": (setup_graph_parse, run_graph_parse),
+         "bfs": (setup_bfs, run_bfs)}
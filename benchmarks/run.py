@@ -0,0 +1,174 @@
+"""
+Benchmark runner
+module: runs the cases of cases.py on datasets of increasing size
+author: ricardosilveira@poli.ufrj.br
+
+Each case runs in its own process, so peak memory is measured for the case
+alone. The best time of the repeats and the peak resident memory of each
+(case, size) are saved as json in results/, to chart time against size
+across versions. If a baseline exists, results are compared to it and
+cases slower by more than the threshold are reported as regressions.
+
+Usage:
+
+    python run.py [--sizes 1000,10000,100000] [--cases sum_edges,bfs]
+                  [--repeat 3] [--threshold 0.2] [--save-baseline]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import traceback
+import multiprocessing
+import numpy as np
+import cases
+from instrument import peak_rss, current_rss
+
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = "%s/data" % BENCHMARKS_PATH
+RESULTS_DIR = "%s/results" % BENCHMARKS_PATH
+BASELINE_PATH = "%s/baseline.json" % BENCHMARKS_PATH
+
+
+def _measure(task):
+    """
+    Runs setup then `run` of a case once, in a fresh process. Returns the
+    time, items processed, peak resident memory and its increase over the
+    memory held after the setup.
+    """
+    name, size, data_dir = task
+    setup, run = cases.CASES[name]
+    try:
+        state = setup(size, data_dir)
+        rss_before = current_rss()
+        before = time.time()
+        items = run(state)
+        elapsed = time.time() - before
+    except Exception:
+        return {"error": traceback.format_exc().strip().splitlines()[-1]}
+    peak = peak_rss()
+    return {"time": elapsed,
+            "items": items,
+            "peak_rss": peak,
+            "peak_rss_increase": peak - rss_before if rss_before is not None else None}
+
+
+def run_case(name, size, repeat, data_dir=DATA_DIR):
+    """
+    Returns result of case `name` at `size`: the best time of `repeat` runs
+    and the largest peak memory.
+    """
+    runs = []
+    for _ in xrange(repeat):
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            runs.append(pool.apply(_measure, ((name, size, data_dir),)))
+        finally:
+            pool.close()
+            pool.join()
+        if "error" in runs[-1]:
+            return {"case": name, "size": size, "error": runs[-1]["error"]}
+    best = min(runs, key=lambda result: result["time"])
+    return {"case": name,
+            "size": size,
+            "time": best["time"],
+            "times": [result["time"] for result in runs],
+            "items": best["items"],
+            "items_per_sec": best["items"]/best["time"] if best["time"] > 0 else None,
+            "peak_rss": max(result["peak_rss"] for result in runs),
+            "peak_rss_increase": max(result["peak_rss_increase"] for result in runs)}
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns (case, size, time, baseline time) of the results slower than
+    their baseline by more than `threshold`, a fraction.
+    """
+    baseline_times = dict(((result["case"], result["size"]), result["time"])
+                          for result in baseline["results"] if "time" in result)
+    regressions = []
+    for result in results:
+        key = (result["case"], result["size"])
+        if "time" in result and key in baseline_times and \
+                result["time"] > baseline_times[key]*(1 + threshold):
+            regressions.append((result["case"], result["size"], result["time"],
+                                baseline_times[key]))
+    return regressions
+
+
+def environment():
+    """
+    Returns versions and machine the benchmarks ran on.
+    """
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_PATH,
+                                         stderr=open(os.devnull, "w")).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": multiprocessing.cpu_count(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def main(argv=None):
+    """
+    Runs benchmarks with command line arguments `argv`, returning 1 if a
+    regression was found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Runs grafluence benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated numbers of works")
+    parser.add_argument("--cases", default=",".join(sorted(cases.CASES)),
+                        help="comma separated case names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown over the baseline reported as regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="saves the results as the new baseline")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.data_dir):
+        os.makedirs(args.data_dir)
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for name in args.cases.split(","):
+            result = run_case(name, size, args.repeat, args.data_dir)
+            results.append(result)
+            if "error" in result:
+                print "%-20s %9d  error: %s" % (name, size, result["error"])
+            else:
+                print "%-20s %9d  %9.3f s  %12.0f items/s  %7.1f MB" % (
+                    name, size, result["time"], result["items_per_sec"] or 0,
+                    result["peak_rss"]/1024.0**2)
+    report = {"environment": environment(), "results": results}
+    if not os.path.exists(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    results_path = "%s/%s.json" % (RESULTS_DIR, time.strftime("%Y%m%d_%H%M%S"))
+    with open(results_path, "w") as results_file:
+        json.dump(report, results_file, indent=1)
+    print "Results at %s" % results_path
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for name, size, elapsed, baseline_time in regressions:
+            print "Regression: %s at %d, %.3f s against %.3f s" % (name, size, elapsed,
+                                                                  baseline_time)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=1)
+        print "Baseline saved at %s" % args.baseline
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,12 +4,22 @@ Builder module to extract graph from APS files
 import os
 import json
 import time
-from dateutil.parser import parse
+import shutil
+import tempfile
+import multiprocessing
+from itertools import izip
+import numpy as np
 if __name__ == "__main__":
     import sys
     sys.path.append("../")
 from builder import Builder
-from _helper import dump, set_dir, LOGGER
+from _helper import dump, set_dir, configure_logging, LOGGER
+from works_store import WorksStore
+from works import WORKS_STORE_NAME
+from edges import EdgeAccumulator, write_edges
+from snapshot_writer import write_snapshot, write_snapshot_edges, csv_to_snapshot, snapshot_file_name
+from hyper import HyperWorks
+from instrument import Instrument, instrumented
 # pylint: disable=line-too-long
 
 
@@ -18,6 +28,11 @@ WORK_INFO = 1
 AUTHORS_LIST = 0
 CITED_WORKS = 1
 WORK_ID = 2
+GRAPH_HEADER = ["author_i", "author_j", "weight"]
+HYPEREDGES_HEADER = {"coauthorship": ["work", "weight", "authors"],
+                     "citations": ["work", "cited_work", "weight"]}
+GRAPHS_DIR_NAME = {"coauthorship": "coauthorship_graphs", "citations": "citation_graphs"}
+GRAPH_RESOLUTION = {"coauthorship": "month", "citations": "year"}
 
 
 class APSBuilder(Builder):
@@ -37,10 +52,16 @@ class APSBuilder(Builder):
         Name of csv file which presents the citations links.
     works_dir_name: str
         Name of parent directory hosting all works metadata json files.
-    works: list
+    works: list or WorksStore
         List of works with their their publication date, cited works and authors.
     works_map: dict
         Maps works by id to their publication date, cited works and authors.
+    manifest: dict
+        Maps each parsed metadata file to its size, modification time and
+        work id.
+    shifted_from: int
+        First work index changed by the last `update_works`, None if work
+        indexes did not change.
     output_dir_path: str
         Path to export all built data.
 
@@ -49,11 +70,23 @@ class APSBuilder(Builder):
     find_works(**kwargs):
         Parses all json files found in sub-dirs from `WORKS_DIR_NAME`, getting
         authors information and publication date of each work.
+    update_works(**kwargs):
+        Parses only new or changed json files since the last dump, splicing
+        them into the loaded works.
+    dump_store(**kwargs):
+        Saves works as a memory-mapped columnar store.
+    load_from_store(**kwargs):
+        Opens works from a columnar store.
+    dump_report(**kwargs):
+        Saves wall time, throughput, peak memory and bytes written of each
+        build stage and time period as a json file.
     load_citations(**kwargs):
         Reads csv file with citations links, updating `works` with list of
         cited works by each work.
     group_by_time(**kwargs):
         Group works by time, appending list of works for each time mark.
+    works_range(year, month, day):
+        Returns range of works published in a year, month or day.
     make_coauthorship_graph(**kwargs):
         Exports an undirected weighted graph for time mark. For each graph
         file, the lines represent the edges between two authors who published
@@ -75,6 +108,16 @@ class APSBuilder(Builder):
         """
         Sets paths for input and output files, starts dictionary to hold
         works and authors and their respective identifiers.
+
+        Parameters
+        ----------
+        profile: list
+            Names of the stages profiled with cProfile, or 'all', see
+            `instrument`.
+            Default: BUILDER_PROFILE environment variable, or none.
+        profile_dir: str
+            Directory of the cProfile stats files.
+            Default: profiles in the output directory.
         """
         # Directory to house built data
         self.output_dir_path = kwargs.get("output_dir_path", "output")
@@ -101,43 +144,112 @@ class APSBuilder(Builder):
         self.authors_map = {}
         # Number of elements in the the authors list
         self.authors_count = 0
+        # Maps metadata file path (relative to works dir) to [size, mtime, work id]
+        self.manifest = {}
+        # First work index changed by the last update, None if none changed
+        self.shifted_from = None
+        # Offsets of works in each year, month and day, see Builder.time_index
+        self.works_time_index = None
+        # Measures of the build stages
+        self.instrument = Instrument(profile=kwargs.get("profile", None),
+                                     profile_dir=kwargs.get("profile_dir",
+                                                            "%s/profiles" % self.output_dir_path))
 
-    def find_works(self):
+    @instrumented("find_works")
+    def find_works(self, **kwargs):
         """
         Loads all works in json files in the metadata folder and their
         respective sub-directories. The work information is stored in
         `self.works`.
+
+        Parameters
+        ----------
+        workers: int
+            Number of processes parsing the metadata files. Each process
+            interns author names locally and the partial tables are merged
+            in file order, so `works`, `works_map` and `authors_map` are the
+            same for any number of workers.
+            Default: 1 (serial).
+        chunk_size: int
+            Number of files handed to a worker at a time.
+            Default: 2000.
         """
+        workers = kwargs.get("workers", 1)
+        chunk_size = kwargs.get("chunk_size", 2000)
         overview = {"Publishers": 0,
                     "Works": 0,
                     "Retrieved": 0}
         LOGGER.info("Searching for works...")
         before = time.time()
+        files_list = self.list_work_files(overview)
+        overview["Works"] = len(files_list)
+        self.instrument.add_items(len(files_list))
+        if workers > 1:
+            self._find_works_parallel(files_list, workers, chunk_size)
+        else:
+            for file_path in files_list:
+                # Gets publication_date and author list for each work
+                work_date, work_info = self._get_work_info(file_path)
+                self._add_to_manifest(file_path, work_info[WORK_ID] if work_date else None)
+                # If data is fine, hence work_date is not None
+                if work_date:
+                    self.works.append((work_date, work_info))
+        overview["Retrieved"] = len(self.works)
+        # Exporting overview info
+        dump(overview, "%s/%s.txt" % (self.output_dir_path,
+                                      "aps_works_overview"))
+        LOGGER.info("Loaded %d works after %f seconds", overview["Retrieved"],
+                                                        time.time() - before)
+        self.sort_elements()
+
+    def list_work_files(self, overview=None):
+        """
+        Returns paths of all metadata json files, walking publisher, edition
+        and work directories in the same order for every run.
+        """
+        files_list = []
         # List of publishers
         for dir_name in os.listdir(self.works_dir_path):
             dir_path = "%s/%s" % (self.works_dir_path, dir_name)
-            overview["Publishers"] += 1
-            LOGGER.debug("dir # %d: %s", overview["Publishers"], dir_name)
+            if overview is not None:
+                overview["Publishers"] += 1
+            LOGGER.debug("dir: %s", dir_name)
             # List of editions
             for sub_dir_name in os.listdir(dir_path):
                 sub_dir_path = "%s/%s" % (dir_path, sub_dir_name)
                 # List of works in this edition
                 for file_name in os.listdir(sub_dir_path):
-                    overview["Works"] += 1
-                    file_path = "%s/%s" % (sub_dir_path, file_name)
-                    # Gets publication_date and author list for each work
-                    work_date, work_info = self._get_work_info(file_path)
-                    # If data is fine, hence work_date is not None
-                    if work_date:
-                        overview["Retrieved"] += 1
-                        self.works.append((work_date, work_info))
-        # Exporting overview info
-        dump(overview, "%s/%s.txt" % (self.output_dir_path,
-                                      "aps_works_overview"))
-        LOGGER.info("Loaded %d works after %f seconds", overview["Retrieved"],
-                                                        time.time() - before)
-        self.sort_elements()
-        self.authors_map = None
+                    files_list.append("%s/%s" % (sub_dir_path, file_name))
+        return files_list
+
+    def _find_works_parallel(self, files_list, workers, chunk_size):
+        """
+        Parses `files_list` over a pool of `workers` processes. Chunks are
+        merged back in file order, giving each new author name the next
+        global identifier, exactly as the serial walk would.
+        """
+        chunks = [files_list[i:i+chunk_size]
+                  for i in xrange(0, len(files_list), chunk_size)]
+        pool = multiprocessing.Pool(workers)
+        try:
+            for chunk, (works_chunk, local_authors, works_ids) in izip(
+                    chunks, pool.imap(_parse_works_chunk, chunks)):
+                for file_path, work_id in izip(chunk, works_ids):
+                    self._add_to_manifest(file_path, work_id)
+                # Local author index -> global author index
+                authors_idx = []
+                for author_name in local_authors:
+                    if author_name not in self.authors_map:
+                        self.authors_map[author_name] = self.authors_count
+                        self.authors_count += 1
+                    authors_idx.append(self.authors_map[author_name])
+                for work_date, work_info in works_chunk:
+                    work_info[AUTHORS_LIST] = [authors_idx[author_idx] for author_idx
+                                               in work_info[AUTHORS_LIST]]
+                    self.works.append((work_date, work_info))
+        finally:
+            pool.close()
+            pool.join()
 
     def _get_work_info(self, file_path):
         """
@@ -145,6 +257,22 @@ class APSBuilder(Builder):
         date and an empt list for cited_works. This method also updates the
         authors dict, which holds each author identifier.
         """
+        work_data = self.read_work(file_path, self.authors_map)
+        self.authors_count = len(self.authors_map)
+        return work_data
+
+    @staticmethod
+    def read_work(file_path, authors_map):
+        """
+        Parses work json file at `file_path`, assigning the next free index
+        in `authors_map` to every author name not seen before.
+
+        Returns
+        -------
+        tuple:
+            (publication date, [authors list, [], work id]), or (None, None)
+            if the work has no usable authors information.
+        """
         file_data = json.load(open(file_path))
         authors_list = []
         # Listing authors of publications, handling possible Editorials
@@ -154,10 +282,9 @@ class APSBuilder(Builder):
                 # Handling error if author does not have a name in json
                 try:
                     # Assigns an id for the author
-                    if isinstance(author, dict) and author["name"] not in self.authors_map:
-                        self.authors_map[author["name"]] = self.authors_count
-                        self.authors_count += 1
-                    author_idx = self.authors_map[author["name"]]
+                    if isinstance(author, dict) and author["name"] not in authors_map:
+                        authors_map[author["name"]] = len(authors_map)
+                    author_idx = authors_map[author["name"]]
                     # Inserts author id in list of authors
                     authors_list.append(author_idx)
                 except KeyError:
@@ -170,6 +297,172 @@ class APSBuilder(Builder):
             return None, None
         return (file_data["date"], [authors_list, [], file_data["id"]])
 
+    def _manifest_key(self, file_path):
+        """
+        Returns `file_path` relative to the works directory.
+        """
+        return os.path.relpath(file_path, self.works_dir_path)
+
+    @staticmethod
+    def _file_signature(file_path):
+        """
+        Returns [size, mtime] of file at `file_path`, used to detect changes
+        between builds.
+        """
+        file_stat = os.stat(file_path)
+        return [file_stat.st_size, file_stat.st_mtime]
+
+    def _add_to_manifest(self, file_path, work_id):
+        """
+        Records metadata file at `file_path` as parsed, holding work
+        `work_id`, None if it has no usable work.
+        """
+        self.manifest[self._manifest_key(file_path)] = self._file_signature(file_path) + [work_id]
+
+    def _remove_work(self, work_id):
+        """
+        Marks work `work_id` as removed, to be dropped by `_splice_works`.
+        """
+        if work_id in self.works_map:
+            self.works[self.works_map.pop(work_id)] = None
+
+    @instrumented("update_works")
+    def update_works(self, **kwargs):
+        """
+        Incrementally updates a previous build, parsing only metadata files
+        which are new or changed since the manifest stored by `dump_data`,
+        and removing the works of metadata files deleted since then.
+
+        New authors get the next free indexes, so author indexes never
+        change. New works are spliced into the date-sorted works list after
+        the existing works with the same date: work indexes are kept when
+        new works are the most recent ones, but a work older than existing
+        ones, a work moved to another date or a removed work shifts the
+        indexes of the works after it. `works_map` and cited works are then
+        remapped, and `shifted_from` is set to the first changed index:
+        graph files of the time periods from that work on are no longer
+        valid and must be rebuilt, as `APSPipeline` does.
+
+        Citations of new and changed works are loaded and the dumps are
+        updated.
+
+        Parameters
+        ----------
+        works_dump_name: str
+            Default: aps_works
+        bulk: bool
+            If True, citations are loaded in bulk mode.
+            Default: False.
+
+        Returns
+        -------
+        list:
+            Ids of new or changed works.
+        """
+        LOGGER.info("Updating works...")
+        before = time.time()
+        self.load_from_dump(**kwargs)
+        new_works = []
+        changed_works = []
+        listed_files = set()
+        # Works no longer in the files which held them, and works parsed now
+        stale_ids = set()
+        parsed_ids = set()
+        for file_path in self.list_work_files():
+            manifest_key = self._manifest_key(file_path)
+            listed_files.add(manifest_key)
+            manifest_entry = self.manifest.get(manifest_key)
+            if manifest_entry is not None and \
+                    manifest_entry[:2] == self._file_signature(file_path):
+                continue
+            work_date, work_info = self._get_work_info(file_path)
+            self._add_to_manifest(file_path, work_info[WORK_ID] if work_date else None)
+            if manifest_entry is not None and len(manifest_entry) > 2:
+                stale_ids.add(manifest_entry[2])
+            if not work_date:
+                continue
+            work_id = work_info[WORK_ID]
+            parsed_ids.add(work_id)
+            work_info[AUTHORS_LIST].sort()
+            if work_id in self.works_map:
+                work_idx = self.works_map[work_id]
+                # Same date, the work keeps its index
+                if self.works[work_idx][0] == work_date:
+                    self.works[work_idx][WORK_INFO][AUTHORS_LIST] = work_info[AUTHORS_LIST]
+                    changed_works.append(work_id)
+                    continue
+                # Otherwise the work is moved to its new date
+                self.works[work_idx] = None
+                del self.works_map[work_id]
+            new_works.append((work_date, work_info))
+        # Metadata files deleted since the last build
+        for manifest_key in set(self.manifest) - listed_files:
+            manifest_entry = self.manifest.pop(manifest_key)
+            if len(manifest_entry) > 2:
+                stale_ids.add(manifest_entry[2])
+            else:
+                LOGGER.warning("No work id recorded for deleted %s, its work is kept",
+                               manifest_key)
+        removed_ids = [work_id for work_id in stale_ids - parsed_ids
+                       if work_id is not None and work_id in self.works_map]
+        for work_id in removed_ids:
+            self._remove_work(work_id)
+        new_ids = self._splice_works(new_works)
+        self.instrument.add_items(len(new_ids) + len(changed_works) + len(removed_ids))
+        LOGGER.info("%d new, %d changed and %d removed works after %f seconds", len(new_ids),
+                    len(changed_works), len(removed_ids), time.time() - before)
+        if self.shifted_from is not None:
+            LOGGER.warning("Work indexes changed from %d on, graph files from %s on "
+                           "must be rebuilt", self.shifted_from,
+                           self.works[min(self.shifted_from, len(self.works) - 1)][0]
+                           if self.works else "the start")
+        self.load_citations(new_works=new_ids, changed_works=changed_works,
+                            bulk=kwargs.get("bulk", False))
+        self.dump_data(**kwargs)
+        return new_ids + changed_works
+
+    def _splice_works(self, new_works):
+        """
+        Merges `new_works` into the date-sorted `self.works`, removing works
+        marked as None and remapping `works_map` and cited works indexes.
+        Sets `shifted_from` and returns the ids of the spliced works.
+        """
+        new_works.sort()
+        merged_works = []
+        # Old work index -> new work index
+        works_idx = [None]*len(self.works)
+        new_idx = 0
+        for work_idx, work in enumerate(self.works):
+            if work is None:
+                continue
+            while new_idx < len(new_works) and new_works[new_idx][0] < work[0]:
+                merged_works.append(new_works[new_idx])
+                new_idx += 1
+            works_idx[work_idx] = len(merged_works)
+            merged_works.append(work)
+        merged_works.extend(new_works[new_idx:])
+        # Works after the first moved one changed index, appended ones did not
+        self.shifted_from = next((work_idx for work_idx, merged_idx in enumerate(works_idx)
+                                  if merged_idx != work_idx), None)
+        # Mapping works to their new indexes
+        for work_id, work_idx in self.works_map.iteritems():
+            self.works_map[work_id] = works_idx[work_idx]
+        new_ids = []
+        for work_idx, work in enumerate(merged_works):
+            work_info = work[WORK_INFO]
+            if len(work_info) > WORK_ID:
+                new_ids.append(work_info.pop(WORK_ID))
+                self.works_map[new_ids[-1]] = work_idx
+        for work in merged_works:
+            cited_works = work[WORK_INFO][CITED_WORKS]
+            work[WORK_INFO][CITED_WORKS] = [works_idx[cited_work] for cited_work in cited_works
+                                            if works_idx[cited_work] is not None]
+        self.works = merged_works
+        self.works_count = len(self.works)
+        self.works_time_index = self.time_index(self.items_date_keys(self.works))
+        return new_ids
+
+    @instrumented("sort_elements")
     def sort_elements(self):
         """
         Sorting works list by publication date, and for each work, sorting
@@ -183,9 +476,12 @@ class APSBuilder(Builder):
         for work_idx in xrange(len(self.works)):
             work_id = self.works[work_idx][WORK_INFO].pop(WORK_ID)
             self.works_map[work_id] = work_idx
-            self.works[work_id][WORK_INFO][AUTHORS_LIST].sort()
+            self.works[work_idx][WORK_INFO][AUTHORS_LIST].sort()
+        # Dates are converted once, grouping works by time uses this index
+        self.works_time_index = self.time_index(self.items_date_keys(self.works))
         LOGGER.info("Elements sorted after %f seconds", time.time() - before)
 
+    @instrumented("load_from_dump")
     def load_from_dump(self, **kwargs):
         """
         Loads authors map, works map and works list json files into memory.
@@ -204,29 +500,181 @@ class APSBuilder(Builder):
         works_dump_path = "%s/%s.json" % (self.output_dir_path,
                                           works_dump_name)
         works_map_dump_path = works_dump_path.replace(".json", "_map.json")
+        authors_map_dump_path = authors_dump_path.replace(".json", "_map.json")
+        manifest_dump_path = works_dump_path.replace(".json", "_manifest.json")
+        time_index_dump_path = works_dump_path.replace(".json", "_time.json")
         with open(works_map_dump_path, "r") as works_map_dump:
             self.works_map = json.load(works_map_dump)
         with open(works_dump_path, "r") as works_dump:
             self.works = json.load(works_dump)
+        self.works_count = len(self.works)
+        if os.path.exists(authors_map_dump_path):
+            with open(authors_map_dump_path, "r") as authors_map_dump:
+                self.authors_map = json.load(authors_map_dump)
+            self.authors_count = len(self.authors_map)
+        if os.path.exists(manifest_dump_path):
+            with open(manifest_dump_path, "r") as manifest_dump:
+                self.manifest = json.load(manifest_dump)
+        self.works_time_index = None
+        if os.path.exists(time_index_dump_path):
+            with open(time_index_dump_path, "r") as time_index_dump:
+                time_index = json.load(time_index_dump)
+            # Discarding index of another works dump
+            if time_index["year"][1][-1] == self.works_count:
+                self.works_time_index = time_index
+        self.instrument.add_items(self.works_count)
+
+    def dump_report(self, **kwargs):
+        """
+        Saves measures of the build stages and time periods as a json file,
+        see `instrument.Instrument.report`.
 
-    def dump_data(self):
+        Parameters
+        ----------
+        report_name: str
+            Default: build_report
         """
-        Saves authors map, works map and works list as json files.
+        report_path = "%s/%s.json" % (self.output_dir_path,
+                                      kwargs.get("report_name", "build_report"))
+        self.instrument.write(report_path)
+        LOGGER.info("Build report at %s", report_path)
+
+    @instrumented("dump_data")
+    def dump_data(self, **kwargs):
         """
-        works_dump_path = "%s/%s.json" % (self.output_dir_path, "aps_works")
-        authors_dump_path = "%s/%s.json" % (self.output_dir_path, "aps_authors")
+        Saves authors map, works map, works list, the manifest of parsed
+        metadata files and the time index of works as json files.
+
+        Parameters
+        ----------
+        authors_dump_name: str
+            Default: aps_authors
+        works_dump_name: str
+            Default: aps_works
+        """
+        authors_dump_name = kwargs.get("authors_dump_name", "aps_authors")
+        works_dump_name = kwargs.get("works_dump_name", "aps_works")
+        works_dump_path = "%s/%s.json" % (self.output_dir_path, works_dump_name)
+        authors_dump_path = "%s/%s.json" % (self.output_dir_path, authors_dump_name)
         works_map_dump_path = works_dump_path.replace(".json", "_map.json")
         authors_map_dump_path = authors_dump_path.replace(".json", "_map.json")
+        manifest_dump_path = works_dump_path.replace(".json", "_manifest.json")
+        time_index_dump_path = works_dump_path.replace(".json", "_time.json")
         # Dumping loaded data
-        dump(self.works, works_dump_path)
+        if isinstance(self.works, WorksStore):
+            dump(self.works.to_list(), works_dump_path)
+        else:
+            dump(self.works, works_dump_path)
         dump(self.works_map, works_map_dump_path)
         dump(self.authors_map, authors_map_dump_path)
+        dump(self.manifest, manifest_dump_path)
+        dump(self.get_time_index(), time_index_dump_path)
+        self.instrument.add_items(len(self.works))
+        for dump_path in [works_dump_path, works_map_dump_path, authors_map_dump_path,
+                          manifest_dump_path, time_index_dump_path]:
+            self.instrument.add_output(dump_path)
+
+    def get_time_index(self):
+        """
+        Returns offsets of works in each year, month and day, building it
+        from works dates if not loaded yet. See `Builder.time_index`.
+        """
+        if self.works_time_index is None:
+            self.works_time_index = self.time_index(self.items_date_keys(self.works))
+        return self.works_time_index
 
-    def load_citations(self):
+    def works_range(self, year, month=None, day=None):
+        """
+        Returns xrange of indexes of works published in `year`, or in
+        `month` of `year`, or in `day` of `month`.
+
+        Examples
+        --------
+        >>> APS_BUILDER.works_range(1893, 7)
+        xrange(12, 20)
+        """
+        if day is not None:
+            return self.period_range(self.get_time_index(), "day",
+                                     year*10000 + month*100 + day)
+        if month is not None:
+            return self.period_range(self.get_time_index(), "month", year*100 + month)
+        return self.period_range(self.get_time_index(), "year", year)
+
+    @instrumented("dump_store")
+    def dump_store(self, **kwargs):
+        """
+        Saves works list as a columnar store, see `works_store.WorksStore`,
+        and reopens `works` from it memory-mapped. Analytics and notebooks
+        open it with `tools/works.py`.
+
+        Parameters
+        ----------
+        works_store_name: str
+            Default: aps_works_store
+        """
+        works_store_name = kwargs.get("works_store_name", WORKS_STORE_NAME)
+        works_store_path = "%s/%s" % (self.output_dir_path, works_store_name)
+        before = time.time()
+        self.works = WorksStore.write(self.works, works_store_path)
+        self.instrument.add_items(len(self.works))
+        LOGGER.info("Works store at %s after %f seconds", works_store_path,
+                    time.time() - before)
+
+    @instrumented("load_from_store")
+    def load_from_store(self, **kwargs):
+        """
+        Opens works from a columnar store memory-mapped, without building
+        per-work python lists, and loads works map json file.
+
+        Parameters
+        ----------
+        works_store_name: str
+            Default: aps_works_store
+        works_dump_name: str
+            Default: aps_works
+        """
+        works_store_name = kwargs.get("works_store_name", WORKS_STORE_NAME)
+        works_dump_name = kwargs.get("works_dump_name", "aps_works")
+        works_map_dump_path = "%s/%s_map.json" % (self.output_dir_path, works_dump_name)
+        self.works = WorksStore("%s/%s" % (self.output_dir_path, works_store_name))
+        self.works_count = len(self.works)
+        self.works_time_index = None
+        if os.path.exists(works_map_dump_path):
+            with open(works_map_dump_path, "r") as works_map_dump:
+                self.works_map = json.load(works_map_dump)
+
+    @instrumented("load_citations")
+    def load_citations(self, **kwargs):
         """
         Loads relation of cited works from csv file, in which each line represents
         a work citing another.
+
+        Parameters
+        ----------
+        new_works: list
+            If given, only citations from or to these works are loaded, as
+            other citations are already in `works`.
+            Default: None (all citations).
+        changed_works: list
+            Works whose cited works are reloaded from scratch.
+            Default: [].
+        bulk: bool
+            If True, parses the csv file in chunks of arrays, see
+            `load_citations_bulk`.
+            Default: False.
+        chunk_size: int
+            Bytes read per chunk in bulk mode.
+            Default: 64 MB.
         """
+        new_works = kwargs.get("new_works", None)
+        changed_works = set(kwargs.get("changed_works", []))
+        if new_works is not None:
+            new_works = set(new_works)
+            for work_id in changed_works:
+                self.works[self.works_map[work_id]][WORK_INFO][CITED_WORKS] = []
+        if kwargs.get("bulk", False):
+            return self.load_citations_bulk(new_works, changed_works,
+                                            kwargs.get("chunk_size", 64*1024*1024))
         line_counter = 0
         not_listed = {}
         LOGGER.info("Loading citations!")
@@ -242,6 +690,9 @@ class APSBuilder(Builder):
                     source_id, target_id = line.rstrip("\n").split(",")
                     # ensuring source and target are known works
                     if source_id in self.works_map and target_id in self.works_map:
+                        if new_works is not None and source_id not in new_works \
+                                and source_id not in changed_works and target_id not in new_works:
+                            continue
                         source = self.works_map[source_id]
                         target = self.works_map[target_id]
                         self.works[source][WORK_INFO][CITED_WORKS].append(target)
@@ -252,8 +703,96 @@ class APSBuilder(Builder):
                 first_line = False
         dump(not_listed, "%s/%s.json" % (self.output_dir_path, "non_listed"))
         LOGGER.info("Non-listed works: %d", len(not_listed.keys()))
+        self.instrument.add_items(line_counter)
+        LOGGER.info("%d citations loaded after %f seconds", line_counter, time.time() - before)
+
+    def load_citations_bulk(self, new_works=None, changed_works=(), chunk_size=64*1024*1024):
+        """
+        Loads citations as `load_citations`, parsing the csv file in chunks
+        of `chunk_size` bytes. Work ids are resolved to work indexes by binary
+        search on a sorted table of ids, and the cited works of every work
+        are built at once from the resolved (source, target) arrays, keeping
+        the order of the csv file.
+        """
+        LOGGER.info("Loading citations in bulk!")
+        before = time.time()
+        # Sorted table of work ids and their indexes
+        works_ids = np.array([_as_bytes(work_id) for work_id in self.works_map])
+        works_idx = np.fromiter(self.works_map.itervalues(), dtype=np.int64,
+                                count=len(self.works_map))
+        ids_order = np.argsort(works_ids, kind="mergesort")
+        works_ids = works_ids[ids_order]
+        works_idx = works_idx[ids_order]
+        if new_works is not None:
+            new_works = np.array([_as_bytes(work_id) for work_id in new_works], dtype=works_ids.dtype)
+            changed_works = np.array([_as_bytes(work_id) for work_id in changed_works],
+                                     dtype=works_ids.dtype)
+        sources = []
+        targets = []
+        not_listed = {}
+        line_counter = 0
+        with open(self.citation_csv_path) as csv_file:
+            # Avoids first line comment
+            if csv_file.readline():
+                line_counter += 1
+            while True:
+                lines = csv_file.readlines(chunk_size)
+                if not lines:
+                    break
+                line_counter += len(lines)
+                LOGGER.debug("Line # %d", line_counter)
+                fields = "".join(lines).replace("\n", ",").split(",")
+                if len(fields) == 2*len(lines) + 1 and fields[-1] == "":
+                    fields.pop()
+                if len(fields) != 2*len(lines):
+                    raise ValueError("Malformed citations csv near line %d" % line_counter)
+                fields = np.array(fields).reshape(-1, 2)
+                source_ids = fields[:, 0]
+                target_ids = fields[:, 1]
+                source, source_found = _lookup(works_ids, works_idx, source_ids)
+                target, target_found = _lookup(works_ids, works_idx, target_ids)
+                listed = source_found & target_found
+                # Counting citations from each non-listed work
+                ids, counts = np.unique(source_ids[~listed], return_counts=True)
+                for source_id, count in zip(ids.tolist(), counts.tolist()):
+                    not_listed[source_id] = not_listed.get(source_id, 0) + count
+                if new_works is not None:
+                    listed &= (np.in1d(source_ids, new_works) |
+                               np.in1d(source_ids, changed_works) |
+                               np.in1d(target_ids, new_works))
+                sources.append(source[listed])
+                targets.append(target[listed])
+        sources = np.concatenate(sources) if sources else np.empty(0, dtype=np.int64)
+        targets = np.concatenate(targets) if targets else np.empty(0, dtype=np.int64)
+        self._add_cited_works(sources, targets)
+        dump(not_listed, "%s/%s.json" % (self.output_dir_path, "non_listed"))
+        LOGGER.info("Non-listed works: %d", len(not_listed.keys()))
+        self.instrument.add_items(line_counter)
         LOGGER.info("%d citations loaded after %f seconds", line_counter, time.time() - before)
 
+    def _add_cited_works(self, sources, targets):
+        """
+        Appends cited works `targets[k]` to works `sources[k]`, in order.
+        """
+        works_count = len(self.works)
+        if isinstance(self.works, WorksStore):
+            # Existing citations go first, as appending to lists would
+            cited_offsets = self.works.cited_offsets
+            sources = np.concatenate((np.repeat(np.arange(works_count), np.diff(cited_offsets)),
+                                      sources))
+            targets = np.concatenate((self.works.cited_index, targets))
+        order = np.argsort(sources, kind="mergesort")
+        targets = targets[order]
+        cited_offsets = np.zeros(works_count+1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=works_count), out=cited_offsets[1:])
+        if isinstance(self.works, WorksStore):
+            self.works = self.works.replace_cited(cited_offsets, targets)
+            return
+        for work_idx in np.flatnonzero(np.diff(cited_offsets)).tolist():
+            cited_works = targets[cited_offsets[work_idx]:cited_offsets[work_idx+1]]
+            self.works[work_idx][WORK_INFO][CITED_WORKS].extend(cited_works.tolist())
+
+    @instrumented("coauthorship_graphs")
     def make_coauthorship_graphs(self, **kwargs):
         """
         For each time period, writes a file representing a graph in which
@@ -274,37 +813,257 @@ class APSBuilder(Builder):
         until_year: float
             For time range, considering works published until this year.
             Default: inf.
+        in_memory: bool
+            If True, edges of each time period are added up in memory and
+            the graph file is written once, sorted by (author_i, author_j).
+            If edges are spilled to disk, weights are only equal to the
+            other modes up to float rounding, see `edges.EdgeAccumulator`.
+            Default: False.
+        max_memory: int
+            Memory budget in bytes for edges held in memory, beyond which
+            sorted runs are spilled to disk.
+            Default: 1 GB.
+        tmp_dir: str
+            Directory for spilled runs.
+            Default: system temporary directory.
+        workers: int
+            Number of processes building time periods in parallel.
+            Default: 1.
+        engine: str
+            If 'sparse', each time period is projected with sparse matrix
+            products on the works incidence matrices, see `projection`;
+            requires scipy. If 'loop', edges are built per pair of authors.
+            Default: 'loop'.
+        max_authors: int
+            If set, works with more authors are hyper-authored and are not
+            fully expanded, see `hyper`. A report of the avoided edges is
+            saved as hyper_report.json.
+            Default: None.
+        hyper_mode: str
+            'hyperedge' writes hyper-authored works to a _hyperedges.csv side
+            file, 'cap' expands their first `max_authors` authors and 'sample'
+            a seeded sample of `max_authors` authors.
+            Default: 'hyperedge'.
+        snapshot_format: str
+            'csv' writes graph files as csv, 'binary' as compact .snap
+            files, see `snapshot_writer`.
+            Default: 'csv'.
+        weight_dtype: str
+            Weights type of binary snapshot files, 'float32' or 'float64'.
+            Default: 'float64'.
 
         Returns
         -------
         dict:
             Dictionary with paths for all created files.
         """
-        resolution = kwargs.get("resolution", "month")
-        from_year = kwargs.get("from_year", 0)
-        until_year = kwargs.get("until_year", float("inf"))
-        created_files = []
-        grouped_works = self.group_by_time(self.works, resolution=resolution)
-        # Directory for coauthorship graphs
-        coauthorship_graphs_dir = "%s/coauthorship_graphs" % self.output_dir_path
-        for (ref_date, works_list) in grouped_works:
-            if ref_date.year >= from_year and ref_date.year < until_year:
-                graph_file_name = self.get_graph_file_name(coauthorship_graphs_dir,
-                                                           ref_date, resolution,
-                                                           "coauthorship")
-                created_files.append(graph_file_name)
-                self._make_graph({}, graph_file_name, header=["author_i", "author_j", "weight"])
-                LOGGER.info("Building coauthorship graph %s", ref_date)
-                # Listing works in that time period
-                for work_id in works_list:
-                    self.coauthors_graph(work_id, graph_file_name)
-                self.sum_edges(graph_file_name)
-                LOGGER.info("Graph stored at %s", graph_file_name)
-        with open("%s/files.json" % coauthorship_graphs_dir, "wb") as files:
+        graphs_dir, windows = self.graph_windows("coauthorship", **kwargs)
+        return self._make_window_graphs("coauthorship", graphs_dir, windows, **kwargs)
+
+    def _make_window_graphs(self, g_type, graphs_dir, windows, **kwargs):
+        """
+        Builds graph of `g_type` for each (graph_file_name, works_list) in
+        `windows`, one after another or over a pool of `workers` processes,
+        and lists the graph files in files.json. Workers read works from a
+        memory-mapped store, instead of receiving a copy, and build each
+        window as the serial mode does, so the files are the same. If
+        `max_authors` is set, the hyper-authored works report is saved in
+        `graphs_dir`.
+
+        Windows whose graph file is in `skip_windows` are listed but not
+        built, and `on_window(graph_file, report)` is called after each
+        window is built.
+
+        Returns
+        -------
+        list:
+            Paths of the graph files.
+        """
+        skip_windows = set(kwargs.pop("skip_windows", ()))
+        on_window = kwargs.pop("on_window", None)
+        created_files = [self._snapshot_path(graph_file_name, **kwargs)
+                         for graph_file_name, _ in windows]
+        pending = [window for window, graph_file in zip(windows, created_files)
+                   if graph_file not in skip_windows]
+        self.instrument.add_items(sum(len(works_list) for _, works_list in pending))
+        reports = self._build_windows(g_type, pending, on_window, **kwargs)
+        if kwargs.get("max_authors", None) is not None:
+            hyper_report_path = "%s/hyper_report.json" % set_dir(graphs_dir)
+            windows_reports = {}
+            # Keeping reports of the windows not rebuilt
+            if skip_windows and os.path.exists(hyper_report_path):
+                with open(hyper_report_path, "r") as hyper_report_file:
+                    windows_reports = json.load(hyper_report_file)["windows"]
+            windows_reports.update(zip([self._snapshot_path(graph_file_name, **kwargs)
+                                        for graph_file_name, _ in pending], reports))
+            windows_reports = dict((graph_file, windows_reports[graph_file])
+                                   for graph_file in created_files
+                                   if graph_file in windows_reports)
+            hyper_report = {"max_authors": kwargs["max_authors"],
+                            "hyper_mode": kwargs.get("hyper_mode", "hyperedge"),
+                            "avoided_edges": sum(report["avoided_edges"]
+                                                 for report in windows_reports.itervalues()),
+                            "windows": windows_reports}
+            dump(hyper_report, hyper_report_path)
+            LOGGER.info("%d edges avoided in hyper-authored works", hyper_report["avoided_edges"])
+        with open("%s/files.json" % set_dir(graphs_dir), "wb") as files:
             files.write(json.dumps(created_files))
+        for graph_file in created_files:
+            if graph_file not in skip_windows:
+                self.instrument.add_output(graph_file)
         return created_files
 
-    def coauthors_graph(self, work_id, graph_file_name):
+    def _build_windows(self, g_type, windows, on_window=None, **kwargs):
+        """
+        Builds windows for `_make_window_graphs`, in order, returning the
+        report of each of them and calling `on_window(graph_file, report)`
+        as each window is done.
+        """
+        if not windows:
+            return []
+        workers = kwargs.get("workers", 1)
+        parallel = workers > 1 and len(windows) > 1
+        graph_files = [self._snapshot_path(graph_file_name, **kwargs)
+                       for graph_file_name, _ in windows]
+        # The sparse engine reads works from store columns
+        if not parallel and (kwargs.get("engine", "loop") != "sparse" or
+                             isinstance(self.works, WorksStore)):
+            reports = (self.make_window_graph(g_type, graph_file_name, works_list, **kwargs)
+                       for graph_file_name, works_list in windows)
+            return self._collect_reports(graph_files, reports, on_window)
+        store_dir = None
+        if isinstance(self.works, WorksStore):
+            store_path = self.works.store_path
+        else:
+            store_dir = tempfile.mkdtemp(prefix="works_", dir=self.output_dir_path)
+            store_path = "%s/store" % store_dir
+            WorksStore.write(self.works, store_path)
+        tasks = [(g_type, graph_file_name, works_list, kwargs)
+                 for graph_file_name, works_list in windows]
+        try:
+            if parallel:
+                pool = multiprocessing.Pool(workers, _init_window_worker,
+                                            (self.output_dir_path, store_path,
+                                             self.instrument.settings()))
+                try:
+                    return self._collect_reports(graph_files,
+                                                 self._worker_reports(
+                                                     pool.imap(_make_window_graph, tasks)),
+                                                 on_window)
+                finally:
+                    pool.close()
+                    pool.join()
+            _init_window_worker(self.output_dir_path, store_path, self.instrument.settings())
+            return self._collect_reports(graph_files,
+                                         self._worker_reports(_make_window_graph(task)
+                                                              for task in tasks),
+                                         on_window)
+        finally:
+            if store_dir is not None:
+                shutil.rmtree(store_dir, ignore_errors=True)
+
+    def _worker_reports(self, results):
+        """
+        Yields reports of (report, window record) `results` of window
+        workers, keeping their records as windows of the current stage.
+        """
+        for report, record in results:
+            self.instrument.add_record(record)
+            yield report
+
+    @staticmethod
+    def _collect_reports(graph_files, reports, on_window=None):
+        """
+        Returns list of `reports` of the windows building `graph_files`,
+        calling `on_window(graph_file, report)` as each one is done.
+        """
+        collected = []
+        for graph_file, report in izip(graph_files, reports):
+            if on_window is not None:
+                on_window(graph_file, report)
+            collected.append(report)
+        return collected
+
+    def make_window_graph(self, g_type, graph_file_name, works_list, **kwargs):
+        """
+        Writes graph of `g_type`, 'coauthorship' or 'citations', with edges
+        from works in `works_list`, at `graph_file_name`. Takes the same
+        keyword arguments as `make_coauthorship_graphs`.
+
+        Returns
+        -------
+        dict:
+            Counts of hyper-authored works and avoided edges, None if
+            `max_authors` is not set.
+        """
+        snapshot_path = self._snapshot_path(graph_file_name, **kwargs)
+        with self.instrument.stage("window", g_type=g_type, graph_file=snapshot_path):
+            self.instrument.add_items(len(works_list))
+            self.instrument.add_output(snapshot_path)
+            return self._write_window_graph(g_type, graph_file_name, works_list, **kwargs)
+
+    def _write_window_graph(self, g_type, graph_file_name, works_list, **kwargs):
+        """
+        Writes graph of a time period for `make_window_graph`.
+        """
+        LOGGER.info("Building %s graph %s", g_type, graph_file_name)
+        if g_type == "coauthorship":
+            work_edges, work_graph, directed = self.coauthors_edges, self.coauthors_graph, False
+        else:
+            work_edges, work_graph, directed = self.citations_edges, self.citations_graph, True
+        hyper = None
+        if kwargs.get("max_authors", None) is not None:
+            hyper = HyperWorks(kwargs["max_authors"], kwargs.get("hyper_mode", "hyperedge"))
+        binary = kwargs.get("snapshot_format", "csv") == "binary"
+        weight_dtype = kwargs.get("weight_dtype", "float64")
+        snapshot_path = self._snapshot_path(graph_file_name, **kwargs)
+        if kwargs.get("engine", "loop") == "sparse":
+            import projection
+            if g_type == "coauthorship":
+                edges = projection.coauthorship_edges(self.works, works_list, hyper)
+            else:
+                edges = projection.citation_edges(self.works, works_list, hyper)
+            if binary:
+                write_snapshot(snapshot_path, *edges, weight_dtype=weight_dtype)
+            else:
+                write_edges(graph_file_name, izip(*[column.tolist() for column in edges]),
+                            GRAPH_HEADER)
+        elif kwargs.get("in_memory", False):
+            edges = self._make_accumulator(**kwargs)
+            for work_id in works_list:
+                for author_a, author_b, weight in work_edges(work_id, hyper):
+                    edges.add_edge(author_a, author_b, weight, directed=directed)
+            if binary:
+                write_snapshot_edges(snapshot_path, edges, weight_dtype=weight_dtype)
+                edges.clear()
+            else:
+                edges.write(graph_file_name, header=GRAPH_HEADER)
+        else:
+            self._make_graph({}, graph_file_name, header=GRAPH_HEADER)
+            # Listing works in that time period
+            for work_id in works_list:
+                work_graph(work_id, graph_file_name, hyper)
+            if binary:
+                # Merged straight into the snapshot, the csv is not rewritten
+                csv_to_snapshot(graph_file_name, snapshot_path, weight_dtype=weight_dtype,
+                                max_memory=kwargs.get("max_memory", 1024**3),
+                                tmp_dir=kwargs.get("tmp_dir", None))
+                os.remove(graph_file_name)
+            else:
+                self.sum_edges(graph_file_name,
+                               max_memory=kwargs.get("max_memory", 1024**3),
+                               tmp_dir=kwargs.get("tmp_dir", None))
+        LOGGER.info("Graph stored at %s", snapshot_path)
+        if hyper is None:
+            return None
+        if hyper.mode == "hyperedge":
+            hyper.write(graph_file_name.replace(".csv", "_hyperedges.csv"),
+                        HYPEREDGES_HEADER[g_type])
+        LOGGER.info("%d hyper-authored works, %d edges avoided",
+                    len(hyper.hyper_works), hyper.avoided_edges)
+        return hyper.report()
+
+    def coauthors_graph(self, work_id, graph_file_name, hyper=None):
         """
         Saves coauthorship graph for specified work_id in graph file
         at graph_file_name.
@@ -315,7 +1074,16 @@ class APSBuilder(Builder):
             index in list of works
         graph_file_name: str
             name of graph file to append more edges
+        hyper: HyperWorks
+            If given, bounds the expansion of hyper-authored works.
         """
+        if hyper is not None:
+            edges = {}
+            for author_i, author_j, weight in self.coauthors_edges(work_id, hyper):
+                self.add_edge(edges, author_i, author_j, weight)
+            if edges:
+                self._make_graph(edges, graph_file_name, open_mode="a")
+            return
         authors_list = self.works[work_id][WORK_INFO][AUTHORS_LIST]
         authors_count = len(authors_list)
         # Non-individual works
@@ -336,6 +1104,52 @@ class APSBuilder(Builder):
             self.add_edge(edges, authors_list[0], authors_list[0], 0.0)
             self._make_graph(edges, graph_file_name, open_mode="a")
 
+    def coauthors_edges(self, work_id, hyper=None):
+        """
+        Yields (author_i, author_j, weight) for every pair of co-authors of
+        work `work_id`, or a null weighted self-loop for solo works. If
+        `hyper` is given, hyper-authored works are expanded as it selects.
+        """
+        authors_list = self.works[work_id][WORK_INFO][AUTHORS_LIST]
+        authors_count = len(authors_list)
+        # Non-individual works
+        if authors_count > 1:
+            weight = 1.0/(authors_count-1)
+            expanded = authors_list
+            if hyper is not None:
+                expanded = hyper.select(work_id, authors_list)
+                if expanded is None:
+                    hyper.hyperedges.append([work_id, weight,
+                                             " ".join(str(author) for author in authors_list)])
+                    expanded = []
+                hyper.avoided_edges += (authors_count*(authors_count-1) -
+                                        len(expanded)*(len(expanded)-1))//2
+            for i in xrange(len(expanded)):
+                for j in xrange(i+1, len(expanded)):
+                    yield expanded[i], expanded[j], weight
+        # If solo-work, then represent edge with null weight
+        if authors_count == 1:
+            yield authors_list[0], authors_list[0], 0.0
+
+    @staticmethod
+    def _snapshot_path(graph_file_name, **kwargs):
+        """
+        Returns path of the graph file written for `graph_file_name`, the
+        .snap file if `snapshot_format` is 'binary'.
+        """
+        if kwargs.get("snapshot_format", "csv") == "binary":
+            return snapshot_file_name(graph_file_name)
+        return graph_file_name
+
+    @staticmethod
+    def _make_accumulator(**kwargs):
+        """
+        Returns an EdgeAccumulator set with `max_memory` and `tmp_dir`.
+        """
+        return EdgeAccumulator(max_memory=kwargs.get("max_memory", 1024**3),
+                               tmp_dir=kwargs.get("tmp_dir", None))
+
+    @instrumented("citation_graphs")
     def make_citation_graphs(self, **kwargs):
         """
         For each time period, writes a file representing a graph in which
@@ -356,41 +1170,76 @@ class APSBuilder(Builder):
         until_year: int
             For time range, considering works published until this year.
             Default: inf.
+        in_memory: bool
+            If True, edges of each time period are added up in memory and
+            the graph file is written once, sorted by (author_i, author_j).
+            If edges are spilled to disk, weights are only equal to the
+            other modes up to float rounding, see `edges.EdgeAccumulator`.
+            Default: False.
+        max_memory: int
+            Memory budget in bytes for edges held in memory, beyond which
+            sorted runs are spilled to disk.
+            Default: 1 GB.
+        tmp_dir: str
+            Directory for spilled runs.
+            Default: system temporary directory.
+        workers: int
+            Number of processes building time periods in parallel.
+            Default: 1.
+        engine: str
+            If 'sparse', each time period is projected with sparse matrix
+            products on the works incidence matrices, see `projection`;
+            requires scipy. If 'loop', edges are built per pair of authors.
+            Default: 'loop'.
+        max_authors: int
+            If set, works with more authors are hyper-authored and are not
+            fully expanded, see `hyper`. A report of the avoided edges is
+            saved as hyper_report.json.
+            Default: None.
+        hyper_mode: str
+            'hyperedge' writes hyper-authored works to a _hyperedges.csv side
+            file, 'cap' expands their first `max_authors` authors and 'sample'
+            a seeded sample of `max_authors` authors.
+            Default: 'hyperedge'.
+        snapshot_format: str
+            'csv' writes graph files as csv, 'binary' as compact .snap
+            files, see `snapshot_writer`.
+            Default: 'csv'.
+        weight_dtype: str
+            Weights type of binary snapshot files, 'float32' or 'float64'.
+            Default: 'float64'.
 
         Returns
         -------
         dict:
             Dictionary with paths for all created files.
         """
-        resolution = kwargs.get("resolution", "year")
+        graphs_dir, windows = self.graph_windows("citations", **kwargs)
+        return self._make_window_graphs("citations", graphs_dir, windows, **kwargs)
+
+    def graph_windows(self, g_type, **kwargs):
+        """
+        Returns the directory of graphs of `g_type`, 'coauthorship' or
+        'citations', and (graph_file_name, works_list) of each time period in
+        range. Takes the same keyword arguments as `make_coauthorship_graphs`
+        and `make_citation_graphs`, with their defaults.
+        """
+        resolution = kwargs.get("resolution", GRAPH_RESOLUTION[g_type])
         from_year = kwargs.get("from_year", 0)
         until_year = kwargs.get("until_year", float("inf"))
-        grouped_works = self.group_by_time(self.works, resolution=resolution)
-        citation_graphs_dir = "%s/citation_graphs" % self.output_dir_path
-        set_dir(citation_graphs_dir)
-        created_files = []
+        grouped_works = self.group_by_time(self.works, resolution=resolution,
+                                           time_index=self.get_time_index())
+        graphs_dir = set_dir("%s/%s" % (self.output_dir_path, GRAPHS_DIR_NAME[g_type]))
+        windows = []
         # For each time mark T
         for (ref_date, works_list) in grouped_works:
             if ref_date.year >= from_year and ref_date.year < until_year:
-                LOGGER.info("Building citation graph %s", ref_date)
-                graph_file_name = self.get_graph_file_name(citation_graphs_dir,
-                                                           ref_date,
-                                                           resolution,
-                                                           "citations")
-                self._make_graph({},
-                                 graph_file_name,
-                                 header=["author_i", "author_j", "weight"])
-                # For each work i in time T
-                for work_id in works_list:
-                    self.citations_graph(work_id, graph_file_name)
-                created_files.append(graph_file_name)
-                self.sum_edges(graph_file_name)
-                LOGGER.info("Graph stored at %s", graph_file_name)
-        with open("%s/files.json" % citation_graphs_dir, "wb") as files:
-            files.write(json.dumps(created_files))
-        return created_files
+                graph_file_name = self.get_graph_file_name(graphs_dir, ref_date,
+                                                           resolution, g_type)
+                windows.append((graph_file_name, works_list))
+        return graphs_dir, windows
 
-    def citations_graph(self, work_id, graph_file_name):
+    def citations_graph(self, work_id, graph_file_name, hyper=None):
         """
         Saves citation graph for specified work_id in graph file
         at graph_file_name.
@@ -401,7 +1250,16 @@ class APSBuilder(Builder):
             index in list of works
         graph_file_name: str
             name of graph file to append more edges
+        hyper: HyperWorks
+            If given, bounds the expansion of hyper-authored works.
         """
+        if hyper is not None:
+            edges = {}
+            for author_a, author_b, weight in self.citations_edges(work_id, hyper):
+                self.add_edge(edges, author_a, author_b, weight, directed=True)
+            if edges:
+                self._make_graph(edges, graph_file_name, open_mode="a+")
+            return
         # Loading list of authors and list of cited works
         cited_works = self.works[work_id][WORK_INFO][CITED_WORKS]
         work_authors = self.works[work_id][WORK_INFO][AUTHORS_LIST]
@@ -417,16 +1275,115 @@ class APSBuilder(Builder):
                     # For each author y \in work j
                     for author_b in cited_authors:
                         self.add_edge(edges, author_a, author_b, weight, directed=True)
-            except KeyError:
+            # Cited work without authors
+            except (KeyError, ZeroDivisionError):
                 pass
             self._make_graph(edges, graph_file_name, open_mode="a+")
 
+    def citations_edges(self, work_id, hyper=None):
+        """
+        Yields (author_a, author_b, weight) for every author a of work
+        `work_id` and author b of a work cited by it. If `hyper` is given,
+        citations from or to hyper-authored works are expanded as it selects.
+        """
+        cited_works = self.works[work_id][WORK_INFO][CITED_WORKS]
+        work_authors = self.works[work_id][WORK_INFO][AUTHORS_LIST]
+        citing_authors = work_authors
+        if hyper is not None:
+            citing_authors = hyper.select(work_id, work_authors)
+        for cited_work in cited_works:
+            cited_authors = self.works[cited_work][WORK_INFO][AUTHORS_LIST]
+            # Cited work without authors
+            if not len(cited_authors):
+                continue
+            weight = 1.0/len(cited_authors)
+            if hyper is not None:
+                expanded = hyper.select(cited_work, cited_authors)
+                pairs_count = len(work_authors)*len(cited_authors)
+                if citing_authors is None or expanded is None:
+                    hyper.hyperedges.append([work_id, cited_work, weight])
+                    hyper.avoided_edges += pairs_count
+                    continue
+                hyper.avoided_edges += pairs_count - len(citing_authors)*len(expanded)
+                cited_authors = expanded
+            for author_a in citing_authors:
+                for author_b in cited_authors:
+                    yield author_a, author_b, weight
+
+
+def _as_bytes(work_id):
+    """
+    Returns `work_id` as a byte string, as read from the citations csv.
+    """
+    if isinstance(work_id, unicode):
+        return work_id.encode("utf-8")
+    return work_id
+
+
+def _lookup(keys, values, queries):
+    """
+    Returns values of `queries` in the sorted `keys` table and a mask of
+    queries found.
+    """
+    if not len(keys):
+        return np.zeros(len(queries), dtype=values.dtype), np.zeros(len(queries), dtype=bool)
+    positions = np.searchsorted(keys, queries)
+    positions[positions == len(keys)] = 0
+    found = keys[positions] == queries
+    return values[positions], found
+
+
+# Builder used by window workers, set by _init_window_worker
+_WINDOW_BUILDER = None
+
+
+def _init_window_worker(output_dir_path, store_path, instrument_settings=None):
+    """
+    Initializes a window worker with works mapped from store at `store_path`
+    and the profile settings of the parent builder.
+    """
+    global _WINDOW_BUILDER
+    _WINDOW_BUILDER = APSBuilder(output_dir_path=output_dir_path,
+                                 **(instrument_settings or {}))
+    _WINDOW_BUILDER.works = WorksStore(store_path)
+
+
+def _make_window_graph(task):
+    """
+    Worker for `APSBuilder._make_window_graphs`: builds one time period.
+    Returns its report and the measures of the window.
+    """
+    g_type, graph_file_name, works_list, kwargs = task
+    report = _WINDOW_BUILDER.make_window_graph(g_type, graph_file_name, works_list, **kwargs)
+    return report, _WINDOW_BUILDER.instrument.records.pop()
+
+
+def _parse_works_chunk(files_list):
+    """
+    Worker for `APSBuilder.find_works`: parses a chunk of metadata files
+    with a local authors table.
+
+    Returns
+    -------
+    tuple:
+        (retrieved works, author names ordered by their local index, work
+        id of each file or None)
+    """
+    authors_map = {}
+    works = []
+    works_ids = []
+    for file_path in files_list:
+        work_date, work_info = APSBuilder.read_work(file_path, authors_map)
+        works_ids.append(work_info[WORK_ID] if work_date else None)
+        if work_date:
+            works.append((work_date, work_info))
+    authors_names = sorted(authors_map, key=authors_map.get)
+    return works, authors_names, works_ids
+
 
 if __name__ == "__main__":
-    APS_BUILDER = APSBuilder()
-    #APS_BUILDER.find_works()
-    APS_BUILDER.load_from_dump()
-    #APS_BUILDER.load_citations()
-    #APS_BUILDER.dump_data()
-    APS_BUILDER.make_citation_graphs(resolution="year", until_year=1930)
-    APS_BUILDER.make_coauthorship_graphs(resolution="year", until_year=1930)
+    configure_logging()
+    # Stages are run by the pipeline, which skips the ones up to date
+    from pipeline import APSPipeline
+    APSPipeline().run(coauthorship={"resolution": "year", "until_year": 1930},
+                      citations={"resolution": "year", "until_year": 1930})
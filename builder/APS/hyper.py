@@ -0,0 +1,108 @@
+"""
+Bounded expansion of hyper-authored works.
+
+A work with more than `max_authors` authors is hyper-authored. Expanding it
+into a clique, or a bipartite block for its citations, takes a number of
+edges quadratic in its authors, so these works are handled by one of the
+modes:
+
+    hyperedge: the work is not expanded and is written to a side file
+    cap:       only its first `max_authors` authors are expanded
+    sample:    a random sample of `max_authors` authors is expanded, the
+               sample of a work is the same in every run
+
+Edge weights keep using the full number of authors.
+"""
+import csv
+import numpy as np
+
+
+HYPER_MODES = ["hyperedge", "cap", "sample"]
+
+
+def sample_ranks(work_id, authors_count, max_authors):
+    """
+    Returns sorted positions of the authors sampled from work `work_id`,
+    seeded by the work index.
+    """
+    random_state = np.random.RandomState(int(work_id))
+    return np.sort(random_state.choice(authors_count, max_authors, replace=False))
+
+
+class HyperWorks(object):
+    """
+    Selects the authors expanded for hyper-authored works of one graph and
+    keeps count of the edges avoided.
+
+    Attributes
+    ----------
+    max_authors: int
+        Largest number of authors of a work expanded in full.
+    mode: str
+        'hyperedge', 'cap' or 'sample'.
+    hyper_works: set
+        Hyper-authored works found.
+    avoided_edges: int
+        Author pairs not expanded, counting repeated pairs.
+    hyperedges: list
+        Rows for the side file in 'hyperedge' mode.
+
+    Methods
+    -------
+    is_hyper(authors_list)
+        Returns True if work with `authors_list` is hyper-authored.
+    select(work_id, authors_list)
+        Returns authors expanded for the work.
+    report()
+        Returns counts of hyper-authored works and avoided edges.
+    write(output_path, header)
+        Writes hyperedges side file.
+    """
+
+    def __init__(self, max_authors, mode="hyperedge"):
+        if mode not in HYPER_MODES:
+            raise ValueError("Unknown hyper mode %s, expected one of %s" % (mode, HYPER_MODES))
+        self.max_authors = max_authors
+        self.mode = mode
+        self.hyper_works = set()
+        self.avoided_edges = 0
+        self.hyperedges = []
+
+    def is_hyper(self, authors_list):
+        """
+        Returns True if a work with `authors_list` is hyper-authored.
+        """
+        return len(authors_list) > self.max_authors
+
+    def select(self, work_id, authors_list):
+        """
+        Returns the authors expanded for work `work_id`: all of them if it is
+        not hyper-authored, None in 'hyperedge' mode, or the capped or
+        sampled authors otherwise.
+        """
+        if not self.is_hyper(authors_list):
+            return authors_list
+        self.hyper_works.add(int(work_id))
+        if self.mode == "hyperedge":
+            return None
+        if self.mode == "cap":
+            return authors_list[:self.max_authors]
+        return [authors_list[rank] for rank in
+                sample_ranks(work_id, len(authors_list), self.max_authors)]
+
+    def report(self):
+        """
+        Returns dictionary with counts of hyper-authored works and avoided
+        edges.
+        """
+        return {"hyper_works": len(self.hyper_works),
+                "avoided_edges": self.avoided_edges}
+
+    def write(self, output_path, header):
+        """
+        Writes hyperedges rows, with `header`, as a csv file.
+        """
+        with open(output_path, "wb") as hyper_file:
+            writer = csv.writer(hyper_file)
+            writer.writerow(header)
+            writer.writerows(self.hyperedges)
@@ -0,0 +1,297 @@
+"""
+Cached build pipeline for the APS stages.
+
+Stages and the artifacts they produce:
+
+    works      metadata json files -> works, works map, authors map,
+               manifest and time index dumps, and the columnar works store
+               read by tools/works.py
+    citations  citations csv file -> cited works of each work, saved in the
+               works dump
+    graphs     works -> one graph file per time period and files.json, for
+               the co-authorship and the citation graphs
+
+Each artifact is keyed by a hash of its inputs and parameters, kept in
+pipeline_state.json in the output directory. A stage only runs again when
+its key changed: works and citations are then updated incrementally when a
+previous build exists, and only the time periods whose works changed are
+rebuilt. The state is saved after each graph file, so an interrupted run
+resumes at the last completed one.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+if __name__ == "__main__":
+    import sys
+    sys.path.append("../")
+from aps_builder import APSBuilder, WORK_INFO, CITED_WORKS
+from _helper import configure_logging, LOGGER
+from works_store import WorksStore
+from works import WORKS_STORE_NAME
+
+
+STATE_VERSION = 1
+# Parameters of graph building which do not change the graph files
+RUN_PARAMETERS = ["workers", "max_memory", "tmp_dir"]
+DUMP_NAMES = ["aps_works.json", "aps_works_map.json", "aps_authors_map.json",
+              "aps_works_manifest.json", "aps_works_time.json"]
+
+
+def hash_key(*values):
+    """
+    Returns sha1 hex digest of the json representation of `values`.
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True)).hexdigest()
+
+
+class APSPipeline(object):
+    """
+    Runs the APS stages, skipping the ones whose inputs did not change
+    since the last run.
+
+    Attributes
+    ----------
+    builder: APSBuilder
+        Builder running the stages.
+    state_path: str
+        Path of the json file with the keys of the built artifacts.
+    state: dict
+        Keys of the built artifacts.
+
+    Methods
+    -------
+    run(**kwargs)
+        Runs all stages.
+    run_works(**kwargs)
+        Builds or updates works and citations.
+    run_graphs(g_type, **kwargs)
+        Builds graph files of `g_type` whose works changed.
+    """
+
+    def __init__(self, builder=None, **kwargs):
+        """
+        Parameters
+        ----------
+        builder: APSBuilder
+            Builder running the stages, if None one is created with
+            `kwargs`.
+        """
+        self.builder = builder if builder is not None else APSBuilder(**kwargs)
+        self.state_path = "%s/pipeline_state.json" % self.builder.output_dir_path
+        self.state = {"version": STATE_VERSION, "works": {}, "graphs": {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as state_file:
+                state = json.load(state_file)
+            if state.get("version") == STATE_VERSION:
+                self.state = state
+
+    def save_state(self):
+        """
+        Writes the state file, replacing it at once so an interrupted run
+        leaves a valid state.
+        """
+        with open(self.state_path + ".tmp", "w") as state_file:
+            json.dump(self.state, state_file)
+        os.rename(self.state_path + ".tmp", self.state_path)
+
+    def run(self, **kwargs):
+        """
+        Runs works, citations and graphs stages, and saves the build report,
+        see `APSBuilder.dump_report`.
+
+        Parameters
+        ----------
+        bulk: bool
+            If True, citations are loaded in bulk mode.
+            Default: False.
+        coauthorship: dict
+            Keyword arguments of `APSBuilder.make_coauthorship_graphs`, None
+            skips co-authorship graphs.
+            Default: {}.
+        citations: dict
+            Keyword arguments of `APSBuilder.make_citation_graphs`, None
+            skips citation graphs.
+            Default: {}.
+
+        Returns
+        -------
+        dict:
+            Paths of the graph files of each graph type.
+        """
+        self.run_works(bulk=kwargs.get("bulk", False))
+        created_files = {}
+        for g_type in ["coauthorship", "citations"]:
+            graph_kwargs = kwargs.get(g_type, {})
+            if graph_kwargs is not None:
+                created_files[g_type] = self.run_graphs(g_type, **graph_kwargs)
+        self.builder.dump_report()
+        return created_files
+
+    def works_key(self):
+        """
+        Returns key of the metadata files, from their paths, sizes and
+        modification times.
+        """
+        builder = self.builder
+        return hash_key(sorted([builder._manifest_key(file_path),
+                                builder._file_signature(file_path)]
+                               for file_path in builder.list_work_files()))
+
+    def citations_key(self):
+        """
+        Returns key of the citations csv file, from its size and
+        modification time.
+        """
+        return hash_key(self.builder._file_signature(self.builder.citation_csv_path))
+
+    def _has_dumps(self):
+        """
+        Returns True if all works dumps exist.
+        """
+        return all(os.path.exists("%s/%s" % (self.builder.output_dir_path, dump_name))
+                   for dump_name in DUMP_NAMES)
+
+    def run_works(self, **kwargs):
+        """
+        Loads works and citations into the builder. The works store is
+        opened as it is if metadata and citations files did not change,
+        metadata files are parsed incrementally if only they changed, and
+        citations are reloaded if the citations file changed. Without dumps,
+        everything is parsed. Works are left in the builder as a store.
+
+        Parameters
+        ----------
+        bulk: bool
+            If True, citations are loaded in bulk mode.
+            Default: False.
+        """
+        bulk = kwargs.get("bulk", False)
+        builder = self.builder
+        works_key = self.works_key()
+        citations_key = self.citations_key()
+        works_state = self.state["works"]
+        store_built = os.path.exists("%s/%s/meta.json" % (builder.output_dir_path,
+                                                         WORKS_STORE_NAME))
+        up_to_date = works_state == {"works": works_key, "citations": citations_key}
+        if up_to_date and store_built and self._has_dumps():
+            LOGGER.info("Pipeline: works up to date")
+            builder.load_from_store()
+        elif not self._has_dumps():
+            LOGGER.info("Pipeline: building works")
+            builder.find_works()
+            builder.load_citations(bulk=bulk)
+            builder.dump_data()
+        else:
+            works_changed = works_state.get("works") != works_key
+            citations_changed = works_state.get("citations") != citations_key
+            if works_changed:
+                LOGGER.info("Pipeline: updating works")
+                builder.update_works(bulk=bulk)
+            else:
+                LOGGER.info("Pipeline: works up to date")
+                builder.load_from_dump()
+            if citations_changed:
+                LOGGER.info("Pipeline: reloading citations")
+                for work in builder.works:
+                    work[WORK_INFO][CITED_WORKS] = []
+                builder.load_citations(bulk=bulk)
+                builder.dump_data()
+        if not up_to_date or not store_built:
+            # Columnar copy of the works, read by the graphs, analytics and notebooks
+            builder.dump_store()
+        self.state["works"] = {"works": works_key, "citations": citations_key}
+        self.save_state()
+
+    def window_key(self, g_type, works_list, params_key):
+        """
+        Returns key of a graph file of `g_type` built from `works_list`, a
+        range of works, with parameters `params_key`, from the authors of
+        the works and, for citation graphs, the authors of the cited works.
+        Work indexes are part of the key, so the graph files of time periods
+        after works whose indexes shifted, see `APSBuilder.update_works`,
+        are rebuilt. The slices of the store columns of the window are
+        hashed as they are, without a python object per work.
+        """
+        works = self.builder.works
+        works_range = np.array([works_list[0], works_list[-1] + 1] if len(works_list)
+                               else [0, 0], dtype=np.int64)
+        key = hashlib.sha1(params_key)
+        key.update(works_range.astype("<i8").tostring())
+        window = np.arange(*works_range)
+        key.update("authors")
+        for values in _rows(works.authors_offsets, works.authors_index, window):
+            key.update(values.astype("<i8").tostring())
+        if g_type != "coauthorship":
+            counts, cited_works = _rows(works.cited_offsets, works.cited_index, window)
+            key.update("cited")
+            key.update(counts.astype("<i8").tostring())
+            for values in _rows(works.authors_offsets, works.authors_index, cited_works):
+                key.update(values.astype("<i8").tostring())
+        return key.hexdigest()
+
+    def run_graphs(self, g_type, **kwargs):
+        """
+        Builds the graph files of `g_type`, 'coauthorship' or 'citations',
+        which are missing or whose key changed, and saves the state after
+        each of them. Takes the keyword arguments of
+        `APSBuilder.make_coauthorship_graphs`.
+
+        Returns
+        -------
+        list:
+            Paths of the graph files.
+        """
+        builder = self.builder
+        if not isinstance(builder.works, WorksStore):
+            # Window keys are hashed from the store columns
+            builder.dump_store()
+        params_key = hash_key(g_type, dict((param, value) for param, value in kwargs.iteritems()
+                                           if param not in RUN_PARAMETERS))
+        graphs_dir, windows = builder.graph_windows(g_type, **kwargs)
+        built = self.state["graphs"].get(g_type, {})
+        windows_keys = {}
+        skip_windows = []
+        for graph_file_name, works_list in windows:
+            graph_file = builder._snapshot_path(graph_file_name, **kwargs)
+            windows_keys[graph_file] = self.window_key(g_type, works_list, params_key)
+            if built.get(graph_file) == windows_keys[graph_file] and os.path.exists(graph_file):
+                skip_windows.append(graph_file)
+        # Dropping files of time periods no longer built
+        built = dict((graph_file, window_key) for graph_file, window_key in built.iteritems()
+                     if graph_file in skip_windows)
+        self.state["graphs"][g_type] = built
+        LOGGER.info("Pipeline: %d of %d %s graphs up to date", len(skip_windows),
+                    len(windows), g_type)
+
+        def on_window(graph_file, _):
+            """
+            Records a graph file as built.
+            """
+            built[graph_file] = windows_keys[graph_file]
+            self.save_state()
+
+        return builder._make_window_graphs(g_type, graphs_dir, windows,
+                                           skip_windows=skip_windows,
+                                           on_window=on_window, **kwargs)
+
+
+def _rows(offsets, index, rows):
+    """
+    Returns (length of each row, concatenated values) of `rows` of the CSR
+    column `index` with `offsets`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.asarray(offsets)[rows]
+    counts = np.asarray(offsets)[rows + 1] - starts
+    # Position of every value of the rows, row after row
+    positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+        np.arange(counts.sum(), dtype=np.int64)
+    return counts, np.asarray(index)[positions]
+
+
+if __name__ == "__main__":
+    configure_logging()
+    APS_PIPELINE = APSPipeline()
+    APS_PIPELINE.run(coauthorship={"resolution": "year", "until_year": 1930},
+                     citations={"resolution": "year", "until_year": 1930})
@@ -0,0 +1,191 @@
+"""
+Sparse matrix projection of works onto author graphs.
+
+For the works of a time period, B is the work x author incidence matrix
+(B[w, a] counts author a in work w), W the diagonal of co-authorship
+weights 1/(k_w - 1), C the work x cited work matrix and D the diagonal of
+citation weights 1/k_v. Then
+
+    co-authorship: B^T W B
+    citation:      B^T C D B
+
+give the weighted author graphs built by `APSBuilder.coauthors_edges` and
+`APSBuilder.citations_edges`. Works are read from the CSR columns of a
+`works_store.WorksStore`. Hyper-authored works are bounded as in
+`hyper.HyperWorks`, masking entries of B and C.
+"""
+import numpy as np
+import scipy.sparse as sp
+from edges import pack_edges
+from hyper import sample_ranks
+
+
+def _csr_rows(offsets, works_idx):
+    """
+    Returns, for CSR `offsets`, the positions of the entries of rows
+    `works_idx`, the row of each entry and the entries count of each row.
+    """
+    starts = offsets[works_idx]
+    counts = offsets[works_idx+1] - starts
+    rows = np.repeat(np.arange(len(works_idx)), counts)
+    positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return positions, rows, counts
+
+
+def _expanded_entries(works_idx, rows, counts, hyper):
+    """
+    Returns mask of the authors entries expanded, as selected by `hyper`:
+    none of the authors of hyper-authored works in 'hyperedge' mode, or
+    their first or sampled `max_authors` authors.
+    """
+    expanded = np.ones(len(rows), dtype=bool)
+    if hyper is None:
+        return expanded
+    hyper_rows = counts > hyper.max_authors
+    expanded[hyper_rows[rows]] = False
+    row_starts = np.cumsum(counts) - counts
+    if hyper.mode == "cap":
+        ranks = np.arange(len(rows)) - row_starts[rows]
+        expanded |= hyper_rows[rows] & (ranks < hyper.max_authors)
+    elif hyper.mode == "sample":
+        for row in np.flatnonzero(hyper_rows):
+            expanded[row_starts[row] + sample_ranks(works_idx[row], counts[row],
+                                                    hyper.max_authors)] = True
+    return expanded
+
+
+def _incidence(works, works_idx, hyper=None):
+    """
+    Returns incidence matrix of works `works_idx` over their expanded
+    authors, the authors of each column and the authors count of each work.
+    """
+    positions, rows, counts = _csr_rows(works.authors_offsets, works_idx)
+    expanded = _expanded_entries(works_idx, rows, counts, hyper)
+    positions, rows = positions[expanded], rows[expanded]
+    authors, columns = np.unique(works.authors_index[positions], return_inverse=True)
+    incidence = sp.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                              shape=(len(works_idx), len(authors)))
+    incidence.sum_duplicates()
+    return incidence, authors, counts
+
+
+def _expanded_counts(counts, hyper):
+    """
+    Returns number of authors expanded for works with `counts` authors.
+    """
+    if hyper is None:
+        return counts
+    if hyper.mode == "hyperedge":
+        return np.where(counts > hyper.max_authors, 0, counts)
+    return np.minimum(counts, hyper.max_authors)
+
+
+def _sorted_edges(v_i, v_j, weights):
+    """
+    Returns edges sorted by (v_i, v_j).
+    """
+    order = np.argsort(pack_edges(v_i, v_j), kind="mergesort")
+    return v_i[order], v_j[order], weights[order]
+
+
+def _works_idx(works_list):
+    """
+    Returns indexes of the works in range `works_list` as an array.
+    """
+    if not len(works_list):
+        return np.empty(0, dtype=np.int64)
+    return np.arange(works_list[0], works_list[-1]+1)
+
+
+def coauthorship_edges(works, works_list, hyper=None):
+    """
+    Returns (author_i, author_j, weight) arrays of the co-authorship graph
+    of works in `works_list`, with author_i <= author_j, sorted. Solo works
+    give a null weighted self-loop, as in `APSBuilder.coauthors_edges`.
+    Hyper-authored works are recorded in `hyper`, if given.
+    """
+    works_idx = _works_idx(works_list)
+    incidence, authors, counts = _incidence(works, works_idx, hyper)
+    weights = np.zeros(len(counts))
+    weights[counts > 1] = 1.0/(counts[counts > 1] - 1)
+    if hyper is not None:
+        hyper_rows = np.flatnonzero(counts > hyper.max_authors)
+        hyper.hyper_works.update(works_idx[hyper_rows].tolist())
+        expanded = _expanded_counts(counts[hyper_rows], hyper)
+        hyper.avoided_edges += int(((counts[hyper_rows]*(counts[hyper_rows]-1) -
+                                     expanded*(expanded-1))//2).sum())
+        if hyper.mode == "hyperedge":
+            for row in hyper_rows.tolist():
+                row_authors = works.authors(works_idx[row]).tolist()
+                hyper.hyperedges.append([int(works_idx[row]), float(weights[row]),
+                                         " ".join(str(author) for author in row_authors)])
+    projection = sp.triu(incidence.T.dot(sp.diags(weights).dot(incidence)), k=1).tocoo()
+    # Self-loops: a work with an author c times pairs it with itself c(c-1)/2
+    # times, and solo works give a null weighted self-loop
+    incidence = incidence.tocoo()
+    repeated = incidence.data*(incidence.data - 1)/2
+    loops_weight = np.bincount(incidence.col, weights=weights[incidence.row]*repeated,
+                               minlength=len(authors))
+    has_loop = np.zeros(len(authors), dtype=bool)
+    has_loop[incidence.col[(counts[incidence.row] == 1) | (repeated > 0)]] = True
+    loops = np.flatnonzero(has_loop)
+    v_i = np.concatenate((authors[projection.row], authors[loops]))
+    v_j = np.concatenate((authors[projection.col], authors[loops]))
+    return _sorted_edges(v_i, v_j, np.concatenate((projection.data, loops_weight[loops])))
+
+
+def citation_edges(works, works_list, hyper=None):
+    """
+    Returns (author_a, author_b, weight) arrays of the citation graph of
+    works in `works_list`, sorted, as in `APSBuilder.citations_edges`.
+    Hyper-authored works are recorded in `hyper`, if given.
+    """
+    works_idx = _works_idx(works_list)
+    citing, citing_authors, citing_counts = _incidence(works, works_idx, hyper)
+    # Work x cited work matrix
+    positions, rows, _ = _csr_rows(works.cited_offsets, works_idx)
+    if hyper is not None:
+        rows = _bound_citations(works, works_idx, positions, rows, citing_counts, hyper)
+        positions = positions[rows >= 0]
+        rows = rows[rows >= 0]
+    cited_works, columns = np.unique(works.cited_index[positions], return_inverse=True)
+    citations = sp.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                              shape=(len(works_idx), len(cited_works)))
+    cited, cited_authors, cited_counts = _incidence(works, cited_works.astype(np.int64), hyper)
+    # Cited works without authors give no edges
+    weights = np.zeros(len(cited_counts))
+    weights[cited_counts > 0] = 1.0/cited_counts[cited_counts > 0]
+    projection = citing.T.dot(citations.dot(sp.diags(weights).dot(cited))).tocsr()
+    projection.eliminate_zeros()
+    projection = projection.tocoo()
+    return _sorted_edges(citing_authors[projection.row], cited_authors[projection.col],
+                         projection.data)
+
+
+def _bound_citations(works, works_idx, positions, rows, citing_counts, hyper):
+    """
+    Records hyper-authored works, avoided edges and hyperedges of the
+    citations at `positions` of the cited works column in `hyper`. Returns
+    the citing row of each citation, or -1 for citations not expanded.
+    """
+    cited_works = works.cited_index[positions].astype(np.int64)
+    cited_counts = works.authors_offsets[cited_works+1] - works.authors_offsets[cited_works]
+    hyper.hyper_works.update(works_idx[citing_counts > hyper.max_authors].tolist())
+    hyper.hyper_works.update(cited_works[cited_counts > hyper.max_authors].tolist())
+    # Cited works without authors give no edges
+    with_authors = cited_counts > 0
+    rows, cited_works, cited_counts = rows[with_authors], cited_works[with_authors], \
+        cited_counts[with_authors]
+    expanded = _expanded_counts(citing_counts[rows], hyper)*_expanded_counts(cited_counts, hyper)
+    hyper.avoided_edges += int((citing_counts[rows]*cited_counts - expanded).sum())
+    bounded_rows = np.full(len(with_authors), -1, dtype=np.int64)
+    if hyper.mode != "hyperedge":
+        bounded_rows[with_authors] = rows
+        return bounded_rows
+    hyperedges = (citing_counts[rows] > hyper.max_authors) | (cited_counts > hyper.max_authors)
+    hyper.hyperedges.extend([[work_id, cited_work, weight] for work_id, cited_work, weight in
+                             zip(works_idx[rows[hyperedges]].tolist(),
+                                 cited_works[hyperedges].tolist(),
+                                 (1.0/cited_counts[hyperedges]).tolist())])
+    bounded_rows[np.flatnonzero(with_authors)[~hyperedges]] = rows[~hyperedges]
+    return bounded_rows
@@ -0,0 +1,258 @@
+"""
+Synthetic APS-shaped corpus for benchmarking `APSBuilder`.
+
+Writes, under a root path, the layout read by `APSBuilder`:
+
+    aps-dataset-metadata-2013/<journal>/<volume>/<journal>.<volume>.<n>.json
+    aps-dataset-citations-2013/aps-dataset-citations-2013.csv
+
+Works are spread over a date range with a yearly growth rate. The number
+of authors of a work is 1 plus a Poisson draw, except for a fraction of
+hyper-authored works with a Pareto tail. Authors are drawn from a pool
+growing with time, skewed towards the oldest authors, so productivity is
+heavy tailed. Each work cites a Poisson number of earlier works, skewed
+towards recent ones, and a fraction of the citations come from works not
+in the metadata, as in the real dataset. The corpus only depends on the
+parameters and `seed`.
+"""
+import os
+import json
+import time
+import multiprocessing
+from datetime import date, timedelta
+import numpy as np
+if __name__ == "__main__":
+    import sys
+    sys.path.append("../")
+from _helper import set_dir, configure_logging, LOGGER
+from aps_builder import APSBuilder
+
+
+JOURNALS = ["PR", "PRA", "PRB", "PRC", "PRD", "PRE", "PRL", "RMP", "PRSTAB", "PRSTPER"]
+# Share of the works published by each journal
+JOURNALS_WEIGHTS = [0.05, 0.14, 0.25, 0.07, 0.12, 0.1, 0.22, 0.01, 0.02, 0.02]
+
+
+def _work_dates(random_state, works_count, from_year, until_year, growth):
+    """
+    Returns sorted publication dates, as days since `from_year`, of
+    `works_count` works whose yearly count grows by `growth`.
+    """
+    years = np.arange(from_year, until_year + 1)
+    weights = (1 + growth)**(years - from_year)
+    work_years = np.sort(random_state.choice(years, works_count, p=weights/weights.sum()))
+    start = date(from_year, 1, 1).toordinal()
+    year_starts = np.array([date(year, 1, 1).toordinal() for year in years]) - start
+    year_days = np.array([date(year, 12, 31).toordinal() for year in years]) - start + 1 - \
+        year_starts
+    year_idx = work_years - from_year
+    days = year_starts[year_idx] + (random_state.random_sample(works_count)*year_days[year_idx])
+    return np.sort(days.astype(np.int64))
+
+
+def _authors_counts(random_state, works_count, **kwargs):
+    """
+    Returns number of authors of each work.
+    """
+    counts = 1 + random_state.poisson(kwargs["authors_mean"] - 1, works_count)
+    hyper = random_state.random_sample(works_count) < kwargs["hyper_fraction"]
+    hyper_min, hyper_max = kwargs["hyper_authors"]
+    tail = hyper_min*(1 - random_state.random_sample(hyper.sum()))**(-1.0/kwargs["hyper_exponent"])
+    counts[hyper] = np.minimum(tail.astype(np.int64), hyper_max)
+    return counts
+
+
+def _works_authors(random_state, counts, authors_count, author_skew):
+    """
+    Returns CSR offsets and author indexes of each work. The pool of authors
+    grows with the works, and draws are skewed towards its oldest authors.
+    Authors drawn twice for a work are kept once.
+    """
+    works_count = len(counts)
+    rows = np.repeat(np.arange(works_count), counts)
+    pool = np.maximum(1, (authors_count*(rows + 1.0)/works_count).astype(np.int64))
+    authors = (pool*random_state.random_sample(len(rows))**author_skew).astype(np.int64)
+    keys = np.unique(rows.astype(np.int64)*authors_count + authors)
+    rows, authors = keys//authors_count, keys % authors_count
+    offsets = np.zeros(works_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=works_count), out=offsets[1:])
+    return offsets, authors
+
+
+def _citations(random_state, works_count, citations_mean, recency):
+    """
+    Returns sorted unique (citing, cited) arrays, each work citing earlier
+    works, skewed towards recent ones by `recency`.
+    """
+    counts = random_state.poisson(citations_mean, works_count)
+    counts[0] = 0
+    citing = np.repeat(np.arange(works_count), counts)
+    lag = 1 + (citing*random_state.random_sample(len(citing))**recency).astype(np.int64)
+    keys = np.unique(citing.astype(np.int64)*works_count + np.minimum(lag, citing))
+    citing = keys//works_count
+    return citing, citing - keys % works_count
+
+
+def _write_works(task):
+    """
+    Writes metadata json files of a chunk of works.
+    """
+    for file_path, document in task:
+        file_dir = os.path.dirname(file_path)
+        if not os.path.exists(file_dir):
+            try:
+                os.makedirs(file_dir)
+            except OSError:
+                # Created meanwhile by another worker
+                pass
+        with open(file_path, "w") as work_file:
+            json.dump(document, work_file)
+    return len(task)
+
+
+def make_corpus(root_path, **kwargs):
+    """
+    Writes a synthetic APS corpus at `root_path`, to be read with
+    `APSBuilder(root_path=root_path)`.
+
+    Parameters
+    ----------
+    works_count: int
+        Number of works.
+        Default: 10000.
+    from_year: int
+        Year of the first works.
+        Default: 1893.
+    until_year: int
+        Year of the last works.
+        Default: 2013.
+    growth: float
+        Yearly growth rate of the number of works.
+        Default: 0.04.
+    authors_count: int
+        Number of authors in the pool once all works are published.
+        Default: half of `works_count`.
+    authors_mean: float
+        Mean number of authors of a work, not hyper-authored.
+        Default: 3.
+    author_skew: float
+        Skew of author draws towards the oldest authors, 1 for uniform.
+        Default: 2.
+    hyper_fraction: float
+        Share of hyper-authored works.
+        Default: 0.001.
+    hyper_authors: tuple
+        (minimum, maximum) number of authors of hyper-authored works.
+        Default: (100, 3000).
+    hyper_exponent: float
+        Exponent of the Pareto tail of hyper-authored works.
+        Default: 1.5.
+    citations_mean: float
+        Mean number of works cited by a work.
+        Default: 10.
+    recency: float
+        Skew of citations towards recent works, 1 for uniform.
+        Default: 3.
+    unlisted_fraction: float
+        Share of citations from works missing in the metadata.
+        Default: 0.01.
+    editorials_fraction: float
+        Share of works without authors field.
+        Default: 0.005.
+    works_per_volume: int
+        Number of works of a journal in each volume directory.
+        Default: 500.
+    seed: int
+        Default: 0.
+    workers: int
+        Number of processes writing metadata files.
+        Default: 1.
+
+    Returns
+    -------
+    dict:
+        Number of works, authors, citations and hyper-authored works.
+    """
+    works_count = kwargs.get("works_count", 10000)
+    from_year = kwargs.get("from_year", 1893)
+    authors_count = kwargs.get("authors_count", max(1, works_count//2))
+    hyper_authors = kwargs.get("hyper_authors", (100, 3000))
+    workers = kwargs.get("workers", 1)
+    random_state = np.random.RandomState(kwargs.get("seed", 0))
+    before = time.time()
+    days = _work_dates(random_state, works_count, from_year, kwargs.get("until_year", 2013),
+                       kwargs.get("growth", 0.04))
+    counts = _authors_counts(random_state, works_count,
+                             authors_mean=kwargs.get("authors_mean", 3),
+                             hyper_fraction=kwargs.get("hyper_fraction", 0.001),
+                             hyper_authors=hyper_authors,
+                             hyper_exponent=kwargs.get("hyper_exponent", 1.5))
+    offsets, authors = _works_authors(random_state, counts, authors_count,
+                                      kwargs.get("author_skew", 2))
+    journals = random_state.choice(len(JOURNALS), works_count,
+                                   p=np.array(JOURNALS_WEIGHTS)/sum(JOURNALS_WEIGHTS))
+    editorials = random_state.random_sample(works_count) < kwargs.get("editorials_fraction", 0.005)
+    citing, cited = _citations(random_state, works_count, kwargs.get("citations_mean", 10),
+                               kwargs.get("recency", 3))
+    unlisted = random_state.random_sample(len(citing)) < kwargs.get("unlisted_fraction", 0.01)
+    # Identifiers and paths, works of a journal numbered in date order
+    works_per_volume = kwargs.get("works_per_volume", 500)
+    metadata_path = "%s/%s" % (root_path, APSBuilder.WORKS_DIR_NAME)
+    numbers = np.zeros(works_count, dtype=np.int64)
+    for journal in xrange(len(JOURNALS)):
+        journal_works = np.flatnonzero(journals == journal)
+        numbers[journal_works] = np.arange(len(journal_works))
+    works_ids = []
+    tasks = [[]]
+    first_day = date(from_year, 1, 1)
+    for work_idx in xrange(works_count):
+        journal = JOURNALS[journals[work_idx]]
+        volume, number = divmod(int(numbers[work_idx]), works_per_volume)
+        work_id = "10.1103/%s.%d.%d" % (journal, volume + 1, number + 1)
+        works_ids.append(work_id)
+        document = {"id": work_id,
+                    "date": (first_day + timedelta(days=int(days[work_idx]))).isoformat(),
+                    "journal": {"id": journal},
+                    "volume": volume + 1}
+        if not editorials[work_idx]:
+            document["authors"] = [{"name": "Author %d" % author, "type": "Person"}
+                                   for author in authors[offsets[work_idx]:
+                                                         offsets[work_idx+1]].tolist()]
+        if len(tasks[-1]) == works_per_volume:
+            tasks.append([])
+        tasks[-1].append(("%s/%s/%d/%s.%d.%d.json" % (metadata_path, journal, volume + 1,
+                                                       journal, volume + 1, number + 1),
+                          document))
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            pool.map(_write_works, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            _write_works(task)
+    citations_name = APSBuilder.CITATION_CSV_NAME
+    citations_dir = set_dir("%s/%s" % (root_path, citations_name.replace(".csv", "")))
+    with open("%s/%s" % (citations_dir, citations_name), "w") as citations_file:
+        citations_file.write("citing_doi,cited_doi\n")
+        for citation_idx, (source, target) in enumerate(zip(citing.tolist(), cited.tolist())):
+            source_id = "10.1103/Unlisted.%d" % citation_idx if unlisted[citation_idx] \
+                else works_ids[source]
+            citations_file.write("%s,%s\n" % (source_id, works_ids[target]))
+    overview = {"works": works_count,
+                "authors": len(np.unique(authors)),
+                "authorships": len(authors),
+                "citations": len(citing),
+                "hyper_works": int((counts >= hyper_authors[0]).sum()),
+                "editorials": int(editorials.sum())}
+    LOGGER.info("Synthetic corpus at %s after %f seconds: %s", root_path,
+                time.time() - before, overview)
+    return overview
+
+
+if __name__ == "__main__":
+    configure_logging()
+    make_corpus("../../data/synthetic_APS", works_count=int(sys.argv[1]) if len(sys.argv) > 1
+                else 10000, workers=multiprocessing.cpu_count())
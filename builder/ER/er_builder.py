@@ -1,24 +1,273 @@
-import random
+"""
+Builder module for temporal Erdos-Renyi random graphs
+
+At each time step, `edges_count` distinct edges are added, chosen uniformly
+among the vertex pairs without self-loops and, unless `repeat_edges` is
+set, among the pairs not added at earlier steps. Edges are keyed by packed
+int64 `(v_i << 32) | v_j`, see `edges.pack_edges`, and deduplicated over
+sorted keys.
+
+Pairs are split in shards by ranges of source vertices. The number of
+edges of each step falling in each shard is drawn from a multivariate
+hypergeometric distribution, then every shard samples its edges on its
+own, seeded by (seed, shard), so shards are generated in parallel and the
+graphs only depend on `seed` and `shards`, not on the number of workers.
+"""
+import json
+import multiprocessing
+import numpy as np
+if __name__ == "__main__":
+    import sys
+    sys.path.append("../")
+from _helper import set_dir, configure_logging, LOGGER
+from edges import pack_edges
+from snapshot_writer import write_snapshot
+
+
+# Candidates drawn per missing edge, beyond the expected collisions
+OVERSAMPLING = 1.1
 
 
 class ERBuilder(object):
+    """
+    Builds a temporal G(n, m) random graph: `graph_age` snapshots of
+    `edges_count` edges over `vertices_count` vertices.
+
+    Attributes
+    ----------
+    seed: int
+        Seed of the random streams.
+    edges: list
+        Sorted keys of the edges added at each time step.
+
+    Methods
+    -------
+    randomize_graph(**kwargs)
+        Draws the edges of every time step.
+    make_graphs(**kwargs)
+        Writes one binary snapshot file per time step.
+    """
 
     def __init__(self, **kwargs):
+        """
+        Parameters
+        ----------
+        edges_count: int
+            Edges added at each time step.
+        vertices_count: int
+            Number of vertices.
+        graph_age: int
+            Number of time steps.
+        directed: bool
+            If True, (v_i, v_j) and (v_j, v_i) are different edges.
+            Default: True.
+        repeat_edges: bool
+            If True, each time step is an independent G(n, m), otherwise an
+            edge is added at most once.
+            Default: False.
+        seed: int
+            Seed of the random streams.
+            Default: drawn at random.
+        shards: int
+            Number of ranges of source vertices sampled independently.
+            Default: 16.
+        output_dir_path: str
+            Path to export the snapshot files.
+            Default: 'output'.
+        """
         self.edges_count = kwargs.get("edges_count")
         self.vertices_count = kwargs.get("vertices_count")
         self.graph_age = kwargs.get("graph_age")
-        self.nodes = range(self.vertices_count)
-        self.edges = list()
-        for i in xrange(self.vertices_count):
-            self.edges.append(dict())
-
-    def add_random_edge(self, time_t):
-        i = random.choice(self.nodes)
-        j = random.choice(self.nodes)
-        if i != j and j not in self.edges[i]:
-            self.edges[i][j] = time_t
-
-    def randomize_graph(self):
+        self.directed = kwargs.get("directed", True)
+        self.repeat_edges = kwargs.get("repeat_edges", False)
+        self.seed = kwargs.get("seed", None)
+        if self.seed is None:
+            self.seed = int(np.random.randint(2**31))
+        self.output_dir_path = kwargs.get("output_dir_path", "output")
+        if self.vertices_count > 2**31:
+            raise ValueError("Vertex ids must fit in int32 snapshot columns")
+        shards = max(1, min(kwargs.get("shards", 16), self.vertices_count))
+        bounds = [self.vertices_count*shard//shards for shard in xrange(shards+1)]
+        self.shards = zip(bounds[:-1], bounds[1:])
+        capacity = sum(pairs_count(self.vertices_count, v_lo, v_hi, self.directed)
+                       for v_lo, v_hi in self.shards)
+        required = self.edges_count if self.repeat_edges else self.edges_count*self.graph_age
+        if required > capacity:
+            raise ValueError("%d edges requested, only %d vertex pairs" % (required, capacity))
+        self.edges = []
+
+    def shard_counts(self):
+        """
+        Returns array with the number of edges of each time step (rows)
+        falling in each shard (columns), as drawn by a uniform choice of
+        vertex pairs.
+        """
+        random_state = np.random.RandomState([self.seed])
+        capacities = np.array([pairs_count(self.vertices_count, v_lo, v_hi, self.directed)
+                               for v_lo, v_hi in self.shards])
+        counts = np.zeros((self.graph_age, len(self.shards)), dtype=np.int64)
+        free = capacities.copy()
         for time_t in xrange(self.graph_age):
-            for edge_i in xrange(self.edges_count):
-                self.add_random_edge(time_t)
+            if self.repeat_edges:
+                free = capacities.copy()
+            missing = self.edges_count
+            # Multivariate hypergeometric as a chain of hypergeometric draws
+            for shard in xrange(len(self.shards) - 1):
+                rest = free[shard+1:].sum()
+                if missing and free[shard]:
+                    counts[time_t, shard] = random_state.hypergeometric(free[shard], rest, missing) \
+                        if rest else missing
+                missing -= counts[time_t, shard]
+            counts[time_t, -1] = missing
+            free -= counts[time_t]
+        return counts
+
+    def randomize_graph(self, **kwargs):
+        """
+        Draws the edges of every time step and keeps them in `edges`.
+
+        Parameters
+        ----------
+        workers: int
+            Number of processes sampling shards in parallel.
+            Default: 1.
+
+        Returns
+        -------
+        list:
+            Sorted keys of the edges added at each time step.
+        """
+        workers = kwargs.get("workers", 1)
+        counts = self.shard_counts()
+        tasks = [(self.vertices_count, v_lo, v_hi, counts[:, shard].tolist(), self.seed, shard,
+                  self.directed, self.repeat_edges)
+                 for shard, (v_lo, v_hi) in enumerate(self.shards)]
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                shards_edges = pool.map(_sample_shard_task, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            shards_edges = [_sample_shard_task(task) for task in tasks]
+        # Shards are ranges of source vertices, so concatenating them sorts keys
+        self.edges = [np.concatenate([shard_edges[time_t] for shard_edges in shards_edges])
+                      for time_t in xrange(self.graph_age)]
+        return self.edges
+
+    def make_graphs(self, **kwargs):
+        """
+        Draws the graph and writes the edges added at each time step as a
+        binary snapshot file, see `snapshot_writer`, with unit weights.
+
+        Parameters
+        ----------
+        workers: int
+            Number of processes sampling shards in parallel.
+            Default: 1.
+        weight_dtype: str
+            Weights type of the snapshot files, 'float32' or 'float64'.
+            Default: 'float64'.
+
+        Returns
+        -------
+        list:
+            Paths of the snapshot files, also listed in files.json.
+        """
+        self.randomize_graph(workers=kwargs.get("workers", 1))
+        graphs_dir = set_dir("%s/er_graphs" % self.output_dir_path)
+        created_files = []
+        for time_t, keys in enumerate(self.edges):
+            graph_file_name = "%s/er_%d.snap" % (graphs_dir, time_t)
+            write_snapshot(graph_file_name, keys >> 32, keys & 0xFFFFFFFF, np.ones(len(keys)),
+                           weight_dtype=kwargs.get("weight_dtype", "float64"))
+            created_files.append(graph_file_name)
+        LOGGER.info("%d snapshots stored at %s", len(created_files), graphs_dir)
+        with open("%s/files.json" % graphs_dir, "wb") as files:
+            files.write(json.dumps(created_files))
+        return created_files
+
+
+def pairs_count(vertices_count, v_lo, v_hi, directed=True):
+    """
+    Returns number of vertex pairs, without self-loops, with source in
+    [v_lo, v_hi). Undirected pairs are kept with v_i < v_j.
+    """
+    if directed:
+        return (v_hi - v_lo)*(vertices_count - 1)
+    return ((vertices_count - 1 - v_lo) + (vertices_count - v_hi))*(v_hi - v_lo)//2
+
+
+def _contains(sorted_keys, keys):
+    """
+    Returns mask of `keys` found in array `sorted_keys`.
+    """
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+
+def sample_edges(vertices_count, v_lo, v_hi, edges_count, seed_prefix, directed=True):
+    """
+    Returns sorted keys of `edges_count` distinct edges chosen uniformly
+    among the pairs with source in [v_lo, v_hi), without self-loops.
+    Candidates are drawn in batches seeded by `seed_prefix` and the batch
+    number; batches are sized after the pairs left, so dense shards take
+    few rounds.
+    """
+    keys = np.empty(0, dtype=np.int64)
+    if directed:
+        space = (v_hi - v_lo)*(vertices_count - 1)
+    else:
+        space = (v_hi - v_lo)*vertices_count
+    capacity = pairs_count(vertices_count, v_lo, v_hi, directed)
+    batch = 0
+    while len(keys) < edges_count:
+        missing = edges_count - len(keys)
+        random_state = np.random.RandomState(list(seed_prefix) + [batch])
+        draws = int(missing*float(space)/(capacity - len(keys))*OVERSAMPLING) + 16
+        v_i = random_state.randint(v_lo, v_hi, size=draws).astype(np.int64)
+        if directed:
+            v_j = random_state.randint(0, vertices_count - 1, size=draws).astype(np.int64)
+            v_j += v_j >= v_i
+        else:
+            v_j = random_state.randint(0, vertices_count, size=draws).astype(np.int64)
+            v_i, v_j = v_i[v_j > v_i], v_j[v_j > v_i]
+        candidates = np.unique(pack_edges(v_i, v_j))
+        candidates = candidates[~_contains(keys, candidates)]
+        if len(candidates) > missing:
+            candidates = random_state.choice(candidates, missing, replace=False)
+        keys = np.union1d(keys, candidates)
+        batch += 1
+    return keys
+
+
+def sample_shard(vertices_count, v_lo, v_hi, counts, seed, shard, directed=True,
+                 repeat_edges=False):
+    """
+    Returns, for each time step, sorted keys of its `counts[t]` edges with
+    source in [v_lo, v_hi). Without `repeat_edges`, the edges of all steps
+    are sampled at once and split between steps at random.
+    """
+    if repeat_edges:
+        return [sample_edges(vertices_count, v_lo, v_hi, count, [seed, shard, time_t], directed)
+                for time_t, count in enumerate(counts)]
+    keys = sample_edges(vertices_count, v_lo, v_hi, sum(counts), [seed, shard], directed)
+    keys = np.random.RandomState([seed, shard]).permutation(keys)
+    bounds = np.cumsum([0] + list(counts))
+    return [np.sort(keys[bounds[time_t]:bounds[time_t+1]]) for time_t in xrange(len(counts))]
+
+
+def _sample_shard_task(task):
+    """
+    Worker for `ERBuilder.randomize_graph`: samples one shard.
+    """
+    return sample_shard(*task)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    ER_BUILDER = ERBuilder(vertices_count=1000, edges_count=5000, graph_age=10, seed=0)
+    ER_BUILDER.make_graphs()
@@ -3,9 +3,11 @@ Helper module for useful functions and tricks
 """
 import logging
 import json
-import glob
 import os
-from logging.handlers import RotatingFileHandler
+import sys
+
+# Analytics modules, readers of the file formats written by the builders
+TOOLS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
 
 
 def dump(data, data_path):
@@ -17,6 +19,14 @@ def dump(data, data_path):
     data_dump.close()
     LOGGER.info("Output file at %s", data_path)
 
+def use_tools():
+    """
+    Appends TOOLS_PATH to the modules search path, so that file formats
+    are imported from their readers
+    """
+    if TOOLS_PATH not in sys.path:
+        sys.path.append(TOOLS_PATH)
+
 def set_dir(dir_path):
     """
     Creates directory if it does not exist
@@ -26,18 +36,56 @@ def set_dir(dir_path):
     return dir_path
 
 
-# Log settings
+def configure_logging(**kwargs):
+    """
+    Attaches handlers to the builders logger. Importing the package does
+    not touch the filesystem: until this is called, records go nowhere,
+    unless the application configures logging itself. Calling it again
+    replaces the handlers.
+
+    Parameters
+    ----------
+    level: int
+        Level of the logger.
+        Default: logging.DEBUG.
+    log_path: str
+        Path of the log file, None for no log file.
+        Default: 'build.log'.
+    rotating_log_dir: str
+        Directory of a rotating log file, None for no rotating log file.
+        Default: 'logs'.
+    console: bool
+        If True, records are also written to stderr.
+        Default: True.
+
+    Returns
+    -------
+    logging.Logger:
+        The builders logger.
+    """
+    from logging.handlers import RotatingFileHandler
+    log_path = kwargs.get("log_path", "build.log")
+    rotating_log_dir = kwargs.get("rotating_log_dir", "logs")
+    formatter = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s - %(message)s')
+    for handler in list(LOGGER.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            LOGGER.removeHandler(handler)
+            handler.close()
+    handlers = []
+    if log_path:
+        handlers.append(logging.FileHandler(log_path))
+    if kwargs.get("console", True):
+        handlers.append(logging.StreamHandler())
+    if rotating_log_dir:
+        handlers.append(RotatingFileHandler("%s/build.log" % set_dir(rotating_log_dir),
+                                            maxBytes=10000, backupCount=5))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        LOGGER.addHandler(handler)
+    LOGGER.setLevel(kwargs.get("level", logging.DEBUG))
+    return LOGGER
+
+
+# Log settings, handlers are attached by configure_logging
 LOGGER = logging.getLogger(__name__)
-FMT = logging.Formatter('%(asctime)s:%(name)s:%(levelname)s - %(message)s')
-LOG_VERSION = len(glob.glob("build_*.log"))
-FH = logging.FileHandler("build.log")
-CH = logging.StreamHandler()
-CH.setLevel(logging.DEBUG)
-set_dir("logs/")
-RFH = RotatingFileHandler("logs/build.log", maxBytes=10000, backupCount=5)
-FH.setFormatter(FMT)
-CH.setFormatter(FMT)
-LOGGER.addHandler(FH)
-LOGGER.addHandler(CH)
-LOGGER.addHandler(RFH)
-LOGGER.setLevel(logging.DEBUG)
+LOGGER.addHandler(logging.NullHandler())
@@ -2,9 +2,13 @@
 """
 import os
 import csv
-from dateutil.parser import parse
+import bisect
 from subprocess import call
+import numpy as np
 from _helper import set_dir, LOGGER
+from edges import reduce_graph_file
+from works_store import WorksStore, date_to_key
+from works import RESOLUTIONS, period_date
 
 
 class Builder(object):
@@ -14,7 +18,10 @@ class Builder(object):
     _make_graph(edges, output_path)
     add_edge(edges, v_i, v_j, weight)
     is_same_resolution(ref_date, check_date)
+    date_key(date_string)
+    time_index(date_keys)
     group_by_time(items)
+    period_range(time_index, resolution, period)
     sum_edges(graph_file_path)
     """
 
@@ -137,68 +144,116 @@ class Builder(object):
             LOGGER.info(graph_file_name)
         return graph_file_name
 
+    @staticmethod
+    def date_key(date_string):
+        """
+        Returns integer key YYYYMMDD of `date_string`.
+
+        Examples
+        --------
+        >>> date_key("2015-10-24")
+        20151024
+        """
+        return date_to_key(date_string)
+
+    @staticmethod
+    def items_date_keys(items):
+        """
+        Returns date keys of (date, info) `items`, reading them from the
+        store when `items` is a WorksStore.
+        """
+        if isinstance(items, WorksStore):
+            return items.dates
+        return np.fromiter((Builder.date_key(item_date) for item_date, _ in items),
+                           dtype=np.int64, count=len(items))
+
+    @staticmethod
+    def time_index(date_keys):
+        """
+        Returns an offsets index of date sorted items for every resolution,
+        in which items of the k-th period are items[offsets[k]:offsets[k+1]].
+
+        Returns
+        -------
+        dict:
+            {resolution: [period keys, offsets]}, where period keys are
+            YYYY, YYYYMM and YYYYMMDD for 'year', 'month' and 'day'.
+
+        Examples
+        --------
+        >>> time_index([20151020, 20151024, 20151101])["month"]
+        [[201510, 201511], [0, 2, 3]]
+        """
+        date_keys = np.asarray(date_keys, dtype=np.int64)
+        index = {}
+        for resolution, divisor in RESOLUTIONS.iteritems():
+            periods = date_keys//divisor
+            offsets = np.flatnonzero(np.diff(periods)) + 1
+            offsets = np.concatenate(([0], offsets)) if len(periods) else offsets
+            index[resolution] = [periods[offsets].tolist(),
+                                 offsets.tolist() + [len(periods)]]
+        return index
+
+    @staticmethod
+    def period_date(period, resolution):
+        """
+        Returns datetime of the first day of `period` key at `resolution`.
+        """
+        return period_date(period, resolution)
+
+    @staticmethod
+    def period_range(time_index, resolution, period):
+        """
+        Returns xrange of items published in `period`, YYYY, YYYYMM or
+        YYYYMMDD according to `resolution`, empty if there is none.
+        """
+        periods, offsets = time_index[resolution]
+        period_idx = bisect.bisect_left(periods, period)
+        if period_idx == len(periods) or periods[period_idx] != period:
+            return xrange(0)
+        return xrange(offsets[period_idx], offsets[period_idx+1])
+
     @staticmethod
     def group_by_time(items, **kwargs):
         """
+        Groups date sorted (date, info) `items` by time period.
+
+        Parameters
+        ----------
+        resolution: str
+            'year', 'month' or 'day'.
+            Default: 'year'.
+        time_index: dict
+            Index from `time_index`, computed from `items` if not given.
+
+        Returns
+        -------
+        list:
+            [[first day of period, xrange of items in period]]
         """
-        groups = []
-        # Becomes zero at first iteration
-        time_index = -1
         resolution = kwargs.get("resolution", "year")
-        # Used to compare dates
-        first_date = True
-        for item_idx, (item_date, item_info) in enumerate(items):
-            item_date = parse(item_date)
-            if first_date:
-                group_date = item_date
-                first_date = False
-                groups.append([group_date, []])
-                time_index += 1
-            if not Builder.is_same_resolution(group_date, item_date, resolution):
-                time_index += 1
-                group_date = item_date
-                groups.append([group_date, []])
-            groups[time_index][1].append(item_idx)
-        return groups
+        time_index = kwargs.get("time_index", None)
+        if time_index is None:
+            time_index = Builder.time_index(Builder.items_date_keys(items))
+        periods, offsets = time_index[resolution]
+        return [[Builder.period_date(period, resolution),
+                 xrange(offsets[period_idx], offsets[period_idx+1])]
+                for period_idx, period in enumerate(periods)]
 
     @staticmethod
-    def sum_edges(graph_path):
-        """
-        """
-        # sorting graph file
-        graph_file = open(graph_path, "r")
-        temp_graph = graph_file.readlines()
-        graph_file.close()
-        total_edges = len(temp_graph)-1
-        # graph with ony one edge, nothing to do here
-        if total_edges == 1:
-            return
-        header = temp_graph.pop(0)
-        header = header.rstrip("\r\n").split(",")
-        temp_graph.sort()
-        with open(graph_path, "wb") as graph:
-            writer = csv.writer(graph, delimiter=",")
-            writer.writerow(header)
-            edges_count = 0
-            for edge in temp_graph:
-                # Saving first edge and its weight
-                if edges_count == 0:
-                    v_i, v_j, e_w = edge.rstrip("\r\n").split(",")
-                    e_w = float(e_w)
-                # Check in rest of file if the same edge happens
-                if edges_count > 0:
-                    n_v_i, n_v_j, n_e_w = edge.rstrip("\r\n").split(",")
-                    n_e_w = float(n_e_w)
-                    # if same edge, add its weight
-                    if n_v_i == v_i and n_v_j == v_j:
-                        e_w += n_e_w
-                    # New edge found
-                    else:
-                        # write previous edge on file
-                        writer.writerow([v_i, v_j, e_w])
-                        # gets new edge to be compared
-                        v_i, v_j, e_w = n_v_i, n_v_j, n_e_w
-                    # if this edge is the last in the graph
-                    if edges_count + 1 == total_edges:
-                        writer.writerow([v_i, v_j, n_e_w])
-                edges_count += 1
+    def sum_edges(graph_path, **kwargs):
+        """
+        Sorts graph file at `graph_path` numerically by (v_i, v_j) and merges
+        repeated edges, adding their weights. Works out of core within
+        `max_memory` bytes, see `edges.reduce_graph_file`.
+
+        Parameters
+        ----------
+        max_memory: int
+            Memory budget in bytes.
+            Default: 1 GB.
+        tmp_dir: str
+            Directory for sorted runs spilled to disk.
+            Default: system temporary directory.
+        """
+        reduce_graph_file(graph_path, **kwargs)
@@ -0,0 +1,338 @@
+"""
+Edge accumulation and reduction for graph snapshots.
+
+Edges are keyed by a packed int64 `(v_i << 32) | v_j`, so sorting keys
+sorts edges numerically by (v_i, v_j). When the edges held in memory
+exceed the memory budget, they are sorted and spilled to disk as a binary
+run; runs are then merged, adding up the weights of repeated edges in the
+order they were added. Runs of raw edges give the same sums as adding them
+up unsplit, runs of partial sums are only equal to them up to float
+rounding.
+"""
+import os
+import csv
+import heapq
+import itertools
+import shutil
+import tempfile
+import numpy as np
+
+
+# Rough memory footprint of an edge held in a python dict (key, value, slot)
+EDGE_MEMORY = 100
+# Memory footprint of an edge in a run (packed key and weight)
+RUN_EDGE_MEMORY = 16
+# Edges read at a time from each run while merging
+MERGE_BLOCK = 65536
+RUN_DTYPE = np.dtype([("key", "<i8"), ("weight", "<f8")])
+
+
+def pack_edges(v_i, v_j):
+    """
+    Returns int64 keys of edges (v_i, v_j), where v_i and v_j are arrays of
+    non-negative integers lower than 2**32.
+    """
+    return (np.asarray(v_i, dtype=np.int64) << 32) | np.asarray(v_j, dtype=np.int64)
+
+
+def sort_run(keys, weights):
+    """
+    Returns edges sorted by key as a run array, keeping the order of
+    repeated edges.
+    """
+    order = np.argsort(keys, kind="mergesort")
+    run = np.empty(len(keys), dtype=RUN_DTYPE)
+    run["key"] = np.asarray(keys)[order]
+    run["weight"] = np.asarray(weights)[order]
+    return run
+
+
+def write_run(keys, weights, run_dir):
+    """
+    Sorts edges by key, keeping the order of repeated edges, and writes
+    them as a binary run in `run_dir`. Returns path of the run file.
+    """
+    run_file, run_path = tempfile.mkstemp(suffix=".npy", dir=run_dir)
+    os.close(run_file)
+    np.save(run_path, sort_run(keys, weights))
+    return run_path
+
+
+def _read_run(run, run_idx):
+    """
+    Yields (key, run_idx, position, weight) for every edge in `run`, a run
+    array or the path of a run file, reading it in blocks.
+    """
+    if isinstance(run, basestring):
+        run = np.load(run, mmap_mode="r")
+    for start in xrange(0, len(run), MERGE_BLOCK):
+        block = run[start:start+MERGE_BLOCK]
+        keys = block["key"].tolist()
+        weights = block["weight"].tolist()
+        for position in xrange(len(keys)):
+            yield keys[position], run_idx, start+position, weights[position]
+
+
+def merge_runs(runs):
+    """
+    Merges sorted runs, arrays or paths of run files, yielding (v_i, v_j,
+    weight) once per edge, ordered by (v_i, v_j). Weights of repeated edges
+    are added one by one in run order, then in the order they were written.
+    For runs of raw edges, as read by `graph_file_runs`, the sums are thus
+    the ones of adding up the edges in their original order, whatever the
+    split in runs. Runs of partial sums, as spilled by `EdgeAccumulator`,
+    are added as such, and the sums are only equal up to float rounding.
+    """
+    runs = [_read_run(run, run_idx) for run_idx, run in enumerate(runs)]
+    edge_key = None
+    edge_weight = 0.0
+    for key, _, _, weight in heapq.merge(*runs):
+        if key == edge_key:
+            edge_weight += weight
+            continue
+        if edge_key is not None:
+            yield edge_key >> 32, edge_key & 0xFFFFFFFF, edge_weight
+        edge_key = key
+        edge_weight = weight
+    if edge_key is not None:
+        yield edge_key >> 32, edge_key & 0xFFFFFFFF, edge_weight
+
+
+def edge_chunks(edges, chunk_edges=MERGE_BLOCK):
+    """
+    Yields (v_i, v_j, weights) arrays of `chunk_edges` edges at a time
+    from iterable of (v_i, v_j, weight) `edges`, such as `merge_runs`.
+    """
+    edges = iter(edges)
+    while True:
+        chunk = list(itertools.islice(edges, chunk_edges))
+        if not chunk:
+            return
+        columns = np.array(chunk, dtype=np.float64)
+        yield columns[:, 0].astype(np.int64), columns[:, 1].astype(np.int64), columns[:, 2]
+
+
+def parse_edges(lines):
+    """
+    Parses csv lines "v_i,v_j,weight" into arrays of keys and weights.
+    """
+    fields = "".join(lines).replace("\r\n", "\n").replace("\n", ",").split(",")
+    if len(fields) == 3*len(lines) + 1 and fields[-1] == "":
+        fields.pop()
+    if len(fields) != 3*len(lines):
+        raise ValueError("Malformed graph file, expected 3 fields per line")
+    fields = np.array(fields).reshape(-1, 3)
+    keys = pack_edges(fields[:, 0].astype(np.int64), fields[:, 1].astype(np.int64))
+    return keys, fields[:, 2].astype(np.float64)
+
+
+def graph_file_runs(graph_path, **kwargs):
+    """
+    Reads csv graph file at `graph_path` in chunks fitting `max_memory`,
+    each chunk sorted by (v_i, v_j) as a run, spilled to disk unless the
+    whole file fits in one chunk. Runs are merged by `merge_runs`.
+
+    Parameters
+    ----------
+    max_memory: int
+        Memory budget in bytes.
+        Default: 1 GB.
+    tmp_dir: str
+        Directory for spilled runs, a temporary directory is created
+        inside it.
+        Default: system temporary directory.
+
+    Returns
+    -------
+    tuple
+        (header fields or None, runs, directory of the spilled runs to be
+        removed by the caller, or None)
+    """
+    max_memory = kwargs.get("max_memory", 1024**3)
+    tmp_dir = kwargs.get("tmp_dir", None)
+    # Text of two chunks, their split fields and sorted run are held at once
+    chunk_bytes = max(1, max_memory//16)
+    runs = []
+    run_dir = None
+    try:
+        with open(graph_path, "r") as graph_file:
+            header = graph_file.readline().rstrip("\r\n")
+            header = header.split(",") if header else None
+            lines = graph_file.readlines(chunk_bytes)
+            while lines:
+                next_lines = graph_file.readlines(chunk_bytes)
+                keys, weights = parse_edges(lines)
+                # Whole file in one chunk, no need to spill
+                if not runs and not next_lines:
+                    runs.append(sort_run(keys, weights))
+                else:
+                    if run_dir is None:
+                        run_dir = tempfile.mkdtemp(prefix="edges_", dir=tmp_dir)
+                    runs.append(write_run(keys, weights, run_dir))
+                lines = next_lines
+    except Exception:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        raise
+    return header, runs, run_dir
+
+
+def reduce_graph_file(graph_path, **kwargs):
+    """
+    Sorts edges of csv graph file at `graph_path` by (v_i, v_j), numerically,
+    and rewrites it with a single line per edge, adding up the weights of
+    repeated edges. Lines are read in chunks fitting `max_memory`, each
+    chunk is sorted and spilled to disk as a binary run, and runs are
+    merged, see `graph_file_runs`, which takes the same parameters. The
+    output is the same for any memory budget.
+    """
+    header, runs, run_dir = graph_file_runs(graph_path, **kwargs)
+    try:
+        write_edges(graph_path, merge_runs(runs), header)
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def write_edges(output_path, edges, header=None):
+    """
+    Writes (v_i, v_j, weight) `edges` as a csv graph file.
+    """
+    with open(output_path, "wb") as graph_file:
+        writer = csv.writer(graph_file)
+        if header:
+            writer.writerow(header)
+        writer.writerows(edges)
+
+
+class EdgeAccumulator(object):
+    """
+    Sums weights of the edges of one graph in memory, spilling sorted runs
+    to disk when more than `max_memory` bytes would be used. Spilled runs
+    hold the sums of the edges added since the previous spill, so, once
+    runs are spilled, weights are the ones of adding the edges in order only
+    up to float rounding, and may change with `max_memory`. Sums of integer
+    weights are exact.
+
+    Methods
+    -------
+    add_edge(v_i, v_j, weight, **kwargs)
+        Adds `weight` to edge (v_i, v_j).
+    iter_chunks(chunk_edges)
+        Yields arrays of the deduplicated edges, sorted by (v_i, v_j).
+    write(output_path, **kwargs)
+        Writes the deduplicated edges, sorted by (v_i, v_j), as a csv file.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Parameters
+        ----------
+        max_memory: int
+            Memory budget in bytes for edges held in memory.
+            Default: 1 GB.
+        tmp_dir: str
+            Directory for spilled runs, a temporary directory is created
+            inside it.
+            Default: system temporary directory.
+        """
+        self.max_memory = kwargs.get("max_memory", 1024**3)
+        self.tmp_dir = kwargs.get("tmp_dir", None)
+        self.max_edges = max(1, self.max_memory//EDGE_MEMORY)
+        self.edges = {}
+        self.run_dir = None
+        self.run_paths = []
+        # Number of edges added, including repeated ones
+        self.added_count = 0
+
+    def add_edge(self, v_i, v_j, weight=1, **kwargs):
+        """
+        Adds `weight` to edge (v_i, v_j). Undirected edges are kept with
+        v_i <= v_j, as in `Builder.add_edge`.
+        """
+        directed = kwargs.get("directed", False)
+        if not directed and v_j < v_i:
+            v_i, v_j = v_j, v_i
+        key = (int(v_i) << 32) | int(v_j)
+        self.edges[key] = self.edges.get(key, 0.0) + weight
+        self.added_count += 1
+        if len(self.edges) >= self.max_edges:
+            self.spill()
+
+    def spill(self):
+        """
+        Writes edges in memory, with their partial sums, as a sorted run
+        and clears them.
+        """
+        if not self.edges:
+            return
+        if self.run_dir is None:
+            self.run_dir = tempfile.mkdtemp(prefix="edges_", dir=self.tmp_dir)
+        keys, weights = self._edges_arrays()
+        self.run_paths.append(write_run(keys, weights, self.run_dir))
+        self.edges = {}
+
+    def _edges_arrays(self):
+        """
+        Returns keys and weights of edges in memory as arrays.
+        """
+        keys = np.fromiter(self.edges.iterkeys(), dtype=np.int64, count=len(self.edges))
+        weights = np.fromiter(self.edges.itervalues(), dtype=np.float64, count=len(self.edges))
+        return keys, weights
+
+    def __iter__(self):
+        """
+        Yields (v_i, v_j, weight) sorted by (v_i, v_j).
+        """
+        if self.run_paths:
+            self.spill()
+            for edge in merge_runs(self.run_paths):
+                yield edge
+            return
+        keys, weights = self._edges_arrays()
+        order = np.argsort(keys)
+        for key, weight in zip(keys[order].tolist(), weights[order].tolist()):
+            yield key >> 32, key & 0xFFFFFFFF, weight
+
+    def iter_chunks(self, chunk_edges=MERGE_BLOCK):
+        """
+        Yields (v_i, v_j, weights) arrays of `chunk_edges` edges at a time,
+        sorted by (v_i, v_j), without holding more than the edges in memory
+        and one chunk.
+        """
+        if self.run_paths:
+            self.spill()
+            for chunk in edge_chunks(merge_runs(self.run_paths), chunk_edges):
+                yield chunk
+            return
+        keys, weights = self._edges_arrays()
+        order = np.argsort(keys)
+        keys, weights = keys[order], weights[order]
+        for start in xrange(0, len(keys), chunk_edges):
+            chunk_keys = keys[start:start+chunk_edges]
+            yield chunk_keys >> 32, chunk_keys & 0xFFFFFFFF, weights[start:start+chunk_edges]
+
+    def write(self, output_path, **kwargs):
+        """
+        Writes deduplicated edges as a csv graph file at `output_path`,
+        sorted by (v_i, v_j), and releases memory and runs.
+
+        Parameters
+        ----------
+        header: list
+            First row of the csv file.
+            Default: None.
+        """
+        write_edges(output_path, self, kwargs.get("header", None))
+        self.clear()
+
+    def clear(self):
+        """
+        Removes edges in memory and spilled runs.
+        """
+        self.edges = {}
+        self.run_paths = []
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
+        self.added_count = 0
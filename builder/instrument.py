@@ -0,0 +1,348 @@
+"""
+Instrumentation of build stages.
+
+Each stage records its wall and cpu time, the items processed and their
+rate, its peak resident memory and the bytes written: the size of the output
+files registered by the stage or, without any, the bytes written by the
+process (Linux only).
+
+The peak is the stage's own. On Linux the high-water mark of the process is
+reset when a stage starts, by writing 5 to /proc/self/clear_refs, and read
+from VmHWM in /proc/self/status; the mark reached before a nested stage
+resets it is kept for the stages around it. Elsewhere, or if the mark can
+not be reset, the resident memory is sampled while stages run, so a peak
+shorter than SAMPLE_INTERVAL may be missed. The peaks of waited children
+are only known over the whole process lifetime, and are reported as such.
+Stages may be profiled with cProfile, set by the `profile` option or the
+BUILDER_PROFILE environment variable, a comma separated list of stage
+names or 'all'.
+"""
+import os
+import sys
+import json
+import time
+import resource
+import cProfile
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+# Numbers the profile files written by the process
+PROFILE_COUNTER = itertools.count()
+# Seconds between resident memory samples, when the peak can not be reset
+SAMPLE_INTERVAL = 0.01
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    """
+    Returns peak resident memory in bytes over the lifetime of the process,
+    or of its waited children if `who` is resource.RUSAGE_CHILDREN.
+    """
+    return resource.getrusage(who).ru_maxrss*RSS_UNIT
+
+
+def current_rss():
+    """
+    Returns resident memory of the process in bytes, None if unknown.
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm_file:
+            return int(statm_file.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def reset_peak_rss():
+    """
+    Resets the resident memory high-water mark of the process to its
+    current resident memory. Returns False if it can not be reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs_file:
+            clear_refs_file.write("5")
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def hwm_rss():
+    """
+    Returns resident memory high-water mark of the process in bytes, since
+    it was last reset, None if unknown.
+    """
+    try:
+        with open("/proc/self/status", "r") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])*1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def written_bytes():
+    """
+    Returns bytes written by the process so far, None if unknown.
+    """
+    try:
+        with open("/proc/self/io", "r") as io_file:
+            for line in io_file:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def instrumented(name):
+    """
+    Decorates a method of an object with an `instrument` attribute to be
+    measured as stage `name`.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrument.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Instrument(object):
+    """
+    Records measures of build stages.
+
+    Attributes
+    ----------
+    records: list
+        Measures of each stage, in the order they finished.
+    profile: set
+        Names of the profiled stages, 'all' profiles every stage.
+    profile_dir: str
+        Directory of the cProfile stats files.
+
+    Methods
+    -------
+    stage(name, **info)
+        Context manager measuring a stage.
+    add_record(record)
+        Adds record of a stage measured in another process.
+    add_items(count)
+        Adds items processed by the current stage.
+    add_output(path)
+        Registers a file written by the current stage.
+    report()
+        Returns measures of all stages.
+    write(output_path)
+        Writes report as a json file.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Parameters
+        ----------
+        profile: list
+            Names of the stages profiled with cProfile, or 'all'.
+            Default: BUILDER_PROFILE environment variable, or none.
+        profile_dir: str
+            Directory of the cProfile stats files.
+            Default: 'profiles'.
+        """
+        profile = kwargs.get("profile", None)
+        if profile is None:
+            profile = os.environ.get("BUILDER_PROFILE", "")
+        if isinstance(profile, basestring):
+            profile = [stage_name for stage_name in profile.split(",") if stage_name]
+        self.profile = set(profile)
+        self.profile_dir = kwargs.get("profile_dir", "profiles")
+        self.started = time.time()
+        self.records = []
+        self._open = []
+        # Peak resident memory of each open stage, raised by the sampler thread
+        self._peaks = []
+        self._peaks_lock = threading.Lock()
+        self._sampler = None
+        self._sampling = threading.Event()
+        self._reset_peak = None
+        # Resetting the mark also resets ru_maxrss, the mark before is kept
+        self._process_peak = 0
+
+    def settings(self):
+        """
+        Returns keyword arguments creating an Instrument with the same
+        profile settings, as for worker processes.
+        """
+        return {"profile": sorted(self.profile), "profile_dir": self.profile_dir}
+
+    def _profiled(self, name):
+        """
+        Returns True if stage `name` is profiled.
+        """
+        return "all" in self.profile or name in self.profile
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Measures the code run in the context as stage `name`, yielding its
+        record. Keyword arguments are kept in the record.
+        """
+        record = dict(info)
+        record.update({"stage": name, "items": 0, "outputs": []})
+        if self._open:
+            record["parent"] = self._open[-1]["stage"]
+        profiler = cProfile.Profile() if self._profiled(name) else None
+        self._open_peak()
+        self._open.append(record)
+        bytes_before = written_bytes()
+        cpu_before = time.clock()
+        before = time.time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self._open.pop()
+            record["peak_rss"] = self._close_peak()
+            self._close(record, before, cpu_before, bytes_before)
+            if profiler is not None:
+                if not os.path.exists(self.profile_dir):
+                    os.makedirs(self.profile_dir)
+                record["profile"] = "%s/%s_%d_%d.prof" % (self.profile_dir, name, os.getpid(),
+                                                          next(PROFILE_COUNTER))
+                profiler.dump_stats(record["profile"])
+            self.records.append(record)
+
+    @staticmethod
+    def _close(record, before, cpu_before, bytes_before):
+        """
+        Fills measures of a finished stage in `record`.
+        """
+        record["started"] = before
+        record["wall_time"] = time.time() - before
+        record["cpu_time"] = time.clock() - cpu_before
+        record["items_per_sec"] = record["items"]/record["wall_time"] \
+            if record["wall_time"] > 0 else None
+        outputs = record.pop("outputs")
+        if outputs:
+            record["bytes_written"] = sum(os.path.getsize(output_path) for output_path in outputs
+                                          if os.path.exists(output_path))
+        else:
+            bytes_after = written_bytes()
+            record["bytes_written"] = bytes_after - bytes_before \
+                if bytes_before is not None and bytes_after is not None else None
+
+    def _raise_peaks(self, rss):
+        """
+        Raises the peak of every open stage to `rss` bytes.
+        """
+        if rss is None:
+            return
+        with self._peaks_lock:
+            self._process_peak = max(self._process_peak, rss)
+            for stage_idx, peak in enumerate(self._peaks):
+                self._peaks[stage_idx] = max(peak, rss)
+
+    def _current_peak(self):
+        """
+        Returns resident memory reached since the last reading: the
+        high-water mark if it is reset by the stages, the current resident
+        memory otherwise.
+        """
+        return hwm_rss() if self._reset_peak else current_rss()
+
+    def _open_peak(self):
+        """
+        Starts measuring the peak resident memory of a new stage. The mark
+        reached so far is kept by the open stages before it is reset.
+        """
+        if self._reset_peak is None:
+            # Mark reached before the first stage, read before trying the reset
+            self._raise_peaks(hwm_rss())
+            self._reset_peak = reset_peak_rss() and hwm_rss() is not None
+        self._raise_peaks(self._current_peak())
+        with self._peaks_lock:
+            self._peaks.append(0)
+        if self._reset_peak:
+            reset_peak_rss()
+        elif self._sampler is None:
+            self._sampling.clear()
+            self._sampler = threading.Thread(target=self._sample)
+            self._sampler.daemon = True
+            self._sampler.start()
+        self._raise_peaks(self._current_peak())
+
+    def _close_peak(self):
+        """
+        Returns peak resident memory of the innermost stage, in bytes, None
+        if unknown. Its peak is kept by the stages around it.
+        """
+        self._raise_peaks(self._current_peak())
+        with self._peaks_lock:
+            peak = self._peaks.pop()
+            stages_left = len(self._peaks)
+        if not stages_left and self._sampler is not None:
+            self._sampling.set()
+            self._sampler.join()
+            self._sampler = None
+        return peak or None
+
+    def _sample(self):
+        """
+        Samples resident memory of the process until no stage is open.
+        """
+        while not self._sampling.wait(SAMPLE_INTERVAL):
+            self._raise_peaks(current_rss())
+
+    def current_stage(self):
+        """
+        Returns name of the innermost stage being measured, None if none.
+        """
+        return self._open[-1]["stage"] if self._open else None
+
+    def add_record(self, record):
+        """
+        Adds `record` of a stage measured elsewhere, as in a worker process,
+        as nested in the current stage.
+        """
+        if self._open:
+            record["parent"] = self._open[-1]["stage"]
+        self.records.append(record)
+
+    def add_items(self, count):
+        """
+        Adds `count` items processed by the current stage.
+        """
+        if self._open:
+            self._open[-1]["items"] += count
+
+    def add_output(self, output_path):
+        """
+        Registers file at `output_path` as written by the current stage.
+        """
+        if self._open:
+            self._open[-1]["outputs"].append(output_path)
+
+    def report(self):
+        """
+        Returns dictionary with the measures of all stages, and the peak
+        resident memory of the process and of its waited children over their
+        lifetimes.
+        """
+        return {"started": self.started,
+                "wall_time": time.time() - self.started,
+                "lifetime_peak_rss": max(peak_rss(), self._process_peak),
+                "lifetime_peak_rss_children": peak_rss(resource.RUSAGE_CHILDREN),
+                "stages": self.records}
+
+    def write(self, output_path):
+        """
+        Writes report as a json file at `output_path`.
+        """
+        with open(output_path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=1)
@@ -0,0 +1,181 @@
+"""
+Writer of binary snapshot files for graph files.
+
+The format is defined by its reader, `tools/snapshot.py`. Edges are written
+in sorted chunks: sources go to the snapshot file as they come, targets and
+weights to temporary column files appended to it when done, and the header
+is written last, once the counts are known. Memory used does not depend on
+the number of edges.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+from _helper import use_tools
+use_tools()
+from snapshot import MAGIC, VERSION, HEADER, HEADER_SIZE, SNAPSHOT_EXTENSION
+from edges import EdgeAccumulator, MERGE_BLOCK, edge_chunks, graph_file_runs, merge_runs
+
+
+WEIGHT_DTYPES = {"float32": "<f4", "float64": "<f8"}
+# Bytes copied at once when appending the column files
+COPY_BLOCK = 16*1024*1024
+
+
+class SnapshotWriter(object):
+    """
+    Writes edges sorted by (v_i, v_j), given in chunks, as a binary snapshot
+    file. Used as a context manager, the file is completed on exit, or
+    removed if an error was raised.
+
+    Methods
+    -------
+    write(v_i, v_j, weights)
+        Appends a chunk of edges, following the ones written before.
+    close()
+        Appends the columns and writes the header.
+    """
+
+    def __init__(self, output_path, **kwargs):
+        """
+        Parameters
+        ----------
+        output_path: str
+            Path of the snapshot file.
+        weight_dtype: str
+            'float32' or 'float64'.
+            Default: 'float64'.
+        tmp_dir: str
+            Directory of the temporary column files.
+            Default: directory of `output_path`.
+        """
+        self.output_path = output_path
+        self.weight_dtype = np.dtype(WEIGHT_DTYPES[kwargs.get("weight_dtype", "float64")])
+        tmp_dir = kwargs.get("tmp_dir", None) or os.path.dirname(os.path.abspath(output_path))
+        self.snapshot_file = open(output_path, "wb")
+        self.snapshot_file.write("\0"*HEADER_SIZE)
+        self.targets_file = tempfile.TemporaryFile(dir=tmp_dir)
+        self.weights_file = tempfile.TemporaryFile(dir=tmp_dir)
+        # Vertices with edges, grown with the largest id
+        self.seen = np.zeros(0, dtype=bool)
+        self.last_key = -1
+        self.m_edges = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, v_i, v_j, weights):
+        """
+        Appends edges (v_i[k], v_j[k], weights[k]), sorted by (v_i, v_j)
+        and following the edges written before.
+        """
+        v_i = np.asarray(v_i, dtype=np.int64)
+        v_j = np.asarray(v_j, dtype=np.int64)
+        if not len(v_i):
+            return
+        keys = (v_i << 32) | v_j
+        if keys[0] < self.last_key or np.any(keys[1:] < keys[:-1]):
+            raise ValueError("Snapshot edges must be sorted by (v_i, v_j)")
+        id_bound = int(max(v_i[-1], v_j.max())) + 1
+        if id_bound > 2**31:
+            raise ValueError("Vertex ids must fit in int32")
+        if id_bound > len(self.seen):
+            self.seen = np.concatenate((self.seen, np.zeros(max(id_bound, 2*len(self.seen)) -
+                                                            len(self.seen), dtype=bool)))
+        self.seen[v_i] = True
+        self.seen[v_j] = True
+        # Deltas continue from the last source written
+        previous = self.last_key >> 32 if self.last_key >= 0 else 0
+        sources = np.diff(np.concatenate(([previous], v_i)))
+        self.snapshot_file.write(sources.astype("<i4").tostring())
+        self.targets_file.write(v_j.astype("<i4").tostring())
+        self.weights_file.write(np.asarray(weights, dtype=np.float64)
+                                .astype(self.weight_dtype).tostring())
+        self.last_key = int(keys[-1])
+        self.m_edges += len(keys)
+
+    def close(self):
+        """
+        Appends targets and weights columns and writes the header.
+        """
+        for column_file in [self.targets_file, self.weights_file]:
+            column_file.seek(0)
+            shutil.copyfileobj(column_file, self.snapshot_file, COPY_BLOCK)
+            column_file.close()
+        vertices = np.flatnonzero(self.seen)
+        id_bound = int(vertices[-1]) + 1 if len(vertices) else 0
+        header = HEADER.pack(MAGIC, VERSION, self.weight_dtype.itemsize, len(vertices),
+                             id_bound, self.m_edges)
+        self.snapshot_file.seek(0)
+        self.snapshot_file.write(header.ljust(HEADER_SIZE, "\0"))
+        self.snapshot_file.close()
+
+    def abort(self):
+        """
+        Closes the files and removes the incomplete snapshot file.
+        """
+        for open_file in [self.targets_file, self.weights_file, self.snapshot_file]:
+            open_file.close()
+        os.remove(self.output_path)
+
+
+def write_snapshot(output_path, v_i, v_j, weights, **kwargs):
+    """
+    Writes edges (v_i[k], v_j[k], weights[k]) as a binary snapshot file at
+    `output_path`, sorting them if needed. Takes the parameters of
+    `SnapshotWriter`.
+    """
+    v_i = np.asarray(v_i, dtype=np.int64)
+    v_j = np.asarray(v_j, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    keys = (v_i << 32) | v_j
+    if len(keys) and np.any(keys[1:] < keys[:-1]):
+        order = np.argsort(keys, kind="mergesort")
+        v_i, v_j, weights = v_i[order], v_j[order], weights[order]
+    with SnapshotWriter(output_path, **kwargs) as writer:
+        writer.write(v_i, v_j, weights)
+
+
+def csv_to_snapshot(csv_path, output_path, **kwargs):
+    """
+    Converts csv graph file at `csv_path`, with a header line, to a binary
+    snapshot file at `output_path`, adding up the weights of repeated
+    edges. Edges are sorted in runs fitting `max_memory` and written from
+    their merge, see `edges.graph_file_runs`. Takes the parameters of
+    `SnapshotWriter` and of `edges.graph_file_runs`.
+    """
+    _, runs, run_dir = graph_file_runs(csv_path, **kwargs)
+    try:
+        write_snapshot_edges(output_path, merge_runs(runs), **kwargs)
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def write_snapshot_edges(output_path, edges, **kwargs):
+    """
+    Writes (v_i, v_j, weight) `edges` sorted by (v_i, v_j), an iterable
+    such as `edges.merge_runs` or an `edges.EdgeAccumulator`, as a binary
+    snapshot file at `output_path`, MERGE_BLOCK edges at a time. Takes the
+    parameters of `SnapshotWriter`.
+    """
+    if isinstance(edges, EdgeAccumulator):
+        chunks = edges.iter_chunks(MERGE_BLOCK)
+    else:
+        chunks = edge_chunks(edges, MERGE_BLOCK)
+    with SnapshotWriter(output_path, **kwargs) as writer:
+        for v_i, v_j, weights in chunks:
+            writer.write(v_i, v_j, weights)
+
+
+def snapshot_file_name(graph_file_name):
+    """
+    Returns name of the snapshot file for csv graph file `graph_file_name`.
+    """
+    return graph_file_name.rsplit(".csv", 1)[0] + SNAPSHOT_EXTENSION
@@ -0,0 +1,86 @@
+"""
+Writer of columnar, memory-mapped works stores.
+
+The format and the read-only view are defined by the reader, `tools/works.py`,
+which the analytics and notebooks use; this module adds writing.
+"""
+import os
+import json
+import numpy as np
+from _helper import use_tools
+use_tools()
+import works
+from works import STORE_VERSION, COLUMNS, date_to_key
+
+
+class WorksStore(works.WorksStore):
+    """
+    Works store of `tools/works.py` with the methods writing it.
+
+    Methods
+    -------
+    write(works_list, store_path)
+        Writes a works list as a store.
+    write_columns(store_path, ...)
+        Writes already built columns as a store.
+    replace_cited(cited_offsets, cited_index)
+        Replaces cited works columns.
+    """
+
+    @staticmethod
+    def write(works_list, store_path):
+        """
+        Writes `works_list`, a list of (date, [authors, cited works]), as a
+        store at `store_path` and returns it opened.
+        """
+        works_count = len(works_list)
+        dates = np.empty(works_count, dtype=np.int64)
+        authors_offsets = np.zeros(works_count+1, dtype=np.int64)
+        cited_offsets = np.zeros(works_count+1, dtype=np.int64)
+        for work_idx, (work_date, work_info) in enumerate(works_list):
+            dates[work_idx] = date_to_key(work_date)
+            authors_offsets[work_idx+1] = len(work_info[0])
+            cited_offsets[work_idx+1] = len(work_info[1])
+        np.cumsum(authors_offsets, out=authors_offsets)
+        np.cumsum(cited_offsets, out=cited_offsets)
+        authors_index = np.empty(authors_offsets[-1], dtype=np.int32)
+        cited_index = np.empty(cited_offsets[-1], dtype=np.int32)
+        for work_idx, (_, work_info) in enumerate(works_list):
+            authors_index[authors_offsets[work_idx]:authors_offsets[work_idx+1]] = work_info[0]
+            cited_index[cited_offsets[work_idx]:cited_offsets[work_idx+1]] = work_info[1]
+        return WorksStore.write_columns(store_path, dates, authors_offsets, authors_index,
+                                        cited_offsets, cited_index)
+
+    @staticmethod
+    def write_columns(store_path, dates, authors_offsets, authors_index,
+                      cited_offsets, cited_index):
+        """
+        Writes already built columns as a store at `store_path` and returns
+        it opened.
+        """
+        if not os.path.exists(store_path):
+            os.makedirs(store_path)
+        columns = {"dates": np.asarray(dates, dtype=np.int64),
+                   "authors_offsets": np.asarray(authors_offsets, dtype=np.int64),
+                   "authors_index": np.asarray(authors_index, dtype=np.int32),
+                   "cited_offsets": np.asarray(cited_offsets, dtype=np.int64),
+                   "cited_index": np.asarray(cited_index, dtype=np.int32)}
+        for column in COLUMNS:
+            np.save("%s/%s.npy" % (store_path, column), columns[column])
+        with open("%s/meta.json" % store_path, "w") as meta_file:
+            json.dump({"version": STORE_VERSION,
+                       "works_count": len(columns["dates"])}, meta_file)
+        return WorksStore(store_path)
+
+    def replace_cited(self, cited_offsets, cited_index):
+        """
+        Replaces cited works columns and returns the store reopened. Files
+        are swapped by renaming, so arrays mapped by other readers stay valid.
+        """
+        columns = {"cited_offsets": np.asarray(cited_offsets, dtype=np.int64),
+                   "cited_index": np.asarray(cited_index, dtype=np.int32)}
+        for column, values in columns.iteritems():
+            column_path = "%s/%s.npy" % (self.store_path, column)
+            np.save(column_path + ".tmp.npy", values)
+            os.rename(column_path + ".tmp.npy", column_path)
+        return WorksStore(self.store_path)
@@ -0,0 +1,7 @@
+"""
+Puts the builder and tools modules on the path, as their scripts do.
+"""
+import os
+import sys
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = ["%s/builder" % ROOT_PATH, "%s/builder/APS" % ROOT_PATH, "%s/tools" % ROOT_PATH]
@@ -0,0 +1,52 @@
+"""
+Static tables of graph files listed by the builder.
+"""
+import json
+import os
+from aps_static import load_all_graphs, load_static_table
+from graph import graph_files
+
+# Listed in time order, as by the builder
+MONTH_GRAPHS = [("1893/aps_coauthorship_1893_7.csv", [(0, 1, 1.), (1, 2, 2.)]),
+                ("1893/aps_coauthorship_1893_11.csv", [(2, 3, 1.)]),
+                ("1894/aps_coauthorship_1894_7.csv", [(0, 3, 1.), (3, 4, 1.), (4, 5, 3.)])]
+NAMES = [name for name, _ in MONTH_GRAPHS]
+
+
+def write_month_graphs(builder_dir):
+    """
+    Writes month resolution co-authorship graphs under `builder_dir` as the
+    builder does, with a files.json of paths relative to `builder_dir`
+    """
+    graphs_dir = os.path.join(builder_dir, "output", "coauthorship_graphs")
+    listed = []
+    for name, edges in MONTH_GRAPHS:
+        year_dir = os.path.join(graphs_dir, os.path.dirname(name))
+        if not os.path.isdir(year_dir):
+            os.makedirs(year_dir)
+        with open(os.path.join(graphs_dir, name), "w") as graph_file:
+            graph_file.write("author_i,author_j,weight\n")
+            for edge in edges:
+                graph_file.write("%d,%d,%s\n" % edge)
+        listed.append("output/coauthorship_graphs/%s" % name)
+    files_path = os.path.join(graphs_dir, "files.json")
+    with open(files_path, "w") as files_list:
+        json.dump(listed, files_list)
+    return files_path, [os.path.join(graphs_dir, name) for name in NAMES]
+
+
+def test_month_graphs_in_year_directories(tmpdir):
+    builder_dir = str(tmpdir.join("APS"))
+    files_path, expected = write_month_graphs(builder_dir)
+    assert graph_files(files_path) == expected
+    assert graph_files(files_path, root_path=builder_dir) == \
+        [os.path.join(builder_dir, "output/coauthorship_graphs", name) for name in NAMES]
+    for kwargs in [{}, {"root_path": builder_dir}]:
+        table = load_static_table(load_all_graphs(files_path, **kwargs))
+        assert table["files"].tolist() == [os.path.basename(path) for path in expected]
+        assert table["edges"].tolist() == [len(edges) for _, edges in MONTH_GRAPHS]
+        assert table["vertices"].tolist() == [3, 2, 4]
+        first = table["snapshot"] == 0
+        assert table["vertex"][first].tolist() == [0, 1, 2]
+        assert table["degree"][first].tolist() == [1, 2, 1]
+        assert table["strength"][first].tolist() == [1., 3., 2.]
@@ -0,0 +1,84 @@
+"""
+Union-find components against breadth-first search.
+"""
+import numpy as np
+from components import DisjointSets, components_growth, connected_components
+
+
+def random_edges(seed, n_vertices=60, m_edges=50):
+    random_state = np.random.RandomState(seed)
+    return random_state.randint(0, n_vertices, m_edges), random_state.randint(0, n_vertices, m_edges)
+
+
+def bfs_components(v_i, v_j):
+    """
+    Returns set of frozensets of the vertices of each component, searching
+    the edges as undirected
+    """
+    adjacency = {}
+    for source, target in zip(v_i.tolist(), v_j.tolist()):
+        adjacency.setdefault(source, set()).add(target)
+        adjacency.setdefault(target, set()).add(source)
+    components, seen = set(), set()
+    for root in adjacency:
+        if root in seen:
+            continue
+        component, frontier = set([root]), [root]
+        while frontier:
+            frontier = [neighbor for vertex in frontier for neighbor in adjacency[vertex]
+                        if neighbor not in component]
+            component.update(frontier)
+        seen.update(component)
+        components.add(frozenset(component))
+    return components
+
+
+def as_sets(sizes, offsets, vertices):
+    return set(frozenset(vertices[offsets[i]:offsets[i+1]].tolist()) for i in xrange(len(sizes)))
+
+
+def test_components_match_bfs():
+    for seed in xrange(5):
+        v_i, v_j = random_edges(seed)
+        disjoint_sets = DisjointSets()
+        # Batches, so that roots are hooked across calls too
+        for start in xrange(0, len(v_i), 7):
+            disjoint_sets.union_edges(v_i[start:start + 7], v_j[start:start + 7])
+        expected = bfs_components(v_i, v_j)
+        sizes, offsets, vertices = disjoint_sets.components()
+        assert as_sets(sizes, offsets, vertices) == expected
+        assert sizes.tolist() == [offsets[i+1] - offsets[i] for i in xrange(len(sizes))]
+        assert sizes.tolist() == sorted(sizes.tolist(), reverse=True)
+        assert disjoint_sets.n_components == len(expected)
+        assert disjoint_sets.n_seen == len(set(v_i.tolist() + v_j.tolist()))
+        assert disjoint_sets.largest == max(len(component) for component in expected)
+
+
+def test_union_and_find():
+    disjoint_sets = DisjointSets()
+    assert disjoint_sets.union(0, 1)
+    assert disjoint_sets.union(2, 3)
+    assert not disjoint_sets.union(1, 0)
+    assert disjoint_sets.find(0) == disjoint_sets.find(1) != disjoint_sets.find(2)
+    assert disjoint_sets.union(1, 3)
+    assert len(set(disjoint_sets.find(vertex) for vertex in xrange(4))) == 1
+    assert disjoint_sets.n_components == 1 and disjoint_sets.largest == 4
+
+
+def test_components_of_graph_files(tmpdir):
+    v_i, v_j = random_edges(0)
+    file_paths = []
+    for index, start in enumerate([0, 20, 35]):
+        file_path = str(tmpdir.join("graph_%d.csv" % index))
+        with open(file_path, "w") as graph_file:
+            graph_file.write("author_i,author_j,weight\n")
+            for source, target in zip(v_i[start:start + 20], v_j[start:start + 20]):
+                graph_file.write("%d,%d,1\n" % (source, target))
+        file_paths.append(file_path)
+    disjoint_sets = connected_components(file_paths, chunk_size=64)
+    assert as_sets(*disjoint_sets.components()) == bfs_components(v_i, v_j)
+    growth = components_growth(file_paths, chunk_size=64)
+    assert [step["edges"] for step in growth] == [20, 20, 15]
+    last = growth[-1]
+    assert (last["vertices"], last["components"], last["giant"]) == \
+        (disjoint_sets.n_seen, disjoint_sets.n_components, disjoint_sets.largest)
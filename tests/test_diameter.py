@@ -0,0 +1,76 @@
+"""
+Exact and effective diameters against breadth-first search.
+"""
+import numpy as np
+from graph import CSRGraph
+from anf import effective_diameter, neighbourhood_function
+from diameter import diameters
+
+
+def random_graph(seed, n_vertices=80, m_edges=100, directed=False):
+    random_state = np.random.RandomState(seed)
+    v_i = random_state.randint(0, n_vertices, m_edges)
+    v_j = random_state.randint(0, n_vertices, m_edges)
+    if not directed:
+        v_i, v_j = np.concatenate((v_i, v_j)), np.concatenate((v_j, v_i))
+    return CSRGraph.from_edges(v_i, v_j, n_vertices=n_vertices, directed=directed)
+
+
+def bfs_levels(graph):
+    """
+    Returns list of dicts of the distance from each vertex to the vertices
+    it reaches, searching the edges as undirected
+    """
+    adjacency = [set() for _ in xrange(graph.n_vertices)]
+    for vertex in xrange(graph.n_vertices):
+        for neighbor in graph.get_neighbors(vertex).tolist():
+            adjacency[vertex].add(neighbor)
+            adjacency[neighbor].add(vertex)
+    all_levels = []
+    for root in xrange(graph.n_vertices):
+        levels, frontier, level = {root: 0}, [root], 0
+        while frontier:
+            level += 1
+            frontier = set(neighbor for vertex in frontier for neighbor in adjacency[vertex]
+                           if neighbor not in levels)
+            for vertex in frontier:
+                levels[vertex] = level
+        all_levels.append(levels)
+    return all_levels
+
+
+def test_diameters_match_bfs():
+    for seed in xrange(6):
+        graph = random_graph(seed, directed=seed % 2 == 1)
+        all_levels = bfs_levels(graph)
+        results = diameters(graph)
+        assert sorted(vertex for result in results for vertex in result["vertices"].tolist()) == \
+            range(graph.n_vertices)
+        for result in results:
+            vertices = result["vertices"].tolist()
+            assert result["size"] == len(vertices)
+            assert set(all_levels[vertices[0]]) == set(vertices)
+            assert result["diameter"] == max(max(all_levels[vertex].values())
+                                             for vertex in vertices)
+
+
+def test_diameters_of_paths_and_cliques():
+    path = CSRGraph.from_edges(range(9) + range(1, 10), range(1, 10) + range(9))
+    assert [result["diameter"] for result in diameters(path)] == [9]
+    clique = CSRGraph.from_edges(*zip(*[(v_i, v_j) for v_i in xrange(5) for v_j in xrange(5)
+                                        if v_i != v_j]))
+    result, = diameters(clique)
+    assert (result["diameter"], result["bfs_runs"]) == (1, 0)
+    assert [result["size"] for result in diameters(path, min_size=2, all_vertices=False)] == [10]
+
+
+def test_effective_diameter_close_to_bfs():
+    graph = random_graph(0, n_vertices=300, m_edges=600)
+    pairs = np.zeros(graph.n_vertices, dtype=np.int64)
+    for levels in bfs_levels(graph):
+        pairs[:max(levels.values()) + 1] += np.bincount(levels.values())
+    exact = np.cumsum(pairs[:np.flatnonzero(pairs)[-1] + 1])
+    function = neighbourhood_function(graph, precision=8)[:, 0]
+    # Counters of 2**8 registers are off by about 6.5%
+    assert abs(function[-1]/exact[-1] - 1) < 0.1
+    assert abs(effective_diameter(function) - effective_diameter(exact)) < 0.5
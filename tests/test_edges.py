@@ -0,0 +1,75 @@
+"""
+Edge accumulation and reduction with and without runs spilled to disk.
+"""
+import shutil
+import numpy as np
+from edges import EdgeAccumulator, graph_file_runs, reduce_graph_file, write_edges, \
+    EDGE_MEMORY, RUN_EDGE_MEMORY
+
+
+def random_edges(seed, edges_count=5000, vertices_count=40, integer=False):
+    random_state = np.random.RandomState(seed)
+    v_i = random_state.randint(0, vertices_count, edges_count).tolist()
+    v_j = random_state.randint(0, vertices_count, edges_count).tolist()
+    if integer:
+        weights = random_state.randint(1, 10, edges_count).astype(float).tolist()
+    else:
+        weights = (1.0/random_state.randint(1, 50, edges_count)).tolist()
+    return zip(v_i, v_j, weights)
+
+
+def accumulate(edges, max_memory):
+    accumulator = EdgeAccumulator(max_memory=max_memory)
+    for v_i, v_j, weight in edges:
+        accumulator.add_edge(v_i, v_j, weight)
+    spilled = len(accumulator.run_paths)
+    columns = [np.concatenate(column) for column in zip(*accumulator.iter_chunks(1000))]
+    accumulator.clear()
+    return columns, spilled
+
+
+def reference_sums(edges):
+    """
+    Returns {(v_i, v_j): weight} adding up undirected edges in order.
+    """
+    sums = {}
+    for v_i, v_j, weight in edges:
+        edge = (min(v_i, v_j), max(v_i, v_j))
+        sums[edge] = sums.get(edge, 0.0) + weight
+    return sums
+
+
+def test_spilled_accumulator_equal_up_to_rounding():
+    edges = random_edges(0)
+    (v_i, v_j, weights), spilled = accumulate(edges, 50*EDGE_MEMORY)
+    (ref_i, ref_j, ref_weights), not_spilled = accumulate(edges, 1024**3)
+    assert spilled > 1 and not_spilled == 0
+    assert np.array_equal(v_i, ref_i) and np.array_equal(v_j, ref_j)
+    assert np.allclose(weights, ref_weights, rtol=1e-12, atol=0)
+    sums = reference_sums(edges)
+    assert ref_weights.tolist() == [sums[edge] for edge in zip(ref_i.tolist(), ref_j.tolist())]
+
+
+def test_spilled_accumulator_exact_for_integer_weights():
+    edges = random_edges(1, integer=True)
+    (v_i, v_j, weights), spilled = accumulate(edges, 50*EDGE_MEMORY)
+    (ref_i, ref_j, ref_weights), _ = accumulate(edges, 1024**3)
+    assert spilled > 1
+    assert np.array_equal(v_i, ref_i) and np.array_equal(v_j, ref_j)
+    assert np.array_equal(weights, ref_weights)
+
+
+def test_reduce_graph_file_does_not_depend_on_runs(tmpdir):
+    edges = random_edges(2)
+    outputs = []
+    for max_memory in [100*RUN_EDGE_MEMORY, 1024**3]:
+        graph_path = str(tmpdir.join("graph_%d.csv" % max_memory))
+        write_edges(graph_path, edges, ["v_i", "v_j", "weight"])
+        _, runs, run_dir = graph_file_runs(graph_path, max_memory=max_memory, tmp_dir=str(tmpdir))
+        assert (len(runs) > 1) == (max_memory < 1024**3)
+        if run_dir is not None:
+            shutil.rmtree(run_dir)
+        reduce_graph_file(graph_path, max_memory=max_memory, tmp_dir=str(tmpdir))
+        with open(graph_path, "r") as graph_file:
+            outputs.append(graph_file.read())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,51 @@
+"""
+Graph edges and its CSR form.
+"""
+import numpy as np
+from graph import Graph, CSRGraph
+
+
+def test_add_edge_adds_one_direction():
+    graph = Graph()
+    graph.add_edge(0, 1, 2.)
+    assert graph.get_edge(0, 1) == 2.
+    assert graph.get_edge(1, 0) == graph.null_weight
+    graph.add_edge(1, 0, 2.)
+    assert graph.m_edges == 1
+
+
+def test_add_link_adds_both_directions_of_undirected_edges():
+    graph = Graph()
+    graph.add_link(0, 1, 2.)
+    graph.add_link(1, 1, 3.)
+    graph.add_link(1, 0, 4.)
+    assert graph.edges == {0: {1: 4.}, 1: {0: 4., 1: 3.}}
+    assert graph.m_edges == 2
+    directed = Graph(directed=True)
+    directed.add_link(0, 1, 2.)
+    directed.add_link(1, 0, 4.)
+    assert directed.edges == {0: {1: 2.}, 1: {0: 4.}}
+    assert directed.m_edges == 2
+
+
+def test_parsed_graph_matches_csr_graph(tmpdir):
+    random_state = np.random.RandomState(0)
+    edges = set(zip(random_state.randint(0, 30, 100).tolist(),
+                    random_state.randint(0, 30, 100).tolist()))
+    # One direction of each undirected edge
+    edges = sorted(set((min(edge), max(edge)) for edge in edges))
+    graph_path = str(tmpdir.join("graph.txt"))
+    with open(graph_path, "w") as graph_file:
+        graph_file.write("30\n")
+        for v_i, v_j in edges:
+            graph_file.write("%d %d %d\n" % (v_i, v_j, v_i + v_j))
+    for directed in [False, True]:
+        graph = Graph(graph_path=graph_path, weighted=True, directed=directed)
+        csr_graph = CSRGraph(graph_path=graph_path, weighted=True, directed=directed)
+        assert graph.m_edges == csr_graph.m_edges == len(edges)
+        for vertex in xrange(30):
+            neighbors = graph.edges.get(vertex, {})
+            assert sorted(neighbors) == csr_graph.get_neighbors(vertex).tolist()
+            assert [neighbors[neighbor] for neighbor in sorted(neighbors)] == \
+                csr_graph.get_weights(vertex).tolist()
+        assert CSRGraph.from_graph(graph).m_edges == len(edges)
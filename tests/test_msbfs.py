@@ -0,0 +1,69 @@
+"""
+Multi-source BFS against single source breadth-first search.
+"""
+import numpy as np
+from graph import CSRGraph
+from msbfs import distance_histograms, distance_matrix, msbfs
+
+
+def random_graph(seed, n_vertices=200, m_edges=300, directed=False):
+    random_state = np.random.RandomState(seed)
+    v_i = random_state.randint(0, n_vertices, m_edges)
+    v_j = random_state.randint(0, n_vertices, m_edges)
+    if not directed:
+        v_i, v_j = np.concatenate((v_i, v_j)), np.concatenate((v_j, v_i))
+    return CSRGraph.from_edges(v_i, v_j, n_vertices=n_vertices, directed=directed)
+
+
+def bfs_distances(graph, root):
+    """
+    Returns list of the distance from `root` to each vertex following the
+    edges of CSRGraph `graph`, -1 for vertices not reached
+    """
+    distances = [-1]*graph.n_vertices
+    distances[root] = 0
+    frontier, level = [root], 0
+    while frontier:
+        level += 1
+        frontier = set(neighbor for vertex in frontier
+                       for neighbor in graph.get_neighbors(vertex).tolist()
+                       if distances[neighbor] < 0)
+        for vertex in frontier:
+            distances[vertex] = level
+    return distances
+
+
+def test_distances_match_bfs():
+    for seed in xrange(4):
+        graph = random_graph(seed, directed=seed % 2 == 1)
+        # More than a word of sources, with a repeated one
+        sources = np.append(np.arange(0, graph.n_vertices, 2), 0)
+        expected = np.array([bfs_distances(graph, source) for source in sources.tolist()])
+        histograms, distances = msbfs(graph, sources, distances=True)
+        assert np.array_equal(distances, expected)
+        for row, source_distances in enumerate(expected):
+            reached = source_distances[source_distances >= 0]
+            assert histograms[row].tolist() == \
+                np.bincount(reached, minlength=histograms.shape[1]).tolist()
+
+
+def test_batches_match_single_run():
+    graph = random_graph(0, directed=True)
+    sources = np.arange(graph.n_vertices)
+    expected = np.array([bfs_distances(graph, source) for source in sources.tolist()])
+    for workers in [1, 2]:
+        matrix = distance_matrix(graph, sources, batch_size=64, workers=workers)
+        assert np.array_equal(matrix, expected)
+    table = distance_histograms(graph, sources, batch_size=64)
+    for row, source_distances in enumerate(expected):
+        reached = source_distances[source_distances >= 0]
+        assert table[row].tolist() == np.bincount(reached, minlength=table.shape[1]).tolist()
+
+
+def test_max_distance():
+    graph = random_graph(1)
+    sources = np.arange(10)
+    expected = np.array([bfs_distances(graph, source) for source in sources.tolist()])
+    histograms, distances = msbfs(graph, sources, distances=True, max_distance=2)
+    assert histograms.shape[1] <= 3
+    assert np.array_equal(distances, np.where(expected <= 2, expected, -1))
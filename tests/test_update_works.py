@@ -0,0 +1,124 @@
+"""
+Incremental works update against a full build of the same metadata.
+"""
+import os
+import csv
+import json
+from synthetic import make_corpus
+from pipeline import APSPipeline
+from aps_builder import APSBuilder
+
+
+OLDER_WORK_ID = "10.1103/PR.test.1"
+
+
+def load_json(output_path, dump_name):
+    with open("%s/%s.json" % (output_path, dump_name), "r") as dump_file:
+        return json.load(dump_file)
+
+
+def named_works(output_path):
+    """
+    Returns {work id: (date, author names, cited work ids)} of a build.
+    """
+    works = load_json(output_path, "aps_works")
+    works_map = load_json(output_path, "aps_works_map")
+    authors_names = dict((author, name) for name, author
+                         in load_json(output_path, "aps_authors_map").iteritems())
+    works_ids = dict((work_idx, work_id) for work_id, work_idx in works_map.iteritems())
+    return dict((works_ids[work_idx],
+                 (work_date, sorted(authors_names[author] for author in authors),
+                  sorted(works_ids[cited] for cited in cited_works)))
+                for work_idx, (work_date, (authors, cited_works)) in enumerate(works))
+
+
+def named_graphs(output_path, created_files):
+    """
+    Returns {graph file name: {(name_i, name_j): weight}} of a build.
+    """
+    authors_names = dict((author, name) for name, author
+                         in load_json(output_path, "aps_authors_map").iteritems())
+    graphs = {}
+    for graph_file in created_files:
+        edges = {}
+        with open(graph_file, "r") as csv_file:
+            for v_i, v_j, weight in list(csv.reader(csv_file))[1:]:
+                edges[(authors_names[int(v_i)], authors_names[int(v_j)])] = float(weight)
+        graphs[os.path.relpath(graph_file, output_path)] = edges
+    return graphs
+
+
+def assert_same_graphs(graphs, reference):
+    assert sorted(graphs) == sorted(reference)
+    for graph_name, edges in reference.iteritems():
+        assert sorted(graphs[graph_name]) == sorted(edges), graph_name
+        for edge, weight in edges.iteritems():
+            assert abs(graphs[graph_name][edge] - weight) < 1e-9, (graph_name, edge)
+
+
+def run_pipeline(root_path, output_path):
+    pipeline = APSPipeline(root_path=root_path, output_dir_path=output_path)
+    created_files = pipeline.run(coauthorship={"resolution": "month"},
+                                 citations={"resolution": "year"})
+    return pipeline.builder, created_files
+
+
+def metadata_files(root_path):
+    return sorted(APSBuilder(root_path=root_path,
+                             output_dir_path="%s/listing" % root_path).list_work_files(),
+                  key=lambda file_path: json.load(open(file_path))["date"])
+
+
+def test_older_work_and_deleted_file(tmpdir):
+    root_path = str(tmpdir.join("data"))
+    make_corpus(root_path, works_count=300, from_year=1893, until_year=1900, seed=3,
+                editorials_fraction=0)
+    output_path = str(tmpdir.join("incremental"))
+    builder, _ = run_pipeline(root_path, output_path)
+    authors_before = dict(builder.authors_map)
+    files = metadata_files(root_path)
+    # A work older than most, by known authors and a new one
+    template = json.load(open(files[50]))
+    older_work = {"id": OLDER_WORK_ID, "date": json.load(open(files[20]))["date"],
+                  "authors": template["authors"] + [{"name": "New Author", "type": "Person"}]}
+    with open(os.path.join(os.path.dirname(files[50]), "PR.test.1.json"), "w") as work_file:
+        json.dump(older_work, work_file)
+    deleted_id = json.load(open(files[200]))["id"]
+    os.remove(files[200])
+
+    builder, created_files = run_pipeline(root_path, output_path)
+    assert builder.shifted_from == builder.works_map[OLDER_WORK_ID]
+    assert deleted_id not in builder.works_map
+    # Known authors keep their indexes, new ones are appended
+    for name, author in authors_before.iteritems():
+        assert builder.authors_map[name] == author
+    assert builder.authors_map["New Author"] == len(authors_before)
+    manifest = load_json(output_path, "aps_works_manifest")
+    assert all(entry[2] != deleted_id for entry in manifest.itervalues())
+
+    full_path = str(tmpdir.join("full"))
+    _, full_files = run_pipeline(root_path, full_path)
+    assert named_works(output_path) == named_works(full_path)
+    for g_type in ["coauthorship", "citations"]:
+        assert_same_graphs(named_graphs(output_path, created_files[g_type]),
+                           named_graphs(full_path, full_files[g_type]))
+
+
+def test_appended_works_keep_indexes(tmpdir):
+    root_path = str(tmpdir.join("data"))
+    make_corpus(root_path, works_count=200, from_year=1893, until_year=1900, seed=4,
+                editorials_fraction=0)
+    output_path = str(tmpdir.join("incremental"))
+    builder, _ = run_pipeline(root_path, output_path)
+    works_map_before = dict(builder.works_map)
+    files = metadata_files(root_path)
+    newer_work = {"id": OLDER_WORK_ID, "date": "1901-01-01",
+                  "authors": json.load(open(files[0]))["authors"]}
+    with open(os.path.join(os.path.dirname(files[0]), "PR.test.1.json"), "w") as work_file:
+        json.dump(newer_work, work_file)
+
+    builder, _ = run_pipeline(root_path, output_path)
+    assert builder.shifted_from is None
+    for work_id, work_idx in works_map_before.iteritems():
+        assert builder.works_map[work_id] == work_idx
+    assert builder.works_map[OLDER_WORK_ID] == len(works_map_before)
@@ -0,0 +1,169 @@
+"""
+Approximate neighbourhood function module
+module: HyperANF estimates of the number of pairs within each distance
+author: ricardosilveira@poli.ufrj.br
+
+HyperANF (Boldi, Rosa, Vigna: HyperANF, approximating the neighbourhood
+function of very large graphs on a budget) keeps a HyperLogLog counter per
+vertex, starting with the vertex itself. At step t, each counter becomes
+the union (register-wise maximum) of its own and its neighbors' counters,
+so it counts the vertices within distance t. The neighbourhood function
+N(t) is the sum of the counter estimates, and the effective diameter is
+the distance within which a given share of the connected pairs lies.
+"""
+import numpy as np
+
+
+# Registers per counter are 2**PRECISION, relative error about 1.04/2**(PRECISION/2)
+PRECISION = 6
+# Counter registers combined at once, bounds memory of the gathered arrays
+CHUNK_REGISTERS = 2**24
+UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def mix(values, seed=0):
+    """
+    Returns uint64 hash of each integer of array `values`, by splitmix64
+    """
+    with np.errstate(over="ignore"):
+        hashes = np.asarray(values, dtype=np.uint64) + \
+            np.uint64((0x9E3779B97F4A7C15*(seed + 1)) & UINT64_MASK)
+        hashes = (hashes ^ (hashes >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+        hashes = (hashes ^ (hashes >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+        return hashes ^ (hashes >> np.uint64(31))
+
+
+def bit_length(values):
+    """
+    Returns number of bits of each uint64 of array `values`
+    """
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp is exact below 2**53, so halves are measured apart
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def init_registers(n_vertices, precision=PRECISION, seed=0):
+    """
+    Returns uint8 array of HyperLogLog registers, one row per vertex,
+    holding only the vertex itself
+    """
+    hashes = mix(np.arange(n_vertices), seed)
+    tail_bits = 64 - precision
+    buckets = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+    tails = hashes & np.uint64((1 << tail_bits) - 1)
+    registers = np.zeros((n_vertices, 2**precision), dtype=np.uint8)
+    # Position of the leftmost 1 bit of the tail
+    registers[np.arange(n_vertices), buckets] = tail_bits - bit_length(tails) + 1
+    return registers
+
+
+def estimate(registers):
+    """
+    Returns HyperLogLog estimate of the count of each row of `registers`
+    """
+    buckets = registers.shape[1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(buckets, 0.7213/(1 + 1.079/buckets))
+    powers = 2.0**-np.arange(256)
+    estimates = np.empty(len(registers))
+    step = max(1, CHUNK_REGISTERS//buckets)
+    for start in xrange(0, len(registers), step):
+        chunk = registers[start:start + step]
+        raw = alpha*buckets**2/powers[chunk].sum(axis=1)
+        zeros = (chunk == 0).sum(axis=1)
+        # Linear counting for small counts
+        small = (raw <= 2.5*buckets) & (zeros > 0)
+        raw[small] = buckets*np.log(float(buckets)/zeros[small])
+        estimates[start:start + step] = raw
+    return estimates
+
+
+def propagate(graph, registers):
+    """
+    Returns registers after one HyperANF step over CSRGraph `graph`: the
+    maximum of the registers of each vertex and of its neighbors. Rows
+    are processed in chunks of about CHUNK_REGISTERS gathered registers.
+    """
+    updated = registers.copy()
+    offsets, neighbors = graph.offsets, graph.neighbors
+    step = max(1, CHUNK_REGISTERS//registers.shape[1])
+    first = 0
+    while first < graph.n_vertices:
+        # Rows whose edges fit in a chunk, at least one row
+        last = max(first + 1, int(np.searchsorted(offsets, offsets[first] + step, "right")) - 1)
+        last = min(last, graph.n_vertices)
+        rows = np.arange(first, last)
+        starts = offsets[first:last]
+        non_empty = offsets[first+1:last+1] > starts
+        if non_empty.any():
+            gathered = registers[neighbors[offsets[first]:offsets[last]]]
+            reduced = np.maximum.reduceat(gathered, starts[non_empty] - offsets[first], axis=0)
+            rows = rows[non_empty]
+            updated[rows] = np.maximum(updated[rows], reduced)
+        first = last
+    return updated
+
+
+def neighbourhood_function(graph, **kwargs):
+    """
+    Returns HyperANF estimate of the neighbourhood function of CSRGraph
+    `graph`, for the whole graph or per group of vertices
+
+    Parameters
+    ----------
+    precision: int
+        Counters have 2**precision registers, PRECISION (default)
+    seed: int
+        Seed of the vertices hashes, 0 (default)
+    max_distance: int
+        Largest distance, until counters stop changing (default)
+    groups: array
+        Group of each vertex, such as its connected component. N(t) of a
+        group sums the counters of its vertices, None (default) for one
+        group
+
+    Returns
+    -------
+    array
+        N(t) for t = 0, 1, ..., with one column per group
+    """
+    groups = kwargs.get("groups", None)
+    if groups is None:
+        groups = np.zeros(graph.n_vertices, dtype=np.int64)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    max_distance = kwargs.get("max_distance", None)
+    registers = init_registers(graph.n_vertices, kwargs.get("precision", PRECISION),
+                               kwargs.get("seed", 0))
+    function = [np.bincount(groups, weights=estimate(registers), minlength=n_groups)]
+    distance = 0
+    while max_distance is None or distance < max_distance:
+        updated = propagate(graph, registers)
+        if np.array_equal(updated, registers):
+            break
+        registers = updated
+        distance += 1
+        function.append(np.bincount(groups, weights=estimate(registers), minlength=n_groups))
+    return np.array(function).reshape(len(function), n_groups)
+
+
+def effective_diameter(function, share=0.9):
+    """
+    Returns distance within which `share` of the pairs counted by
+    neighbourhood function `function`, an array of N(t) per column, lie,
+    interpolated between integer distances
+    """
+    function = np.asarray(function, dtype=np.float64)
+    if function.ndim == 1:
+        function = function[:, np.newaxis]
+    diameters = np.zeros(function.shape[1])
+    for column in xrange(function.shape[1]):
+        # Estimates may decrease by a hair when counters switch estimator
+        values = np.maximum.accumulate(function[:, column])
+        target = share*values[-1]
+        distance = int(np.searchsorted(values, target))
+        if distance == 0 or values[distance] == values[distance-1]:
+            diameters[column] = distance
+        else:
+            diameters[column] = distance - 1 + (target - values[distance-1]) / \
+                (values[distance] - values[distance-1])
+    return diameters
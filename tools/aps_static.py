@@ -1,56 +1,161 @@
-import json
+"""
+Static statistics of APS graph snapshots
+module: degree and strength of the vertices of each snapshot
+author: ricardosilveira@poli.ufrj.br
+
+Edges are streamed from csv or binary snapshot files and reduced with
+bincount over their columns. For directed citation graphs, out-degree and
+out-strength count edges as source, in-degree and in-strength as target.
+Co-authorship files list each edge once, so degree and strength, the sums
+of both, are the undirected ones.
+"""
+import os
+import multiprocessing
+import numpy as np
+from graph import CHUNK_SIZE, graph_files, iter_edges
 
 DEGREE = 0
 WEIGHT = 1
 ROOT_PATH = "../builder/APS/"
+STATIC_TABLE_NAME = "static_info.npz"
+# Columns of the static table, one row per vertex of each snapshot
+COLUMNS = ["out_degree", "in_degree", "out_strength", "in_strength"]
 
-def update_weight(vertices, v_i, e_w):
-    if v_i not in vertices:
-        vertices[v_i] = [0, 0.]
-    vertices[v_i][WEIGHT] += e_w
 
-def update_degree(vertices, v_i):
-    if v_i not in vertices:
-        vertices[v_i] = [0, 0.]
-    vertices[v_i][DEGREE] += 1
+def _accumulate(totals, values, weights=None):
+    """
+    Returns array `totals` plus the bincount of `values`, grown to fit
+    """
+    counts = np.bincount(values, weights=weights)
+    if len(counts) > len(totals):
+        totals = np.concatenate((totals, np.zeros(len(counts) - len(totals),
+                                                  dtype=totals.dtype)))
+    totals[:len(counts)] += counts.astype(totals.dtype)
+    return totals
 
-def get_static_info(graph_file_path):
-    vertices = {}
+
+def static_info(graph_file_path, chunk_size=CHUNK_SIZE):
+    """
+    Returns degree and strength of the vertices of graph file, csv or
+    binary snapshot, reading `chunk_size` bytes at once
+
+    Returns
+    -------
+    dict
+        "vertex": ids of the vertices with edges, and "out_degree",
+        "in_degree", "out_strength", "in_strength" arrays aligned with
+        them, "edges": number of edges
+    """
+    degrees = [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)]
+    strengths = [np.zeros(0), np.zeros(0)]
     edges_count = 0
-    with open(graph_file_path) as graph:
-        first_line = True
-        for edge in graph:
-            if not first_line: 
-                v_i, v_j, e_w = edge.rstrip("\r\n").split(",")
-                edges_count += 1
-                e_w = float(e_w)
-                v_i = int(v_i)
-                v_j = int(v_j)
-                # different authors worked with
-                update_degree(vertices, v_i)
-                update_degree(vertices, v_j)
-                # useful to count works made by author
-                update_weight(vertices, v_i, e_w)
-                update_weight(vertices, v_j, e_w)
-            if first_line:
-                first_line = False
-    vertices_count = len(vertices.keys())
-    return vertices, vertices_count, edges_count
+    for v_i, v_j, e_w in iter_edges(graph_file_path, chunk_size):
+        for side, vertices in enumerate([v_i, v_j]):
+            degrees[side] = _accumulate(degrees[side], vertices)
+            strengths[side] = _accumulate(strengths[side], vertices, e_w)
+        edges_count += len(v_i)
+    size = max(len(degrees[0]), len(degrees[1]))
+    columns = [np.concatenate((column, np.zeros(size - len(column), dtype=column.dtype)))
+               for column in degrees + strengths]
+    vertices = np.flatnonzero(columns[0] + columns[1])
+    info = dict((name, column[vertices]) for name, column in zip(COLUMNS, columns))
+    info["vertex"] = vertices
+    info["edges"] = edges_count
+    return info
+
+
+def get_static_info(graph_file_path):
+    """
+    Returns ({vertex: [degree, strength]}, vertices count, edges count) of
+    graph file, where degree and strength count edges of both ends
+    """
+    info = static_info(graph_file_path)
+    degree = (info["out_degree"] + info["in_degree"]).tolist()
+    strength = (info["out_strength"] + info["in_strength"]).tolist()
+    vertices = dict((vertex, [degree[index], strength[index]])
+                    for index, vertex in enumerate(info["vertex"].tolist()))
+    return vertices, len(vertices), info["edges"]
+
 
 def get_avg_degree(vertices_count, edges_count):
     return float(edges_count)/(2*vertices_count)
 
-def load_all_graphs(files_path):
-    files_path_list = json.load(open(files_path))
-    for file_path in files_path_list:
-        vertices, n_vertices, m_edges = get_static_info(ROOT_PATH+file_path)
-        output_path = file_path.replace(".json", "_VERTICES_INFO.json")
-        output_file = open(ROOT_PATH+output_path, "w+")
-        output_file.write(json.dumps(vertices))
-        output_file.close()
+
+def _static_info_task(task):
+    """
+    Worker for `load_all_graphs`: statistics of one graph file
+    """
+    return static_info(*task)
+
+
+def load_all_graphs(files_path, **kwargs):
+    """
+    Computes statistics of every graph file listed in `files_path`, a
+    files.json, and saves them as one table, see `load_static_table`
+
+    Parameters
+    ----------
+    output_path: str
+        Path of the npz table.
+        Default: STATIC_TABLE_NAME next to `files_path`.
+    workers: int
+        Number of processes reading files in parallel.
+        Default: 1.
+    chunk_size: int
+        Bytes of each file read at once.
+        Default: graph.CHUNK_SIZE.
+    root_path: str
+        Directory the builder ran in, which listed relative paths start
+        from, see `graph.listed_file`.
+        Default: None, looked up from the files.json directory.
+
+    Returns
+    -------
+    str:
+        Path of the table.
+    """
+    output_path = kwargs.get("output_path",
+                             os.path.join(os.path.dirname(files_path), STATIC_TABLE_NAME))
+    workers = kwargs.get("workers", 1)
+    files = graph_files(files_path, kwargs.get("root_path", None))
+    tasks = [(file_path, kwargs.get("chunk_size", CHUNK_SIZE)) for file_path in files]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            infos = pool.map(_static_info_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        infos = [_static_info_task(task) for task in tasks]
+    table = {"files": np.array([os.path.basename(file_path) for file_path in files]),
+             "edges": np.array([info["edges"] for info in infos], dtype=np.int64),
+             "vertices": np.array([len(info["vertex"]) for info in infos], dtype=np.int64),
+             "snapshot": np.repeat(np.arange(len(infos), dtype=np.int32),
+                                   [len(info["vertex"]) for info in infos])}
+    for name, dtype in zip(["vertex"] + COLUMNS,
+                           [np.int32, np.int32, np.int32, np.float64, np.float64]):
+        table[name] = np.concatenate([info[name] for info in infos]).astype(dtype) \
+            if infos else np.empty(0, dtype=dtype)
+    np.savez_compressed(output_path, **table)
+    return output_path
+
+
+def load_static_table(table_path):
+    """
+    Returns dict of the arrays of a table saved by `load_all_graphs`, with
+    "degree" and "strength" added: one row per vertex of each snapshot,
+    "snapshot" indexing "files", "edges" and "vertices"
+    """
+    with np.load(table_path) as table:
+        columns = dict((name, table[name]) for name in table.files)
+    columns["degree"] = columns["out_degree"] + columns["in_degree"]
+    columns["strength"] = columns["out_strength"] + columns["in_strength"]
+    return columns
+
 
 if __name__ == "__main__":
     citation_dir = ROOT_PATH+"output/citation_graphs/files.json"
     coauthorship_dir = ROOT_PATH+"output/coauthorship_graphs/files.json"
-    #load_all_graphs(coauthorship_dir)
-    load_all_graphs(citation_dir)
+    #load_all_graphs(coauthorship_dir, workers=multiprocessing.cpu_count(), root_path=ROOT_PATH)
+    load_all_graphs(citation_dir, workers=multiprocessing.cpu_count(), root_path=ROOT_PATH)
@@ -3,9 +3,14 @@ Breadth-First Search module
 module: bfs class
 author: ricardosilveira@poli.ufrj.br
 """
+import numpy as np
 from explorer import Explorer
 
 
+# Levels with more edges than vertices/DENSE_RATIO are marked in a bitmap
+DENSE_RATIO = 32
+
+
 class BFS(Explorer):
     """
     Class for operating Breadth-First Search
@@ -27,13 +32,15 @@ class BFS(Explorer):
         Increment the layer counter `i` by one
 
     (Kleinberg - Tardos: Algorithm Design)
+
+    Each layer L[i] is processed at once over arrays, see `bfs`.
     """
 
     def explore(self, root, *args, **kwargs):
         """
-        Runs breath-first search in the graph and returns two dictionaries
-        mapping the generated trees from the search started at vertex `root`
-        
+        Runs breath-first search in the graph from vertex `root` and marks
+        the vertices reached as discovered
+
         Parameteres
         -----------
         root: int
@@ -41,34 +48,78 @@ class BFS(Explorer):
 
         Returns
         -------
-        list
-            [([dictionary mapping parents in the tree,
-              dictionary mapping level of each vertex])]
+        tuple
+            (array of the parent of each vertex in the tree,
+             array of the level of each vertex), indexed by compact vertex
+            ids, see `Explorer.vertex_id`
         """
-        vertices_queue = Deque()
-        # Put `s` on queue `Q`
-        vertices_queue.put(root)
-        visited = {}
-        # Set `s` as discovered
-        visited[root] = True
-        # Set the current BFS tree `T` as empty
-        tree = {root: None}
-        tree_level = {root: 0}
-        # While `Q` is not empty
-        while not vertices_queue.empty():
-            # Gets vertex `u` from the Queue
-            v_i = vertices_queue.get_oldest()
-            # Removes `u` from list of vertices to visit
-            del self.vertices_left[v_i]
-            # Consider each edge (u,v) incident to `u`
-            for v_j in self.graph.get_neighbors(v_i):
-                # If `v` is not discovered, then
-                if v_j not in visited:
-                    # Add edge (u,v) to the tree `T`
-                    tree[v_j] = v_i
-                    tree_level[v_j] = tree_level[v_i] + 1
-                    # Add vertex `v` to the Queue
-                    vertices_queue.put(v_j)
-                    # Set `v` as discovered
-                    visited[v_j] = True
-        return (tree, tree_level)
+        parents, levels = bfs(self.csr_graph, self.vertex_id(root))
+        self.discovered[levels >= 0] = True
+        return parents, levels
+
+
+def frontier_edges(offsets, neighbors, frontier):
+    """
+    Returns (sources, targets) arrays of all edges leaving the vertices of
+    array `frontier`, from CSR arrays `offsets` and `neighbors`
+    """
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    # Position of each edge: start of its row plus its rank in the row
+    shifts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.repeat(frontier, counts), neighbors[np.arange(counts.sum()) + shifts]
+
+
+def bfs(graph, root):
+    """
+    Level-synchronous breadth-first search over CSRGraph `graph` from vertex
+    `root`: all edges leaving a level are gathered at once, and targets not
+    visited yet make the next level. Levels with few edges filter their
+    targets, larger ones are marked in a bitmap over all vertices, which is
+    cheaper than filtering arrays of edges.
+
+    Parameters
+    ----------
+    graph: CSRGraph
+        Explored graph
+    root: int
+        Vertex id to start from
+
+    Returns
+    -------
+    tuple
+        (parents, levels) int32 arrays over vertex ids. The parent of root
+        is root, vertices not reached have parent and level -1.
+    """
+    n_vertices = graph.n_vertices
+    parents = np.full(n_vertices, -1, dtype=np.int32)
+    levels = np.full(n_vertices, -1, dtype=np.int32)
+    visited = np.zeros(n_vertices, dtype=bool)
+    visited[root] = True
+    parents[root] = root
+    levels[root] = 0
+    frontier = np.array([root], dtype=np.int32)
+    reached, candidates = None, None
+    level = 0
+    while len(frontier):
+        level += 1
+        sources, targets = frontier_edges(graph.offsets, graph.neighbors, frontier)
+        if len(targets) > n_vertices//DENSE_RATIO:
+            if reached is None:
+                reached = np.zeros(n_vertices, dtype=bool)
+                candidates = np.empty(n_vertices, dtype=np.int32)
+            reached[targets] = True
+            # Vertices reached from many sources keep one of them as parent
+            candidates[targets] = sources
+            frontier = np.flatnonzero(reached & ~visited).astype(np.int32)
+            reached[targets] = False
+            parents[frontier] = candidates[frontier]
+        else:
+            unvisited = ~visited[targets]
+            sources, targets = sources[unvisited], targets[unvisited]
+            parents[targets] = sources
+            # Rows have no repeated neighbors, so each vertex matches once
+            frontier = targets[parents[targets] == sources]
+        visited[frontier] = True
+        levels[frontier] = level
+    return parents, levels
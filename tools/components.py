@@ -0,0 +1,238 @@
+"""
+Connected components module
+module: disjoint sets over compact vertex ids, fed with edges streamed
+from graph files
+author: ricardosilveira@poli.ufrj.br
+"""
+import numpy as np
+from graph import CHUNK_SIZE, graph_files, iter_edges
+
+
+class DisjointSets(object):
+    """
+    Disjoint sets of vertex ids with union by rank and path compression,
+    stored in arrays growing with the largest id seen. Edges are joined
+    in batches: roots of both ends are found for all edges at once, and
+    each root of lower (rank, id) is hooked under the other end. Direction
+    of edges is ignored, components of directed graphs are the weakly
+    connected ones.
+
+    Attributes
+    ----------
+    parent
+        Parent of each vertex, roots are their own parent
+    rank
+        Upper bound of the height of the tree of each root
+    size
+        Number of vertices in the tree of each root
+    seen
+        True for vertices found in edges or added
+    n_seen
+        Number of seen vertices
+    n_components
+        Number of components among seen vertices
+    largest
+        Size of the largest component
+
+    Methods
+    -------
+    find(vertex)
+        Returns root of the component of `vertex`
+    union(v_i, v_j)
+        Joins components of `v_i` and `v_j`
+    union_edges(v_i, v_j)
+        Joins components of the ends of arrays of edges
+    roots(vertices)
+        Returns root of the component of each vertex of an array
+    components()
+        Returns component sizes and the vertices of each component
+    """
+
+    def __init__(self, n_vertices=0):
+        """
+        Parameters
+        ----------
+        n_vertices: int
+            Number of vertex ids to allocate, grown on demand
+        """
+        self.parent = np.arange(n_vertices, dtype=np.int32)
+        self.rank = np.zeros(n_vertices, dtype=np.uint8)
+        self.size = np.ones(n_vertices, dtype=np.int64)
+        self.seen = np.zeros(n_vertices, dtype=bool)
+        self.n_seen = 0
+        self.n_components = 0
+        self.largest = 0
+
+    def __len__(self):
+        return len(self.parent)
+
+    def grow(self, n_vertices):
+        """
+        Allocates vertex ids up to `n_vertices`, doubling the arrays
+        """
+        current = len(self.parent)
+        if n_vertices <= current:
+            return
+        capacity = max(n_vertices, 2*current)
+        if capacity > 2**31:
+            raise ValueError("Vertex ids must fit in int32")
+        self.parent = np.concatenate((self.parent, np.arange(current, capacity, dtype=np.int32)))
+        self.rank = np.concatenate((self.rank, np.zeros(capacity - current, dtype=np.uint8)))
+        self.size = np.concatenate((self.size, np.ones(capacity - current, dtype=np.int64)))
+        self.seen = np.concatenate((self.seen, np.zeros(capacity - current, dtype=bool)))
+
+    def add(self, vertices):
+        """
+        Marks array of `vertices` as seen, each new one a component
+        """
+        vertices = np.asarray(vertices, dtype=np.int64)
+        if not len(vertices):
+            return
+        self.grow(int(vertices.max()) + 1)
+        new = np.unique(vertices[~self.seen[vertices]])
+        self.seen[new] = True
+        self.n_seen += len(new)
+        self.n_components += len(new)
+        self.largest = max(self.largest, 1 if len(new) else 0)
+
+    def find(self, vertex):
+        """
+        Returns root of the component of `vertex`, compressing its path
+        """
+        root = vertex
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[vertex] != root:
+            self.parent[vertex], vertex = root, self.parent[vertex]
+        return int(root)
+
+    def union(self, v_i, v_j):
+        """
+        Joins components of `v_i` and `v_j`, returns True if they were
+        apart
+        """
+        return self.union_edges([v_i], [v_j]) > 0
+
+    def roots(self, vertices):
+        """
+        Returns array with the root of the component of each vertex in
+        array `vertices`, compressing their paths
+        """
+        roots = self.parent[vertices]
+        # Pointer jumping, trees are O(log n) high by the ranks
+        while True:
+            grand_parents = self.parent[roots]
+            if np.array_equal(grand_parents, roots):
+                break
+            roots = grand_parents
+        self.parent[vertices] = roots
+        return roots
+
+    def union_edges(self, v_i, v_j):
+        """
+        Joins the components of the ends of each edge of arrays `v_i`,
+        `v_j`, marking them as seen
+
+        Returns
+        -------
+        int
+            Number of components joined
+        """
+        v_i = np.asarray(v_i, dtype=np.int64)
+        v_j = np.asarray(v_j, dtype=np.int64)
+        self.add(np.concatenate((v_i, v_j)))
+        joins = 0
+        while len(v_i):
+            v_i, v_j = self.roots(v_i), self.roots(v_j)
+            apart = v_i != v_j
+            v_i, v_j = v_i[apart], v_j[apart]
+            if not len(v_i):
+                break
+            # Hooking the root of lower (rank, id) under the other one
+            swap = (self.rank[v_i] > self.rank[v_j]) | \
+                ((self.rank[v_i] == self.rank[v_j]) & (v_i > v_j))
+            children = np.where(swap, v_j, v_i)
+            self.parent[children] = np.where(swap, v_i, v_j)
+            # Roots hooked by many edges keep one parent, the last written
+            children = np.unique(children)
+            parents = self.parent[children]
+            equal = self.rank[children] == self.rank[parents]
+            self.rank[parents[equal]] = self.rank[children[equal]] + 1
+            # Sizes of the hooked trees go to the roots they end in
+            roots = self.roots(children)
+            np.add.at(self.size, roots, self.size[children])
+            self.largest = max(self.largest, int(self.size[roots].max()))
+            joins += len(children)
+        self.n_components -= joins
+        return joins
+
+    def components(self):
+        """
+        Returns components of seen vertices, largest first, then by
+        smallest vertex
+
+        Returns
+        -------
+        tuple
+            (sizes, offsets, vertices) arrays: vertices of the i-th
+            component are vertices[offsets[i]:offsets[i+1]]
+        """
+        vertices = np.flatnonzero(self.seen)
+        roots = self.roots(vertices)
+        order = np.argsort(roots, kind="mergesort")
+        roots, vertices = roots[order], vertices[order]
+        starts = np.flatnonzero(np.concatenate(([True], roots[1:] != roots[:-1]))) \
+            if len(roots) else np.empty(0, dtype=np.int64)
+        sizes = np.diff(np.append(starts, len(roots)))
+        # Largest first, ties by smallest vertex, the first of each root
+        # as vertices are sorted within roots, so the order does not
+        # depend on the order edges were joined
+        by_size = np.lexsort((vertices[starts], -sizes))
+        positions = np.empty(len(sizes), dtype=np.int64)
+        positions[by_size] = np.arange(len(sizes))
+        order = np.argsort(np.repeat(positions, sizes), kind="mergesort")
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes[by_size], out=offsets[1:])
+        return sizes[by_size], offsets, vertices[order]
+
+
+def connected_components(file_paths, chunk_size=CHUNK_SIZE):
+    """
+    Returns DisjointSets of the components of the union of graph files
+    `file_paths`, see `graph.graph_files`, streaming their edges in chunks
+    of `chunk_size` bytes without building the adjacency
+    """
+    disjoint_sets = DisjointSets()
+    for file_path in graph_files(file_paths):
+        for v_i, v_j, _ in iter_edges(file_path, chunk_size):
+            disjoint_sets.union_edges(v_i, v_j)
+    return disjoint_sets
+
+
+def components_growth(file_paths, chunk_size=CHUNK_SIZE):
+    """
+    Adds graph files `file_paths`, such as yearly snapshots listed in a
+    files.json, one at a time to the same disjoint sets, recording the
+    components of the accumulated graph after each one
+
+    Returns
+    -------
+    list of dicts
+        [{"file": path, "edges": edges of the file, "vertices": vertices
+          seen so far, "components": components so far, "giant": size of
+          the largest component, "giant_fraction": its share of vertices}]
+    """
+    disjoint_sets = DisjointSets()
+    growth = []
+    for file_path in graph_files(file_paths):
+        edges_count = 0
+        for v_i, v_j, _ in iter_edges(file_path, chunk_size):
+            disjoint_sets.union_edges(v_i, v_j)
+            edges_count += len(v_i)
+        growth.append({"file": file_path,
+                       "edges": edges_count,
+                       "vertices": disjoint_sets.n_seen,
+                       "components": disjoint_sets.n_components,
+                       "giant": disjoint_sets.largest,
+                       "giant_fraction": disjoint_sets.largest/float(max(1, disjoint_sets.n_seen))})
+    return growth
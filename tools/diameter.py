@@ -0,0 +1,179 @@
+"""
+Diameter module
+module: exact diameter of connected components by iFUB
+author: ricardosilveira@poli.ufrj.br
+
+iFUB (Crescenzi et al.: On computing the diameter of real-world undirected
+graphs) runs a BFS from a central vertex u, found by a 4-sweep, and then
+computes the eccentricities of the vertices farthest from u first, by
+batches of multi-source BFS. Once the largest eccentricity found is larger
+than twice the level left, it is the diameter. On real-world graphs this
+takes a handful of BFS runs.
+"""
+import numpy as np
+from graph import CSRGraph
+from bfs import bfs
+from msbfs import BATCH_SIZE, msbfs, reverse_graph
+from components import DisjointSets
+
+
+def farthest(levels):
+    """
+    Returns (vertex, distance) of the vertex reached farthest by a search
+    """
+    vertex = int(levels.argmax())
+    return vertex, int(levels[vertex])
+
+
+def middle(parents, vertex, distance):
+    """
+    Returns vertex half way of the tree path from `vertex` to the root
+    """
+    for _ in xrange(distance//2):
+        vertex = parents[vertex]
+    return int(vertex)
+
+
+def four_sweep(graph, root):
+    """
+    Runs two double sweeps from `root` in connected undirected CSRGraph
+    `graph`, the second from the middle of the path found by the first
+
+    Returns
+    -------
+    tuple
+        (lower bound of the diameter, central vertex, BFS runs)
+    """
+    lower = 0
+    for _ in xrange(2):
+        border, _ = farthest(bfs(graph, root)[1])
+        parents, levels = bfs(graph, border)
+        other_border, distance = farthest(levels)
+        lower = max(lower, distance)
+        root = middle(parents, other_border, distance)
+    return lower, root, 4
+
+
+def ifub_diameter(graph):
+    """
+    Returns exact diameter of connected undirected CSRGraph `graph`
+
+    Returns
+    -------
+    tuple
+        (diameter, number of BFS runs)
+    """
+    if graph.n_vertices < 2:
+        return 0, 0
+    lower, center, runs = four_sweep(graph, int(graph.degrees().argmax()))
+    levels = bfs(graph, center)[1]
+    runs += 1
+    level = int(levels.max())
+    lower = max(lower, level)
+    # Vertices at level i from the center are at most 2i apart
+    upper = 2*level
+    reverse = reverse_graph(graph)
+    while lower < upper and level > 0:
+        fringe = np.flatnonzero(levels == level)
+        # Eccentricities of the fringe, a batch of sources at a time
+        for start in xrange(0, len(fringe), BATCH_SIZE):
+            histograms = msbfs(graph, fringe[start:start + BATCH_SIZE], reverse=reverse)[0]
+            lower = max(lower, histograms.shape[1] - 1)
+            runs += len(histograms)
+            if lower >= upper:
+                break
+        level -= 1
+        upper = min(upper, 2*level)
+    return lower, runs
+
+
+def is_clique(graph):
+    """
+    Returns True if all vertices of CSRGraph `graph` are adjacent, as in
+    the co-authorship graph of a single work
+    """
+    loops = (np.repeat(np.arange(graph.n_vertices), graph.degrees()) == graph.neighbors).sum()
+    return len(graph.neighbors) - loops == graph.n_vertices*(graph.n_vertices - 1)
+
+
+def undirected(graph):
+    """
+    Returns CSRGraph `graph` if undirected, otherwise its edges in both
+    directions
+    """
+    if not graph.directed:
+        return graph
+    sources = np.repeat(np.arange(graph.n_vertices), graph.degrees())
+    return CSRGraph.from_edges(sources, graph.neighbors, n_vertices=graph.n_vertices)
+
+
+def components(graph, all_vertices=True):
+    """
+    Returns components of CSRGraph `graph`, weakly connected ones if
+    directed, see `DisjointSets.components`. Ids without edges are single vertex
+    components if `all_vertices`, otherwise they are left out, as ids of
+    graphs converted by `Explorer` may skip unused labels.
+    """
+    disjoint_sets = DisjointSets(graph.n_vertices)
+    if all_vertices:
+        disjoint_sets.add(np.arange(graph.n_vertices))
+    sources = np.repeat(np.arange(graph.n_vertices), graph.degrees())
+    disjoint_sets.union_edges(sources, graph.neighbors)
+    return disjoint_sets.components()
+
+
+def component_graphs(graph, min_size=1, all_vertices=True):
+    """
+    Yields (component index, vertices, CSRGraph of the component) for the
+    components of undirected CSRGraph `graph` of at least `min_size`
+    vertices, largest first, see `components`. Vertices are relabeled once
+    so that each component is a range of ids, and its graph is a slice of
+    the arrays.
+    """
+    sizes, bounds, vertices = components(graph, all_vertices)
+    sources = np.repeat(np.arange(graph.n_vertices), graph.degrees())
+    new_ids = np.empty(graph.n_vertices, dtype=np.int64)
+    new_ids[vertices] = np.arange(len(vertices))
+    relabeled = CSRGraph.from_edges(new_ids[sources], new_ids[graph.neighbors],
+                                    n_vertices=len(vertices), directed=True)
+    for index in np.flatnonzero(sizes >= min_size).tolist():
+        first, last = bounds[index], bounds[index+1]
+        start, end = relabeled.offsets[first], relabeled.offsets[last]
+        yield index, vertices[first:last], CSRGraph.from_csr(
+            relabeled.offsets[first:last+1] - start, relabeled.neighbors[start:end] - first)
+
+
+def diameters(graph, **kwargs):
+    """
+    Returns exact diameter of each connected component of CSRGraph
+    `graph`, by iFUB. Directed graphs are taken as undirected.
+
+    Parameters
+    ----------
+    min_size: int
+        Components with fewer vertices are skipped, 1 (default)
+    all_vertices: bool
+        If True (default), ids without edges are single vertex
+        components, see `components`
+
+    Returns
+    -------
+    list of dicts
+        [{"index": component index, largest first, "size": vertices,
+          "diameter": diameter, "bfs_runs": BFS runs, "vertices": array
+          of the ids of the component}]
+    """
+    results = []
+    for index, vertices, component in component_graphs(undirected(graph),
+                                                       kwargs.get("min_size", 1),
+                                                       kwargs.get("all_vertices", True)):
+        if len(vertices) <= 2 or is_clique(component):
+            diameter, runs = min(len(vertices) - 1, 1), 0
+        else:
+            diameter, runs = ifub_diameter(component)
+        results.append({"index": index,
+                        "size": len(vertices),
+                        "diameter": diameter,
+                        "bfs_runs": runs,
+                        "vertices": vertices})
+    return results
@@ -30,7 +30,7 @@ class Dynamic(object):
             Adjacency list with all vertices and the time difference for the
             edges to connect to its neighbors from graph_b to graph_a
         """
-        ages_graph - {}
+        ages_graph = {}
         for vertice in graph_a.vertices():
             neighbors = graph_a.get_neighbors(vertice)
             for neighbor in neighbors:
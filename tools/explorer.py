@@ -3,85 +3,181 @@ Abstract class for methods that wil explore graph
 module: searcher module
 author: ricardosilveira@poli.ufrj.br
 """
+import numpy as np
+from graph import CSRGraph
+
+
+# Vertices scanned at once when looking for undiscovered vertices
+SCAN_SIZE = 65536
 
 
 class Explorer(object):
+    """
+    Base class for searches over compact vertex ids 0 .. n - 1, as stored
+    in a CSRGraph. Other graphs are converted on first search, their vertex
+    labels mapped to ids in sorted order. Nothing is copied or allocated
+    before the first search.
+
+    Attributes
+    ----------
+    graph
+        Explored graph
+    labels
+        Vertex label of each id, None if ids are the labels
+
+    Methods
+    -------
+    vertex_id(label)
+        Returns compact id of vertex `label`
+    vertex_label(vertex_id)
+        Returns label of compact id `vertex_id`
+    has_vertices_left()
+        Returns True if some vertex was not discovered by the searches
+    get_next_vertex()
+        Returns label of the first vertex not discovered yet
+    """
 
     def __init__(self, graph, *kwargs):
         """
-        Copies all vertices from graph and stores it in a dictionary
+        Keeps the graph, its compact form is built by the first search
         """
-        vertices_list = graph.indexes_map.keys()
         self.graph = graph
-        self.vertices_left = {}
-        for vertex in vertices_list:
-            self.vertices_left[vertex] = None
-    
+        self.labels = None
+        self.__csr_graph = None
+        self.__indexes = None
+        self.__discovered = None
+        self.__next_vertex = 0
+
+    @property
+    def csr_graph(self):
+        """
+        CSRGraph of the explored graph, built on first access
+        """
+        if self.__csr_graph is None:
+            if isinstance(self.graph, CSRGraph):
+                self.__csr_graph = self.graph
+            else:
+                self.__csr_graph = self.__compact_graph(self.graph)
+        return self.__csr_graph
+
+    def __compact_graph(self, graph):
+        """
+        Returns CSRGraph with the edges of `graph`, relabeling its vertices
+        unless they are all non-negative integers
+        """
+        labels = set(graph.edges)
+        for neighbors in graph.edges.itervalues():
+            labels.update(neighbors)
+        if all(isinstance(label, (int, long)) and label >= 0 for label in labels):
+            return CSRGraph.from_graph(graph)
+        self.labels = sorted(labels)
+        self.__indexes = dict((label, index) for index, label in enumerate(self.labels))
+        arcs = [(self.__indexes[v_i], self.__indexes[v_j], e_w)
+                for v_i, neighbors in graph.edges.iteritems()
+                for v_j, e_w in neighbors.iteritems()]
+        v_i, v_j, weights = zip(*arcs) if arcs else ([], [], [])
+        csr_graph = CSRGraph.from_edges(v_i, v_j, weights, n_vertices=len(self.labels),
+                                        directed=True, weighted=graph.weighted,
+                                        null_weight=graph.null_weight)
+        csr_graph.directed = graph.directed
+        csr_graph.m_edges = graph.m_edges
+        return csr_graph
+
+    @property
+    def discovered(self):
+        """
+        Boolean array marking the vertices reached by the searches so far
+        """
+        if self.__discovered is None:
+            self.__discovered = np.zeros(self.csr_graph.n_vertices, dtype=bool)
+        return self.__discovered
+
+    def vertex_id(self, label):
+        """
+        Returns compact id of vertex `label`
+        """
+        csr_graph = self.csr_graph
+        if self.__indexes is None:
+            if label not in csr_graph.indexes_map:
+                raise KeyError(label)
+            return int(label)
+        return self.__indexes[label]
+
+    def vertex_label(self, vertex_id):
+        """
+        Returns label of vertex of compact id `vertex_id`
+        """
+        if self.csr_graph is not None and self.labels is None:
+            return int(vertex_id)
+        return self.labels[vertex_id]
+
     def has_vertices_left(self):
         """
         Returns True if there are vertices not market yet
         False if all vertices were discovered already
         """
-        return len(self.vertices_left.keys()) > 0
+        return self.get_next_vertex() is not None
 
     def get_next_vertex(self):
         """
-        Returns the first available vertex in vertices_left
-        or none if none is available
+        Returns label of the first vertex not discovered by the searches
+        or None if all vertices were discovered already
         """
-        try:
-            return self.vertices_left.keys()[0]
-        except IndexError:
-            return None
-    
+        discovered = self.discovered
+        while self.__next_vertex < len(discovered):
+            block = discovered[self.__next_vertex:self.__next_vertex + SCAN_SIZE]
+            left = np.flatnonzero(~block)
+            if len(left):
+                self.__next_vertex += int(left[0])
+                return self.vertex_label(self.__next_vertex)
+            self.__next_vertex += len(block)
+        return None
+
     def from_i_to_root(self, tree, vertex_name):
         """
         Returns
         -------
         list
-            Elements in path from element i to root
+            Elements in path from element i to root, where `tree` is the
+            array of parents of a search, the root being its own parent
         """
         path = []
-        start_node = self.graph.vertices_map[vertex_name]
-        current_node_index = start_node
-        while tree[current_node_index] != None:
-            current_node_index = self.graph.vertices_map[tree[current_node_index]]
-            path.append(self.graph.indexes_map[current_node_index])
-        #path.append(self.graph.indexes_map[current_node_index])
+        current_node_index = self.vertex_id(vertex_name)
+        if tree[current_node_index] < 0:
+            return path
+        while tree[current_node_index] != current_node_index:
+            current_node_index = tree[current_node_index]
+            path.append(self.vertex_label(current_node_index))
         return path
-    
+
     def neighbors_in_tree(self, tree, vertex_index):
         """
         Finds neighbors of a vertex in the spanning tree
-        
+
         Parameters
         ----------
-        tree: list
-            list representing spanning tree, in which each element
+        tree: array
+            array representing spanning tree, in which each element
             points to its precessor in the tree
         vertex_index:
             element which we wish to find its neighbors
         """
-        neighbors = []
-        for i in range(len(tree)):
-            if tree[i] == vertex_index:
-                neighbors.append(i)
-        neighbors.append(tree[vertex_index])
+        neighbors = [v_i for v_i in np.flatnonzero(tree == vertex_index).tolist()
+                     if v_i != vertex_index]
+        if tree[vertex_index] not in (vertex_index, -1):
+            neighbors.append(int(tree[vertex_index]))
         return neighbors
 
     def export_spanning_tree(self, spanning_tree, output_path, mapped=True):
         """
-        Needs to be improved... But it is supposed to print the spanning tree
+        Writes each vertex of the spanning tree and its parent per line,
+        as labels if `mapped`, otherwise as compact ids
         """
         with open(output_path, "w+") as output_file:
-            tree_size = len(spanning_tree)-1
-            count = 0
-            printed = []
-            for v_i in xrange(tree_size, -1, -1):
-                leaf = self.graph.indexes_map[v_i]
-                while not spanning_tree[v_i] is None:
-                    v_j = spanning_tree[v_i]
-                    if mapped:
-                        v_j = self.graph.vertices_map[v_j]
-                    v_i = v_j
-                    ouput_file.write(str(leaf)+" "+str(G.indexes_map[v_i]))
+            for v_i in np.flatnonzero(spanning_tree >= 0).tolist():
+                v_j = int(spanning_tree[v_i])
+                if v_j == v_i:
+                    continue
+                if mapped:
+                    v_i, v_j = self.vertex_label(v_i), self.vertex_label(v_j)
+                output_file.write("%s %s\n" % (v_i, v_j))
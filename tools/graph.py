@@ -3,6 +3,16 @@ Graph module
 module: graph module
 author: ricardosilveira@poli.ufrj.br
 """
+import os
+import json
+import numpy as np
+from snapshot import SNAPSHOT_EXTENSION, Snapshot, read_snapshot
+
+
+# Bytes of csv read at once by the bulk loader
+CHUNK_SIZE = 64*1024**2
+# Reductions of the weights of repeated edges
+COMBINE_METHODS = {"sum": np.add, "max": np.maximum, "min": np.minimum}
 
 
 class Graph(object):
@@ -18,7 +28,7 @@ class Graph(object):
     n_vertices
         Number of vertices in the graph
     m_edges
-        Number of edges in the graph
+        Number of edges in the graph, undirected edges counted once
 
     Methods
     -------
@@ -26,8 +36,16 @@ class Graph(object):
         Reads graph from file
     add_edge(v_i, v_j, w)
         Adds an edge from v_i to v_j with weight w
+    add_link(v_i, v_j, w)
+        Adds an edge from v_i to v_j and, if undirected, from v_j to v_i
+    get_edge(v_i, v_j)
+        Returns weight of the edge from v_i to v_j
     get_neighbors(`vertex`)
         Returns list of neighbors of a given `vertex`
+    vertices()
+        Returns vertices with edges
+    from_files(file_paths)
+        Loads builder graph files as a CSRGraph
     """
     def __init__(self, **kwargs):
         """
@@ -70,7 +88,7 @@ class Graph(object):
             if not self.n_vertices:
                 self.n_vertices = int(edge)
                 # Creates structure for adjacency list
-                self.edges = self.n_vertices*[self.null_weight]
+                self.edges = {}
             # From second line onwards
             else:
                 if self.weighted:
@@ -86,14 +104,15 @@ class Graph(object):
                 except ValueError:
                     pass
                 e_w = float(e_w)
-                self.add_edge(v_i, v_j, e_w)
-                # Adding doubled edge
-                if not self.directed:
-                    self.add_edge(v_j, v_i, e_w)
+                self.add_link(v_i, v_j, e_w)
 
     def add_edge(self, v_i, v_j, e_w=1.):
         """
-        Adds an edge connecting  `v_i` to `v_j` with weight `e_w`
+        Adds an edge connecting  `v_i` to `v_j` with weight `e_w`. Only
+        this direction is added, in undirected graphs too, see `add_link`.
+        Adding an existing edge replaces its weight, and an undirected edge
+        is counted once in `m_edges` whether one or both directions are
+        added.
 
         Parameters
         ----------
@@ -104,17 +123,31 @@ class Graph(object):
         e_w: float
             Weight for the edge connecting `v_i` to `v_j`
         """
-        self.m_edges += 1
+        if v_j not in self.edges.get(v_i, ()) and \
+                (self.directed or v_i not in self.edges.get(v_j, ())):
+            self.m_edges += 1
         try:
             self.edges[v_i][v_j] = e_w
         # First edge of vertex v_i
-        except:
+        except KeyError:
             self.edges[v_i] = {v_j: e_w}
 
+    def add_link(self, v_i, v_j, e_w=1.):
+        """
+        Adds an edge connecting `v_i` to `v_j` with weight `e_w`, and from
+        `v_j` to `v_i` if the graph is undirected, as graph files are parsed
+        """
+        self.add_edge(v_i, v_j, e_w)
+        # Adding doubled edge
+        if not self.directed:
+            self.add_edge(v_j, v_i, e_w)
+
     def get_edge(self, v_i, v_j):
         """
+        Returns weight of the edge connecting `v_i` to `v_j`, or
+        `null_weight` if there is no such edge
         """
-        pass
+        return self.edges.get(v_i, {}).get(v_j, self.null_weight)
 
     def get_neighbors(self, v_i):
         """
@@ -134,3 +167,476 @@ class Graph(object):
         """
         # v_i is same as in the edges structure
         return self.edges[v_i]
+
+    def vertices(self):
+        """
+        Returns list of vertices with outgoing edges
+        """
+        return self.edges.keys()
+
+    @classmethod
+    def from_files(cls, file_paths, **kwargs):
+        """
+        Loads graph files written by the builders into a CSRGraph, reading
+        csv files in large chunks and binary snapshot files as arrays, with
+        no work per edge in Python. The number of vertices is the largest
+        vertex plus one.
+
+        Parameters
+        ----------
+        file_paths: str or list
+            Path of a graph file, a files.json listing graph files, or a
+            list of such paths
+        directed: bool
+            True if edges are directed, False (default) otherwise
+        combine: str
+            How weights of an edge found more than once are combined: 'sum',
+            'max' or 'min'. By default the last one is kept, as when adding
+            edges to a Graph
+        chunk_size: int
+            Bytes of csv read at once, CHUNK_SIZE (default)
+        Takes the other parameters of CSRGraph.
+
+        Returns
+        -------
+        CSRGraph
+        """
+        kwargs.setdefault("weighted", True)
+        v_i, v_j, weights = read_graph_files(file_paths, kwargs.pop("chunk_size", CHUNK_SIZE))
+        return CSRGraph.from_edges(v_i, v_j, weights, **kwargs)
+
+
+class VertexIndex(object):
+    """
+    Identity mapping between vertex labels and indexes of a CSRGraph, whose
+    vertices are 0 .. n_vertices - 1, read like `indexes_map` and
+    `vertices_map` dictionaries
+    """
+    def __init__(self, n_vertices):
+        self.n_vertices = n_vertices
+
+    def __len__(self):
+        return self.n_vertices
+
+    def __contains__(self, vertex):
+        try:
+            return 0 <= vertex < self.n_vertices and int(vertex) == vertex
+        except (TypeError, ValueError):
+            return False
+
+    def __getitem__(self, vertex):
+        if vertex not in self:
+            raise KeyError(vertex)
+        return int(vertex)
+
+    def __iter__(self):
+        return iter(xrange(self.n_vertices))
+
+    def keys(self):
+        """
+        Returns list of all vertices
+        """
+        return range(self.n_vertices)
+
+
+class CSRAdjacency(object):
+    """
+    Read-only view of the adjacency of a CSRGraph, read like the `edges`
+    dictionary of Graph: vertex -> array of neighbors
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return self.graph.n_vertices
+
+    def __contains__(self, vertex):
+        return vertex in self.graph.indexes_map
+
+    def __getitem__(self, vertex):
+        if vertex not in self:
+            raise KeyError(vertex)
+        return self.graph.get_neighbors(vertex)
+
+    def __iter__(self):
+        return iter(xrange(self.graph.n_vertices))
+
+    def keys(self):
+        """
+        Returns list of all vertices
+        """
+        return range(self.graph.n_vertices)
+
+    def iteritems(self):
+        """
+        Yields (vertex, neighbors) for all vertices
+        """
+        for vertex in xrange(self.graph.n_vertices):
+            yield vertex, self.graph.get_neighbors(vertex)
+
+
+class CSRGraph(Graph):
+    """
+    Immutable graph stored as compressed sparse rows: the neighbors of
+    vertex v are neighbors[offsets[v]:offsets[v+1]], sorted, with their
+    edge weights in weights[offsets[v]:offsets[v+1]]. Vertices are integers
+    0 .. n_vertices - 1. Undirected edges are stored in both directions.
+
+    Attributes
+    ----------
+    offsets
+        int32 array, int64 beyond 2**31 - 1 stored edges
+    neighbors
+        int32 array of neighbors of each vertex
+    weights
+        float array of the weight of each stored edge
+    indexes_map, vertices_map
+        Identity mappings of vertex indexes and labels
+
+    Methods
+    -------
+    from_edges(v_i, v_j, weights)
+        Builds graph from arrays of edges
+    from_graph(graph)
+        Builds graph from a Graph
+    from_csr(offsets, neighbors)
+        Builds graph from CSR arrays
+    get_edge(v_i, v_j)
+        Returns weight of the edge from v_i to v_j, in O(log d)
+    get_neighbors(`vertex`)
+        Returns array view of the neighbors of `vertex`
+    get_weights(`vertex`)
+        Returns array view of the weights of the edges of `vertex`
+    degrees()
+        Returns array with the number of neighbors of each vertex
+    """
+    def __init__(self, **kwargs):
+        """
+        Setting graph properties
+
+        Parameters
+        ----------
+        graph_path: str
+            Path for text file to parse, as read by Graph, with integer
+            vertices lower than the number of vertices in its first line
+        directed: bool
+            True if edges are directed, False (default) otherwise
+        weighted: bool
+            True if edges are weighted, False (default) otherwise
+        null_weight: float
+            Weight for non-existent edges, 0 (default)
+        weight_dtype: str
+            Type of the weights array, 'float64' (default) or 'float32'
+        """
+        self.directed = kwargs.get("directed", False)
+        self.weighted = kwargs.get("weighted", False)
+        self.null_weight = kwargs.get("null_weight", 0)
+        self.weight_dtype = np.dtype(kwargs.get("weight_dtype", "float64"))
+        self.n_vertices = 0
+        self.m_edges = 0
+        self.offsets = np.zeros(1, dtype=np.int32)
+        self.neighbors = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=self.weight_dtype)
+        input_file_path = kwargs.get("graph_path", None)
+        # Parsing entire graph file
+        if input_file_path:
+            self.__parse_graph(input_file_path)
+        self.indexes_map = VertexIndex(self.n_vertices)
+        self.vertices_map = self.indexes_map
+        self.edges = CSRAdjacency(self)
+
+    def __parse_graph(self, input_file_path):
+        """
+        Parses graph file in the format read by Graph
+
+        Parameters
+        ----------
+        input_file_path: str
+            Path for graph text file to be parsed
+        """
+        with open(input_file_path, "r") as graph_file:
+            n_vertices = int(graph_file.readline())
+            values = np.fromstring(graph_file.read(), sep=" ")
+        columns = 3 if self.weighted else 2
+        if len(values) % columns:
+            raise ValueError("Malformed graph file, expected %d fields per line" % columns)
+        values = values.reshape(-1, columns)
+        weights = values[:, 2] if self.weighted else None
+        self._build(values[:, 0].astype(np.int64), values[:, 1].astype(np.int64), weights,
+                    n_vertices)
+
+    @classmethod
+    def from_edges(cls, v_i, v_j, weights=None, **kwargs):
+        """
+        Returns graph with edges (v_i[k], v_j[k], weights[k]). As when adding
+        edges to a Graph, the last weight of a repeated edge is kept, unless
+        `combine` is set.
+
+        Parameters
+        ----------
+        n_vertices: int
+            Number of vertices, largest vertex plus one (default) or more
+        combine: str
+            Combines weights of repeated edges by 'sum', 'max' or 'min'
+        Takes the other parameters of CSRGraph.
+        """
+        graph = cls(**dict((key, value) for key, value in kwargs.iteritems()
+                           if key not in ["n_vertices", "combine"]))
+        graph._build(np.asarray(v_i, dtype=np.int64), np.asarray(v_j, dtype=np.int64),
+                     weights, kwargs.get("n_vertices", None), kwargs.get("combine", None))
+        return graph
+
+    @classmethod
+    def from_graph(cls, graph, **kwargs):
+        """
+        Returns CSRGraph with the edges of Graph `graph`, whose vertices are
+        integers. Takes the parameters of CSRGraph, with `directed`,
+        `weighted` and `null_weight` of `graph` as defaults.
+        """
+        for key in ["directed", "weighted", "null_weight"]:
+            kwargs.setdefault(key, getattr(graph, key))
+        kwargs["directed"] = True
+        arcs = [(v_i, v_j, e_w) for v_i, neighbors in graph.edges.iteritems()
+                for v_j, e_w in neighbors.iteritems()]
+        v_i, v_j, weights = zip(*arcs) if arcs else ([], [], [])
+        csr_graph = cls.from_edges(v_i, v_j, weights, n_vertices=graph.n_vertices, **kwargs)
+        # Both directions are already in the adjacency of undirected graphs
+        csr_graph.directed = graph.directed
+        csr_graph.m_edges = graph.m_edges
+        return csr_graph
+
+    @classmethod
+    def from_csr(cls, offsets, neighbors, weights=None, **kwargs):
+        """
+        Returns graph over CSR arrays `offsets` and `neighbors`, rows sorted
+        and without repeated neighbors, and optional `weights`, taken
+        without copies when their types match. Undirected graphs must have
+        their edges in both directions. Takes the parameters of CSRGraph.
+        """
+        graph = cls(**kwargs)
+        graph.offsets = np.asarray(offsets)
+        graph.neighbors = np.asarray(neighbors, dtype=np.int32)
+        graph.weights = np.ones(len(graph.neighbors), dtype=graph.weight_dtype) \
+            if weights is None else np.asarray(weights, dtype=graph.weight_dtype)
+        graph.n_vertices = len(graph.offsets) - 1
+        graph.m_edges = len(graph.neighbors)
+        if not graph.directed:
+            sources = np.repeat(np.arange(graph.n_vertices), graph.degrees())
+            graph.m_edges = (graph.m_edges + (sources == graph.neighbors).sum())//2
+        graph.indexes_map = VertexIndex(graph.n_vertices)
+        graph.vertices_map = graph.indexes_map
+        return graph
+
+    def _build(self, v_i, v_j, weights, n_vertices=None, combine=None):
+        """
+        Builds CSR arrays from arrays of edges
+        """
+        if combine is not None and combine not in COMBINE_METHODS:
+            raise ValueError("combine must be one of %s" % sorted(COMBINE_METHODS))
+        if weights is None:
+            weights = np.ones(len(v_i))
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(v_i) and min(v_i.min(), v_j.min()) < 0:
+            raise ValueError("Vertices must be non-negative integers")
+        largest = int(max(v_i.max(), v_j.max())) + 1 if len(v_i) else 0
+        n_vertices = max(largest, n_vertices or 0)
+        if n_vertices > 2**31:
+            raise ValueError("Vertices must fit in int32")
+        # Sorting keys of the arcs, stable over their order of insertion
+        keys = (v_i << 32) | v_j
+        if self.directed:
+            order = np.argsort(keys, kind="mergesort")
+        else:
+            loops = v_i == v_j
+            keys = np.concatenate((keys, (v_j[~loops] << 32) | v_i[~loops]))
+            weights = np.concatenate((weights, weights[~loops]))
+            positions = np.concatenate((np.arange(len(v_i)), np.flatnonzero(~loops)))
+            order = np.lexsort((positions, keys))
+        keys, weights = keys[order], weights[order]
+        # Keeping the last added weight of repeated arcs
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        if combine and len(keys):
+            starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+            weights = COMBINE_METHODS[combine].reduceat(weights, starts)
+            keys = keys[last]
+        else:
+            keys, weights = keys[last], weights[last]
+        sources = keys >> 32
+        offsets_dtype = np.int32 if len(keys) < 2**31 else np.int64
+        self.offsets = np.zeros(n_vertices + 1, dtype=offsets_dtype)
+        np.cumsum(np.bincount(sources, minlength=n_vertices), out=self.offsets[1:])
+        self.neighbors = (keys & 0xFFFFFFFF).astype(np.int32)
+        self.weights = weights.astype(self.weight_dtype)
+        self.n_vertices = n_vertices
+        self.m_edges = len(keys) if self.directed else \
+            (len(keys) + (sources == self.neighbors).sum())//2
+        self.indexes_map = VertexIndex(self.n_vertices)
+        self.vertices_map = self.indexes_map
+
+    def add_edge(self, v_i, v_j, e_w=1.):
+        """
+        CSRGraph is immutable, build it from all edges with from_edges
+        """
+        raise TypeError("CSRGraph is immutable, use CSRGraph.from_edges")
+
+    def get_edge(self, v_i, v_j):
+        """
+        Returns weight of the edge connecting `v_i` to `v_j`, or
+        `null_weight` if there is no such edge, by binary search over the
+        neighbors of `v_i`
+        """
+        if v_i not in self.indexes_map:
+            return self.null_weight
+        start, end = self.offsets[v_i], self.offsets[v_i+1]
+        position = start + np.searchsorted(self.neighbors[start:end], v_j)
+        if position < end and self.neighbors[position] == v_j:
+            return self.weights[position]
+        return self.null_weight
+
+    def get_neighbors(self, v_i):
+        """
+        Returns array view of the neighbors of vertex `v_i`, sorted
+
+        Parameters
+        ----------
+        v_i: int
+            vertex in the graph
+        """
+        return self.neighbors[self.offsets[v_i]:self.offsets[v_i+1]]
+
+    def get_weights(self, v_i):
+        """
+        Returns array view of the weights of the edges of vertex `v_i`, in
+        the order of `get_neighbors`
+        """
+        return self.weights[self.offsets[v_i]:self.offsets[v_i+1]]
+
+    def degrees(self):
+        """
+        Returns array with the number of neighbors of each vertex
+        """
+        return np.diff(self.offsets)
+
+    def vertices(self):
+        """
+        Returns all vertices, including the ones without edges
+        """
+        return xrange(self.n_vertices)
+
+
+def listed_file(listed_path, list_dir, root_path=None):
+    """
+    Returns path of graph file `listed_path` of the files.json in
+    `list_dir`. The builder lists paths relative to the directory it runs
+    in, such as output/coauthorship_graphs/1893/aps_coauthorship_1893_7.csv,
+    which are joined to `root_path` if given. Otherwise paths not found are
+    looked up below `list_dir` by the part following its name, keeping the
+    year directories, and last next to the files.json.
+    """
+    if root_path is not None and not os.path.isabs(listed_path):
+        return os.path.join(root_path, listed_path)
+    if os.path.exists(listed_path):
+        return listed_path
+    parts = os.path.normpath(listed_path).split(os.sep)
+    list_name = os.path.basename(os.path.abspath(list_dir))
+    if list_name in parts[:-1]:
+        below = len(parts) - parts[::-1].index(list_name)
+        found_path = os.path.join(list_dir, *parts[below:])
+        if os.path.exists(found_path):
+            return found_path
+    return os.path.join(list_dir, os.path.basename(listed_path))
+
+
+def graph_files(file_paths, root_path=None):
+    """
+    Returns list of graph files in `file_paths`, a path or list of paths,
+    expanding files.json lists, see `listed_file` for `root_path`
+    """
+    if isinstance(file_paths, basestring):
+        file_paths = [file_paths]
+    files = []
+    for file_path in file_paths:
+        if not file_path.endswith(".json"):
+            files.append(file_path)
+            continue
+        list_dir = os.path.dirname(file_path)
+        with open(file_path, "r") as files_list:
+            for listed_path in json.load(files_list):
+                files.append(listed_file(listed_path, list_dir, root_path))
+    return files
+
+
+def iter_csv_edges(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Yields (v_i, v_j, weights) arrays of the edges in each chunk of about
+    `chunk_size` bytes of csv graph file at `file_path`, with a header line
+    and `author_i,author_j[,weight]` lines. Weights are 1 if there is no
+    weight column.
+    """
+    with open(file_path, "rb") as graph_file:
+        columns = len(graph_file.readline().split(","))
+        rest = ""
+        while True:
+            data = graph_file.read(chunk_size)
+            text = rest + data
+            # Parsing whole lines only
+            end = text.rfind("\n") + 1 if data else len(text)
+            text, rest = text[:end], text[end:]
+            text = text.replace("\r", "").strip()
+            if text:
+                values = np.fromstring(text.replace("\n", ","), sep=",")
+                if len(values) != columns*(text.count("\n") + 1):
+                    raise ValueError("Malformed graph file %s" % file_path)
+                values = values.reshape(-1, columns)
+                weights = values[:, 2] if columns > 2 else np.ones(len(values))
+                yield values[:, 0].astype(np.int64), values[:, 1].astype(np.int64), weights
+            if not data:
+                break
+
+
+def read_csv_edges(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Returns (v_i, v_j, weights) arrays of csv graph file at `file_path`,
+    see `iter_csv_edges`.
+    """
+    chunks = list(iter_csv_edges(file_path, chunk_size))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def iter_edges(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Yields (v_i, v_j, weights) arrays of chunks of the edges of graph file
+    at `file_path`, without loading it whole. Files ending in .snap are
+    read as binary snapshot files, `chunk_size` bytes of their columns at
+    once, others as csv.
+    """
+    if not file_path.endswith(SNAPSHOT_EXTENSION):
+        for edges in iter_csv_edges(file_path, chunk_size):
+            yield edges
+        return
+    for sources, targets, weights in Snapshot(file_path).iter_chunks(max(1, chunk_size//16)):
+        yield sources, targets.astype(np.int64), weights.astype(np.float64)
+
+
+def read_graph_files(file_paths, chunk_size=CHUNK_SIZE):
+    """
+    Returns (v_i, v_j, weights) arrays of the edges of all graph files in
+    `file_paths`, see `graph_files`, in file order. Files ending in .snap
+    are read as binary snapshot files, others as csv.
+    """
+    columns = ([], [], [])
+    for file_path in graph_files(file_paths):
+        if file_path.endswith(SNAPSHOT_EXTENSION):
+            edges = [np.asarray(column) for column in read_snapshot(file_path)]
+        else:
+            edges = read_csv_edges(file_path, chunk_size)
+        for column, values in zip(columns, edges):
+            column.append(values)
+    if not columns[0]:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return (np.concatenate(columns[0]).astype(np.int64),
+            np.concatenate(columns[1]).astype(np.int64),
+            np.concatenate(columns[2]).astype(np.float64))
@@ -2,33 +2,43 @@
 Joins graphs in one
 """
 import json
+import numpy as np
+from graph import graph_files, iter_edges
 
 
-files_path = json.load(open("all_files.json"))
+files_path = graph_files("all_files.json")
 
-def count_graph(adj_list):
-    vertices_count = 0
-    edges_count = 0
-    for vertice, neighbors in adj_list.iteritems():
-        vertices_count += 1
-        edges_count += len(neighbors.keys())
-    return (vertices_count, edges_count)
+def count_graph(keys):
+    """
+    Returns number of vertices with edges out of them and number of edges
+    of the graph with sorted packed edge `keys`.
+    """
+    return (len(np.unique(keys >> 32)), len(keys))
+
+def add_edges(keys, weights, v_i, v_j, e_w):
+    """
+    Returns sorted keys and weights of the union of edges `keys` and
+    edges (v_i, v_j, e_w), the weight of an edge being the last one read.
+    """
+    keys = np.concatenate((keys, (v_i << 32) | v_j))
+    weights = np.concatenate((weights, e_w))
+    # Unique keys of the reversed edges, so the last weight is kept
+    keys, last = np.unique(keys[::-1], return_index=True)
+    return keys, weights[::-1][last]
 
 data = []
-adj_list = {}
+keys = np.empty(0, dtype=np.int64)
+weights = np.empty(0)
 for graph_file_path in files_path:
-    first_line = True
-    with open(graph_file_path) as graph_file:
-        for line in graph_file:
-            if not first_line:
-                v_i, v_j, e_w = line.split(",")
-                if v_i not in adj_list:
-                    adj_list[v_i] = {}
-                adj_list[v_i][v_j] = e_w
-        data.append(count_graph(adj_list))
+    for v_i, v_j, e_w in iter_edges(graph_file_path):
+        keys, weights = add_edges(keys, weights, v_i, v_j, e_w)
+    data.append(count_graph(keys))
 
 with open("graph_cum.json", "w+") as graph_cum_file:
     json.dump(data, graph_cum_file)
 
+adj_list = {}
+for key, weight in zip(keys.tolist(), weights.tolist()):
+    adj_list.setdefault(str(key >> 32), {})[str(key & 0xFFFFFFFF)] = weight
 with open("total_graph.json", "w+") as total_graph:
     json.dump(adj_list, total_graph)
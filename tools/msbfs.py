@@ -0,0 +1,230 @@
+"""
+Multi-source Breadth-First Search module
+module: bit-parallel BFS from batches of sources
+author: ricardosilveira@poli.ufrj.br
+
+Each vertex keeps uint64 masks with one bit per source of the batch: the
+sources which reached it (visited) and the ones which reached it at the
+last level (frontier). At each level the frontier masks are or-ed over
+the edges, so a single pass over the adjacency advances every search of
+the batch (Then et al.: The more the merrier, efficient multi-source
+graph traversal). Sparse levels push masks along the edges leaving the
+frontier, dense ones pull them from the neighbors of every vertex.
+"""
+import multiprocessing
+import numpy as np
+from graph import CSRGraph
+from bfs import frontier_edges
+
+
+# Sources per batch, a multiple of 64
+BATCH_SIZE = 256
+# Levels with more edges than edges/PULL_RATIO pull masks from all vertices
+PULL_RATIO = 8
+WORD_BITS = 64
+
+# Graph arrays of the worker processes, set by _init_worker
+_GRAPH = None
+
+
+def unpack_masks(masks):
+    """
+    Returns uint8 array of the bits of each row of uint64 array `masks`,
+    in the order of `bit_columns`
+    """
+    masks = np.ascontiguousarray(masks, dtype="<u8")
+    return np.unpackbits(masks.view(np.uint8), axis=1)
+
+
+def bit_columns(count):
+    """
+    Returns column of each of the `count` first bits in the rows of
+    `unpack_masks`, as unpackbits yields the highest bit of each byte first
+    """
+    bits = np.arange(count)
+    return (bits//8)*8 + 7 - bits % 8
+
+
+def reverse_graph(graph):
+    """
+    Returns CSRGraph with the edges of directed CSRGraph `graph` reversed,
+    `graph` itself if undirected
+    """
+    if not graph.directed:
+        return graph
+    sources = np.repeat(np.arange(graph.n_vertices), graph.degrees())
+    return CSRGraph.from_edges(graph.neighbors, sources, n_vertices=graph.n_vertices,
+                               directed=True)
+
+
+def msbfs(graph, sources, **kwargs):
+    """
+    Runs a breadth-first search from each vertex of `sources` at once over
+    CSRGraph `graph`
+
+    Parameters
+    ----------
+    distances: bool
+        If True, also returns the distance from each source to each
+        vertex, False (default)
+    max_distance: int
+        Largest distance explored, no limit (default)
+    reverse: CSRGraph
+        Reversed graph, pulled from on dense levels of directed graphs,
+        built on demand (default)
+
+    Returns
+    -------
+    tuple
+        (histograms, distances): int64 array with the number of vertices
+        at each distance of each source, one row per source, and int32
+        array of distances, one row per source, -1 for vertices not
+        reached, or None
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    count = len(sources)
+    words = max(1, -(-count//WORD_BITS))
+    max_distance = kwargs.get("max_distance", None)
+    reverse = kwargs.get("reverse", None)
+    n_vertices = graph.n_vertices
+    visited = np.zeros((n_vertices, words), dtype=np.uint64)
+    frontier = np.zeros((n_vertices, words), dtype=np.uint64)
+    bits = np.arange(count)
+    np.bitwise_or.at(frontier, (sources, bits//WORD_BITS),
+                     np.left_shift(np.uint64(1), (bits % WORD_BITS).astype(np.uint64)))
+    visited |= frontier
+    active = np.unique(sources)
+    histograms = [np.ones(count, dtype=np.int64)]
+    columns = bit_columns(count)
+    distances = None
+    if kwargs.get("distances", False):
+        # Vertex-major while searching, with the columns of unpack_masks
+        distances = np.full((n_vertices, WORD_BITS*words), -1, dtype=np.int32)
+        distances[sources, columns] = 0
+    level = 0
+    while len(active) and (max_distance is None or level < max_distance):
+        level += 1
+        active_edges = (graph.offsets[active + 1] - graph.offsets[active]).sum()
+        if active_edges > len(graph.neighbors)//PULL_RATIO:
+            # Pulling masks of the neighbors of every vertex
+            if reverse is None:
+                reverse = reverse_graph(graph)
+            reached = np.flatnonzero(np.diff(reverse.offsets))
+            masks = np.bitwise_or.reduceat(frontier[reverse.neighbors],
+                                           reverse.offsets[reached], axis=0) \
+                if len(reached) else np.zeros((0, words), dtype=np.uint64)
+        else:
+            # Pushing masks along the edges leaving the frontier
+            edge_sources, targets = frontier_edges(graph.offsets, graph.neighbors, active)
+            order = np.argsort(targets, kind="mergesort")
+            targets = targets[order]
+            starts = np.flatnonzero(np.concatenate(([True], targets[1:] != targets[:-1]))) \
+                if len(targets) else np.empty(0, dtype=np.int64)
+            reached = targets[starts]
+            masks = np.bitwise_or.reduceat(frontier[edge_sources[order]], starts, axis=0) \
+                if len(starts) else np.zeros((0, words), dtype=np.uint64)
+        masks &= ~visited[reached]
+        new = masks.any(axis=1)
+        reached, masks = reached[new], masks[new]
+        frontier[active] = 0
+        frontier[reached] = masks
+        visited[reached] |= masks
+        active = reached
+        if not len(active):
+            break
+        found = unpack_masks(masks)
+        histograms.append(found.sum(axis=0)[columns])
+        if distances is not None:
+            distances[reached] = np.where(found, level, distances[reached])
+    if distances is not None:
+        distances = np.ascontiguousarray(distances[:, columns].T)
+    return np.array(histograms).T.reshape(count, len(histograms)), distances
+
+
+def _init_worker(offsets, neighbors, directed):
+    """
+    Keeps the graph arrays in the worker process
+    """
+    global _GRAPH
+    graph = CSRGraph.from_csr(offsets, neighbors, directed=directed)
+    _GRAPH = (graph, reverse_graph(graph))
+
+
+def _msbfs_task(task):
+    """
+    Worker for `batched_msbfs`: searches one batch of sources
+    """
+    sources, distances, max_distance = task
+    graph, reverse = _GRAPH
+    return msbfs(graph, sources, distances=distances, max_distance=max_distance,
+                 reverse=reverse)
+
+
+def batched_msbfs(graph, sources, **kwargs):
+    """
+    Yields results of `msbfs` for consecutive batches of `sources`, in
+    order, searched by a pool of worker processes
+
+    Parameters
+    ----------
+    batch_size: int
+        Sources per batch, BATCH_SIZE (default)
+    workers: int
+        Number of processes, 1 (default) searches in this process
+    distances: bool
+        If True, distances are returned too, False (default)
+    max_distance: int
+        Largest distance explored, no limit (default)
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    batch_size = kwargs.get("batch_size", BATCH_SIZE)
+    workers = kwargs.get("workers", 1)
+    tasks = [(sources[start:start + batch_size], kwargs.get("distances", False),
+              kwargs.get("max_distance", None))
+             for start in xrange(0, len(sources), batch_size)]
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(workers, _init_worker,
+                                    (graph.offsets, graph.neighbors, graph.directed))
+        try:
+            for result in pool.imap(_msbfs_task, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        reverse = reverse_graph(graph)
+        for batch, distances, max_distance in tasks:
+            yield msbfs(graph, batch, distances=distances, max_distance=max_distance,
+                        reverse=reverse)
+
+
+def distance_histograms(graph, sources, **kwargs):
+    """
+    Returns int64 array with the number of vertices at each distance from
+    each vertex of `sources`, one row per source, over CSRGraph `graph`.
+    Takes the parameters of `batched_msbfs`.
+    """
+    kwargs["distances"] = False
+    histograms = [result[0] for result in batched_msbfs(graph, sources, **kwargs)]
+    columns = max([histogram.shape[1] for histogram in histograms] or [1])
+    table = np.zeros((len(sources), columns), dtype=np.int64)
+    row = 0
+    for histogram in histograms:
+        table[row:row + len(histogram), :histogram.shape[1]] = histogram
+        row += len(histogram)
+    return table
+
+
+def distance_matrix(graph, sources, **kwargs):
+    """
+    Returns int32 array of the distance from each vertex of `sources` to
+    each vertex of CSRGraph `graph`, -1 if not reachable. Takes the
+    parameters of `batched_msbfs`.
+    """
+    kwargs["distances"] = True
+    matrix = np.empty((len(sources), graph.n_vertices), dtype=np.int32)
+    row = 0
+    for _, distances in batched_msbfs(graph, sources, **kwargs):
+        matrix[row:row + len(distances)] = distances
+        row += len(distances)
+    return matrix
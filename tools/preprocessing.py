@@ -1,21 +1,25 @@
+import csv
 import json
 import heapq
-import contextlib2
+import itertools
+from graph import iter_edges
 
 
-def avoid_first_line(file_iterator):
-    first_line = True
-    for line in file_iterator:
-        if not first_line:
-            yield line
-        first_line = False
-
 citation_path = "../data/APS/output/graph/citation_graphs/files.json"
 #coauthorship_path = "../data/APS/output/graph/coauthorship_graphs/files.json"
 
 all_files_citation = [x.replace("output/", "output/graph/") for x in json.load(open(citation_path))]
 #all_files_coauthorship = [x.replace("output/", "output/graph/") for x in json.load(open(coauthorship_path))]
 
+def edges_of(file_path):
+    """
+    Yields (v_i, v_j, weight) of graph file at `file_path`, csv or binary
+    snapshot, in file order.
+    """
+    for v_i, v_j, weights in iter_edges(file_path):
+        for edge in itertools.izip(v_i.tolist(), v_j.tolist(), weights.tolist()):
+            yield edge
+
 def external_merge(files_path):
     filenames_year = {}
     root_path = "../data/APS"
@@ -29,12 +33,10 @@ def external_merge(files_path):
             filenames_year[graph_path] = []
         filenames_year[graph_path].append(file_path)
     for graph_path, filenames in filenames_year.iteritems():
-        # merging files for each year
+        # merging files for each year, sorted by (v_i, v_j) as written by the builders
         print graph_path
-        with contextlib2.ExitStack() as stack:
-            files = [avoid_first_line(stack.enter_context(open(fn))) for fn in filenames]
-            with open(graph_path, "w") as f:
-                f.writelines(heapq.merge(*files))
+        with open(graph_path, "w") as f:
+            csv.writer(f).writerows(heapq.merge(*[edges_of(fn) for fn in filenames]))
 
 #external_merge(all_files_coauthorship)
 external_merge(all_files_citation)
@@ -1,38 +1,278 @@
 """
+Probability distributions module
+module: exact and logarithmically binned distributions of numeric values
+author: ricardosilveira@poli.ufrj.br
+
+A Histogram keeps the distinct values seen, sorted, and how many times
+each one was seen. Values are added in chunks, such as the degrees of one
+snapshot at a time, and histograms built apart, in other processes or from
+other files, are merged by adding their counts, so the value lists are
+never held at once.
 """
+import numpy as np
+
+
+# Chunks of non-negative integers up to this many times their length plus
+# DENSE_SLACK are counted with bincount instead of sorted
+DENSE_RATIO = 4
+DENSE_SLACK = 2**16
+# Base of the logarithmic bins
+LOG_BASE = 2
+
+
+class Histogram(object):
+    """
+    Exact counts of numeric values
+
+    Attributes
+    ----------
+    values
+        Distinct values seen, sorted
+    counts
+        Number of times each value was seen
+    total
+        Number of values seen
+
+    Methods
+    -------
+    add(values, counts=None)
+        Counts array of values, optionally each one many times
+    update(chunks)
+        Counts each array of an iterable of chunks
+    merge(histogram)
+        Adds the counts of another histogram
+    pdf()
+        Returns P(X = x) of each value
+    cdf()
+        Returns P(X <= x) of each value
+    ccdf()
+        Returns P(X >= x) of each value
+    log_pdf(base)
+        Returns probability density over logarithmic bins
+    log_ccdf(base)
+        Returns P(X >= x) at the edges of logarithmic bins
+    """
+
+    def __init__(self, values=None):
+        """
+        Parameters
+        ----------
+        values: array
+            Values counted at once, none (default)
+        """
+        self.values = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.total = 0
+        if values is not None:
+            self.add(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __add__(self, histogram):
+        return self.copy().merge(histogram)
+
+    def __iadd__(self, histogram):
+        return self.merge(histogram)
+
+    def copy(self):
+        """
+        Returns new Histogram with the same counts
+        """
+        histogram = Histogram()
+        histogram.values = self.values.copy()
+        histogram.counts = self.counts.copy()
+        histogram.total = self.total
+        return histogram
+
+    def _add_counts(self, values, counts):
+        """
+        Adds `counts` of sorted distinct `values` to the histogram
+        """
+        if not len(values):
+            return
+        if not len(self.values):
+            self.values, self.counts = values, counts
+        else:
+            merged = np.union1d(self.values, values)
+            merged_counts = np.zeros(len(merged), dtype=np.int64)
+            merged_counts[np.searchsorted(merged, self.values)] += self.counts
+            merged_counts[np.searchsorted(merged, values)] += counts
+            self.values, self.counts = merged, merged_counts
+        self.total += int(counts.sum())
+
+    def add(self, values, counts=None):
+        """
+        Counts array of `values`, each one once or the matching number of
+        times of array `counts`
+
+        Returns
+        -------
+        Histogram
+            The histogram itself
+        """
+        values = np.asarray(values).ravel()
+        if not len(values):
+            return self
+        if counts is not None:
+            unique, inverse = np.unique(values, return_inverse=True)
+            totals = np.zeros(len(unique), dtype=np.int64)
+            np.add.at(totals, inverse, np.asarray(counts, dtype=np.int64).ravel())
+            self._add_counts(unique, totals)
+            return self
+        if values.dtype.kind in "iub":
+            low, high = int(values.min()), int(values.max())
+            if low >= 0 and high < DENSE_RATIO*len(values) + DENSE_SLACK:
+                totals = np.bincount(values.astype(np.int64))
+                unique = np.flatnonzero(totals)
+                self._add_counts(unique, totals[unique])
+                return self
+        unique, totals = np.unique(values, return_counts=True)
+        self._add_counts(unique, totals.astype(np.int64))
+        return self
+
+    def update(self, chunks):
+        """
+        Counts each array of values of iterable `chunks`, returns the
+        histogram itself
+        """
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+
+    def merge(self, histogram):
+        """
+        Adds the counts of Histogram `histogram`, returns the histogram
+        itself
+        """
+        self._add_counts(histogram.values, histogram.counts)
+        return self
+
+    def pdf(self):
+        """
+        Returns (values, probabilities) arrays, P(X = x) of each value
+        """
+        return self.values, self.counts/float(max(1, self.total))
+
+    def cdf(self):
+        """
+        Returns (values, probabilities) arrays, P(X <= x) of each value
+        """
+        return self.values, np.cumsum(self.counts)/float(max(1, self.total))
+
+    def ccdf(self):
+        """
+        Returns (values, probabilities) arrays, P(X >= x) of each value
+        """
+        return self.values, np.cumsum(self.counts[::-1])[::-1]/float(max(1, self.total))
+
+    def log_bins(self, base=LOG_BASE):
+        """
+        Returns edges of the bins [base**k, base**(k+1)) covering the
+        positive values seen, empty if there are none
+        """
+        positive = self.values[self.values > 0]
+        if not len(positive):
+            return np.empty(0)
+        low, high = float(positive[0]), float(positive[-1])
+        first = int(np.floor(np.log(low)/np.log(base)))
+        last = int(np.floor(np.log(high)/np.log(base))) + 1
+        edges = float(base)**np.arange(first, last + 1)
+        # Rounding of the logarithms may leave the ends out by one bin
+        if edges[0] > low:
+            edges = np.insert(edges, 0, edges[0]/base)
+        if edges[-1] <= high:
+            edges = np.append(edges, edges[-1]*base)
+        return edges
+
+    def log_pdf(self, base=LOG_BASE):
+        """
+        Returns (centers, densities) arrays of the non-empty logarithmic
+        bins, see `log_bins`: the share of all values in each bin over its
+        width, at its geometric center. Values not positive are left out
+        of the bins but count in the total.
+        """
+        edges = self.log_bins(base)
+        if not len(edges):
+            return np.empty(0), np.empty(0)
+        positive = self.values > 0
+        bins = np.searchsorted(edges, self.values[positive], "right") - 1
+        masses = np.bincount(bins, weights=self.counts[positive], minlength=len(edges) - 1)
+        densities = masses/(float(self.total)*np.diff(edges))
+        centers = np.sqrt(edges[:-1]*edges[1:])
+        non_empty = masses > 0
+        return centers[non_empty], densities[non_empty]
+
+    def log_ccdf(self, base=LOG_BASE):
+        """
+        Returns (edges, probabilities) arrays, P(X >= x) at the edges of
+        the logarithmic bins, see `log_bins`
+        """
+        edges = self.log_bins(base)
+        if not len(edges):
+            return edges, np.empty(0)
+        above = np.concatenate((np.cumsum(self.counts[::-1])[::-1], [0]))
+        return edges, above[np.searchsorted(self.values, edges)]/float(self.total)
+
+
+def grouped_histograms(groups, values, n_groups=None):
+    """
+    Returns list with a Histogram of the `values` of each group, from
+    arrays `groups` of group indexes and `values`, such as the snapshot
+    and degree columns of an `aps_static` table, sorting them once
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    values = np.asarray(values)
+    if n_groups is None:
+        n_groups = int(groups.max()) + 1 if len(groups) else 0
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.flatnonzero(np.concatenate(
+        ([True], (groups[1:] != groups[:-1]) | (values[1:] != values[:-1])))) \
+        if len(values) else np.empty(0, dtype=np.int64)
+    counts = np.diff(np.append(starts, len(values)))
+    groups, values = groups[starts], values[starts]
+    bounds = np.searchsorted(groups, np.arange(n_groups + 1))
+    histograms = []
+    for group in xrange(n_groups):
+        histogram = Histogram()
+        histogram._add_counts(values[bounds[group]:bounds[group+1]],
+                              counts[bounds[group]:bounds[group+1]])
+        histograms.append(histogram)
+    return histograms
+
 
 def ccdf(values_list):
     """
     Counter cumulative density function
-    :param values_list: input data for ccdf
-    :returns: dictionary with values as probability
-    """
-    hist = {}
-    total = len(values_list)
-    n_len = float(1)/total
-    print ">> Adjusting list of values"
-    values_list = map(int, values_list)
-    values_list.sort()
-    values_list.append(None)
-    print ">> Computing distribution"
-    previous_value = None
-    value_count = 1
-    list_index = 0
-    for i in values_list:
-        if i == previous_value:
-            value_count += 1
-        else:
-            if previous_value is not None:
-                hist[previous_value] = n_len*(value_count+(total-list_index))
-                value_count = 1
-            previous_value = i
-        list_index += 1
-    return hist
+    :param values_list: input data for ccdf, taken as integers
+    :returns: dictionary with values as keys and P(X >= value) as values
+    """
+    values = np.asarray(values_list)
+    if values.dtype.kind in "SU":
+        values = values.astype(np.float64)
+    return get_distribution(values.astype(np.int64), "ccdf")
+
+
+# Types of distribution, each one a method of Histogram
+DISTRIBUTIONS = ("pdf", "cdf", "ccdf", "log_pdf", "log_ccdf")
+
 
-def get_distribution(values_list, distr_type='ccdf'):
+def get_distribution(values_list, distr_type='ccdf', **kwargs):
     """
-    :param values_list: list of numeric values
-    :param distr_type: string to select distribution type
+    :param values_list: list or array of numeric values, or Histogram
+    :param distr_type: string to select distribution type, one of
+        DISTRIBUTIONS
+    :param base: base of the logarithmic bins, LOG_BASE (default)
+    :returns: dictionary with values (bin centers or edges for log_*) as
+        keys and probabilities (densities for log_pdf) as values
     """
-    if distr_type == "ccdf":
-        return ccdf(values_list)
+    if distr_type not in DISTRIBUTIONS:
+        raise ValueError("Unknown distribution type: %s" % distr_type)
+    histogram = values_list if isinstance(values_list, Histogram) else Histogram(values_list)
+    method = getattr(histogram, distr_type)
+    if distr_type.startswith("log_"):
+        x_values, y_values = method(kwargs.get("base", LOG_BASE))
+    else:
+        x_values, y_values = method()
+    return dict(zip(x_values.tolist(), y_values.tolist()))
@@ -0,0 +1,150 @@
+"""
+Snapshot module
+module: binary graph snapshot format and its reader, files are written by
+builder/snapshot_writer.py
+author: ricardosilveira@poli.ufrj.br
+
+A snapshot file holds edges sorted by (v_i, v_j), little-endian:
+
+    header   HEADER_SIZE bytes: magic "GRFLSNAP", version (uint32), weight
+             size in bytes (uint32, 4 or 8), vertices count, vertex id
+             bound (largest vertex id + 1) and edges count (uint64 each),
+             zero padded
+    sources  int32[edges], delta encoded: first source, then differences
+    targets  int32[edges]
+    weights  float32[edges] or float64[edges]
+"""
+import struct
+import numpy as np
+
+
+MAGIC = "GRFLSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+HEADER_SIZE = 64
+SNAPSHOT_EXTENSION = ".snap"
+# Weights type by their size in bytes
+WEIGHT_DTYPES = {4: "<f4", 8: "<f8"}
+
+
+class Snapshot(object):
+    """
+    Zero-copy view of a binary snapshot file. Targets and weights are
+    memory-mapped, sources are decoded from their deltas on first access.
+
+    Attributes
+    ----------
+    n_vertices
+        Number of vertices with edges in the snapshot
+    id_bound
+        Largest vertex id plus one
+    m_edges
+        Number of edges in the snapshot
+
+    Methods
+    -------
+    sources()
+        Returns source vertex of each edge
+    targets()
+        Returns target vertex of each edge
+    weights()
+        Returns weight of each edge
+    offsets()
+        Returns CSR offsets of the edges of each source vertex
+    iter_chunks(chunk_edges)
+        Yields arrays of the edges, `chunk_edges` at a time
+    """
+    def __init__(self, snapshot_path):
+        """
+        Parameters
+        ----------
+        snapshot_path: str
+            Path for binary snapshot file
+        """
+        self.snapshot_path = snapshot_path
+        with open(snapshot_path, "rb") as snapshot_file:
+            header = snapshot_file.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a snapshot file" % snapshot_path)
+        _, version, weight_size, self.n_vertices, self.id_bound, self.m_edges = \
+            HEADER.unpack(header[:HEADER.size])
+        if version != VERSION:
+            raise ValueError("Unsupported snapshot version %s" % version)
+        self.weight_dtype = np.dtype(WEIGHT_DTYPES[weight_size])
+        self._source_deltas = self._column("<i4", HEADER_SIZE)
+        self._targets = self._column("<i4", HEADER_SIZE + 4*self.m_edges)
+        self._weights = self._column(self.weight_dtype, HEADER_SIZE + 8*self.m_edges)
+        self._sources = None
+
+    def _column(self, dtype, offset):
+        """
+        Returns memory-mapped column of `m_edges` items of `dtype` starting
+        at `offset` bytes.
+        """
+        if not self.m_edges:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.snapshot_path, dtype=dtype, mode="r",
+                         offset=offset, shape=(self.m_edges,))
+
+    def __len__(self):
+        return self.m_edges
+
+    def sources(self):
+        """
+        Returns array with the source vertex of each edge, sorted.
+        """
+        if self._sources is None:
+            self._sources = np.cumsum(self._source_deltas, dtype=np.int32)
+        return self._sources
+
+    def targets(self):
+        """
+        Returns array with the target vertex of each edge.
+        """
+        return self._targets
+
+    def weights(self):
+        """
+        Returns array with the weight of each edge.
+        """
+        return self._weights
+
+    def offsets(self):
+        """
+        Returns CSR offsets over vertex ids: edges of vertex v are
+        targets()[offsets[v]:offsets[v+1]].
+        """
+        counts = np.bincount(self.sources(), minlength=self.id_bound)
+        offsets = np.zeros(self.id_bound + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+
+    def iter_chunks(self, chunk_edges):
+        """
+        Yields (sources, targets, weights) arrays of `chunk_edges` edges at
+        a time, decoding sources per chunk, so the file is streamed without
+        holding all sources.
+        """
+        last_source = 0
+        for start in xrange(0, self.m_edges, chunk_edges):
+            end = min(start + chunk_edges, self.m_edges)
+            sources = last_source + np.cumsum(self._source_deltas[start:end], dtype=np.int64)
+            last_source = sources[-1]
+            yield sources, self._targets[start:end], self._weights[start:end]
+
+    def __iter__(self):
+        """
+        Yields (v_i, v_j, weight) for every edge, sorted by (v_i, v_j).
+        """
+        for v_i, v_j, weight in zip(self.sources().tolist(), self._targets.tolist(),
+                                    self._weights.tolist()):
+            yield v_i, v_j, weight
+
+
+def read_snapshot(snapshot_path):
+    """
+    Returns (sources, targets, weights) arrays of snapshot file at
+    `snapshot_path`.
+    """
+    snapshot = Snapshot(snapshot_path)
+    return snapshot.sources(), snapshot.targets(), snapshot.weights()
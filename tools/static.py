@@ -3,14 +3,25 @@ Graph Analytics module
 module: graph analytics module
 author: ricardosilveira@poli.ufrj.br
 """
+import numpy as np
+from graph import CSRGraph
+from explorer import Explorer
+from diameter import components, diameters, undirected
+from anf import PRECISION, neighbourhood_function, effective_diameter
 
 
 class GraphAnalytics(object):
     """
     Methods
     -------
+    connected_components()
+        Returns connected components of the graph, largest first
     get_diameter()
         Returns the value of the greatest distance connecting two vertices
+        in each connected component
+    effective_diameter()
+        Returns the approximate effective diameter of each connected
+        component
     degree_distribution()
         Returns the pdf of vertices degrees
     """
@@ -21,69 +32,119 @@ class GraphAnalytics(object):
 
     def connected_components(self, *args, **kwargs):
         """
-        Returns all connected components in the graph
+        Returns all connected components in the graph, weakly connected
+        ones for directed graphs, joining the ends of all edges in disjoint
+        sets, see `components.DisjointSets`
 
         Parameters
         ----------
-        method: object
-            Class which will be used for exploring the graph
+        graph: Graph
+            Graph to split in components, first positional argument or
+            self (default). Every vertex of a CSRGraph is counted, other
+            graphs count the vertices in their edges.
 
         Returns
         -------
         list of dicts
             [{Key -> Label for each connected component
-             Value -> Lists of vertices of the corresponding component}]
+             Value -> Lists of vertices of the corresponding component}],
+            largest component first
         """
-        if not self.__searcher:
-            # should raise an exception
-            "No searching method defined"
-            return []
-        root = self.label_map[0]
+        graph = args[0] if args else kwargs.get("graph", self)
+        explorer = Explorer(graph)
+        sizes, offsets, vertices = components(explorer.csr_graph, isinstance(graph, CSRGraph))
         c_c = []
-        searching_method = method(self)
-        trees_list = []
-        while searching_method.has_vertices_left():
-            trees_list.append(searching_method.explore_graph(root))
-            root = searching_method.get_next_vertex()
-        component_index = 0
-        for spanning_tree in trees_list:
-            tree, tree_level = spanning_tree
-            vertices = tree.keys()
-            vertices_count = len(vertices)
+        for component_index, vertices_count in enumerate(sizes.tolist()):
             c_c.append({"index": component_index,
                         "size": vertices_count,
-                        "vertices": vertices})
-            component_index += 1
-        # Sorting components / Bubble sort
-        for i in range(len(c_c)):
-            for j in range(len(c_c)-i-1):
-                if c_c[j]["size"] > c_c[j+1]["size"]:
-                    c_c[j], c_c[j+1] = c_c[j+1], c_c[j]
-        c_c.reverse()
+                        "vertices": self.__labels(
+                            explorer, vertices[offsets[component_index]:
+                                               offsets[component_index+1]])})
         return c_c
 
-    def get_diameter(self, method):
+    @staticmethod
+    def __labels(explorer, vertices):
         """
-        Returns the graph diameter - largest path
+        Returns list of the labels of array of compact ids `vertices` of
+        the graph of `explorer`
+        """
+        if explorer.labels is None:
+            return vertices.tolist()
+        return [explorer.labels[vertex] for vertex in vertices.tolist()]
+
+    def get_diameter(self, *args, **kwargs):
+        """
+        Returns the diameter - largest distance - of each connected
+        component, exact by iFUB, see `diameter`. Directed graphs are
+        taken as undirected.
+
+        Parameters
+        ----------
+        graph: Graph
+            Graph to measure, first positional argument or self (default).
+            Vertices are counted as in `connected_components`.
+        min_size: int
+            Components with fewer vertices are skipped, 1 (default)
 
         Returns
         -------
-        int
-            largest distance between a pair of vertices
+        list of dicts
+            [{"index": component index, largest first, "size": vertices,
+              "diameter": largest distance, "bfs_runs": BFS runs,
+              "vertices": labels of the vertices of the component}]
+        """
+        graph = args[0] if args else kwargs.get("graph", self)
+        explorer = Explorer(graph)
+        results = diameters(explorer.csr_graph, min_size=kwargs.get("min_size", 1),
+                            all_vertices=isinstance(graph, CSRGraph))
+        for result in results:
+            result["vertices"] = self.__labels(explorer, result["vertices"])
+        return results
+
+    def effective_diameter(self, *args, **kwargs):
+        """
+        Returns the effective diameter of each connected component: the
+        distance within which `share` of its connected pairs lie, from the
+        HyperANF estimate of its neighbourhood function, see `anf`.
+        Directed graphs are taken as undirected.
+
+        Parameters
+        ----------
+        graph: Graph
+            Graph to measure, first positional argument or self (default).
+            Vertices are counted as in `connected_components`.
+        share: float
+            Share of the pairs, 0.9 (default)
+        precision: int
+            Counters have 2**precision registers, anf.PRECISION (default)
+        seed: int
+            Seed of the counters hashes, 0 (default)
+
+        Returns
+        -------
+        list of dicts
+            [{"index": component index, largest first, "size": vertices,
+              "effective_diameter": interpolated distance,
+              "neighbourhood_function": [N(0), N(1), ...],
+              "vertices": labels of the vertices of the component}]
         """
-        diameter = 0
-        # Iterating over every vertex
-        for v_i in self.index_map.keys():
-            searcher = method(self)
-            tree, tree_level = searcher.explore_graph(v_i)
-            if searcher.has_vertices_left():
-                print "More than one connected component, infinite diameter"
-                return float("inf")
-            # Updating largest distance
-            largest_distance = max(tree_level.values())
-            if largest_distance > diameter:
-                diameter = largest_distance
-        return largest_distance
+        graph = args[0] if args else kwargs.get("graph", self)
+        explorer = Explorer(graph)
+        csr_graph = undirected(explorer.csr_graph)
+        sizes, offsets, vertices = components(csr_graph, isinstance(graph, CSRGraph))
+        # Ids left out of the components go to a last group, dropped
+        groups = np.full(csr_graph.n_vertices, len(sizes), dtype=np.int64)
+        groups[vertices] = np.repeat(np.arange(len(sizes)), sizes)
+        function = neighbourhood_function(csr_graph, groups=groups,
+                                          precision=kwargs.get("precision", PRECISION),
+                                          seed=kwargs.get("seed", 0))
+        effective = effective_diameter(function[:, :len(sizes)], kwargs.get("share", 0.9))
+        return [{"index": index,
+                 "size": int(sizes[index]),
+                 "effective_diameter": float(effective[index]),
+                 "neighbourhood_function": function[:, index].tolist(),
+                 "vertices": self.__labels(explorer, vertices[offsets[index]:offsets[index+1]])}
+                for index in xrange(len(sizes))]
 
     def degree_distribution(self, *args, **kwargs):
         """
@@ -0,0 +1,230 @@
+"""
+Works module
+module: columnar works store format and its reader, stores are written by
+builder/works_store.py
+author: ricardosilveira@poli.ufrj.br
+
+A store is a directory of numpy arrays:
+
+    dates.npy            int64, publication date as YYYYMMDD
+    authors_offsets.npy  int64, work i authors are authors_index[offsets[i]:offsets[i+1]]
+    authors_index.npy    int32, author indexes
+    cited_offsets.npy    int64, work i cited works are cited_index[offsets[i]:offsets[i+1]]
+    cited_index.npy      int32, cited work indexes
+    meta.json            works count and format version
+
+Columns are memory-mapped, so statistics over all works are computed on
+the arrays, without a python object per work.
+"""
+import json
+from datetime import datetime
+import numpy as np
+
+
+STORE_VERSION = 1
+COLUMNS = ["dates", "authors_offsets", "authors_index", "cited_offsets", "cited_index"]
+WORKS_STORE_NAME = "aps_works_store"
+# Divisor of date keys giving the period key of each resolution
+RESOLUTIONS = {"year": 10000, "month": 100, "day": 1}
+
+
+def date_to_key(date_string):
+    """
+    Converts a date string to an integer key YYYYMMDD.
+
+    Examples
+    --------
+    >>> date_to_key("1893-07-01")
+    18930701
+    """
+    try:
+        year, month, day = date_string[:10].split("-")
+        return int(year)*10000 + int(month)*100 + int(day)
+    except ValueError:
+        from dateutil.parser import parse
+        date = parse(date_string)
+        return date.year*10000 + date.month*100 + date.day
+
+
+def key_to_date(date_key):
+    """
+    Converts an integer key YYYYMMDD to a date string.
+
+    Examples
+    --------
+    >>> key_to_date(18930701)
+    '1893-07-01'
+    """
+    date_key = int(date_key)
+    return "%04d-%02d-%02d" % (date_key//10000, date_key//100 % 100, date_key % 100)
+
+
+def period_date(period, resolution):
+    """
+    Returns datetime of the first day of `period` key at `resolution`.
+    """
+    date_key = period*RESOLUTIONS[resolution]
+    return datetime(date_key//10000, max(1, date_key//100 % 100), max(1, date_key % 100))
+
+
+class WorksStore(object):
+    """
+    Read-only view of a works list kept in memory-mapped columns. Items are
+    returned as (date, [authors, cited works]), as in `APSBuilder.works`,
+    with numpy arrays in place of lists.
+
+    Attributes
+    ----------
+    store_path: str
+        Directory of the store.
+    dates: numpy.ndarray
+        Publication date of each work as YYYYMMDD.
+
+    Methods
+    -------
+    authors(work_idx)
+        Returns authors of work `work_idx`.
+    cited(work_idx)
+        Returns works cited by work `work_idx`.
+    periods(resolution)
+        Returns period key of each work.
+    authors_counts()
+        Returns number of authors of each work.
+    cited_counts()
+        Returns number of works cited by each work.
+    authorship_works()
+        Returns work of each item of `authors_index`.
+    citing_works()
+        Returns citing work of each item of `cited_index`.
+    author_works(author)
+        Returns works of author `author`.
+    works_per_author()
+        Returns number of works of each author.
+    group_by_time(resolution)
+        Returns works of each time period.
+    to_list()
+        Returns the works list with python objects, as used for json dumps.
+    """
+
+    def __init__(self, store_path, **kwargs):
+        """
+        Opens store at `store_path`.
+
+        Parameters
+        ----------
+        mmap_mode: str
+            Mode used by numpy to map the columns, None reads them in memory.
+            Default: 'r'.
+        """
+        mmap_mode = kwargs.get("mmap_mode", "r")
+        self.store_path = store_path
+        with open("%s/meta.json" % store_path, "r") as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != STORE_VERSION:
+            raise ValueError("Unsupported works store version %s" % meta["version"])
+        for column in COLUMNS:
+            setattr(self, column, np.load("%s/%s.npy" % (store_path, column),
+                                          mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, work_idx):
+        return (key_to_date(self.dates[work_idx]),
+                [self.authors(work_idx), self.cited(work_idx)])
+
+    def __iter__(self):
+        for work_idx in xrange(len(self)):
+            yield self[work_idx]
+
+    def authors(self, work_idx):
+        """
+        Returns array view with authors of work `work_idx`.
+        """
+        return self.authors_index[self.authors_offsets[work_idx]:
+                                  self.authors_offsets[work_idx+1]]
+
+    def cited(self, work_idx):
+        """
+        Returns array view with works cited by work `work_idx`.
+        """
+        return self.cited_index[self.cited_offsets[work_idx]:self.cited_offsets[work_idx+1]]
+
+    def periods(self, resolution="year"):
+        """
+        Returns array with the period key of each work, YYYY, YYYYMM or
+        YYYYMMDD for `resolution` 'year', 'month' or 'day'.
+        """
+        return np.asarray(self.dates)//RESOLUTIONS[resolution]
+
+    def authors_counts(self):
+        """
+        Returns array with the number of authors of each work.
+        """
+        return np.diff(self.authors_offsets)
+
+    def cited_counts(self):
+        """
+        Returns array with the number of works cited by each work.
+        """
+        return np.diff(self.cited_offsets)
+
+    def authorship_works(self):
+        """
+        Returns array with the work of each item of `authors_index`, so
+        that (authorship_works()[k], authors_index[k]) lists every pair of
+        work and author.
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.authors_counts())
+
+    def citing_works(self):
+        """
+        Returns array with the citing work of each item of `cited_index`.
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.cited_counts())
+
+    def author_works(self, author):
+        """
+        Returns array with the works of author `author`, in works order.
+        """
+        positions = np.flatnonzero(np.asarray(self.authors_index) == author)
+        return np.searchsorted(self.authors_offsets, positions, "right") - 1
+
+    def works_per_author(self, n_authors=0):
+        """
+        Returns array with the number of works of each author, at least
+        `n_authors` long.
+        """
+        return np.bincount(self.authors_index, minlength=n_authors)
+
+    def group_by_time(self, resolution="year"):
+        """
+        Groups date sorted works by time period, as
+        `Builder.group_by_time`.
+
+        Returns
+        -------
+        list:
+            [[first day of period, xrange of works in period]]
+        """
+        periods = self.periods(resolution)
+        offsets = (np.flatnonzero(np.diff(periods)) + 1).tolist()
+        offsets = [0] + offsets + [len(periods)] if len(periods) else [0]
+        return [[period_date(int(periods[offsets[period_idx]]), resolution),
+                 xrange(offsets[period_idx], offsets[period_idx+1])]
+                for period_idx in xrange(len(offsets) - 1)]
+
+    def to_list(self):
+        """
+        Returns works as a list of [date, [authors, cited works]].
+        """
+        return [[work_date, [authors.tolist(), cited.tolist()]]
+                for work_date, (authors, cited) in self]
+
+
+def open_works(output_dir_path, works_store_name=WORKS_STORE_NAME):
+    """
+    Returns WorksStore saved by `APSBuilder.dump_store` in the builder
+    output directory `output_dir_path`, memory-mapped.
+    """
+    return WorksStore("%s/%s" % (output_dir_path, works_store_name))